@@ -2,40 +2,490 @@ import random
 import os
 import sys
 import subprocess
-from typing import Dict, Tuple, Optional
+import hashlib
+import argparse
+import select
+import threading
+import time
+import math
+import struct
+import atexit
+import functools
+from contextlib import contextmanager
+from itertools import islice
+from array import array
+try:
+    import fcntl
+except ImportError: # Not available on Windows; storage falls back to no locking
+    fcntl = None
+import re
+import shlex
+import textwrap
+import string
+import html
+import gzip
+import sqlite3
+import queue
+import secrets
+import shutil
+import signal
+import tempfile
+import difflib
+import csv
+import hmac
+import asyncio
+import socket
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple, Optional, Union
 from enum import Enum
-from dataclasses import dataclass
-from collections import deque
+import dataclasses
+from dataclasses import dataclass, field
+from collections import deque, Counter, OrderedDict
 import json
+import marshal
 
 def print_rainbow(text: str):
     """Print text through lolcat for rainbow effect."""
+    if THEME.depth == 'none':
+        print(text)
+        return
     try:
         import subprocess
         subprocess.run(['lolcat', '-F', '0.3'], input=text.encode('utf-8'), check=True)
     except FileNotFoundError:
         print(text)
 
-# ANSI escape codes for colors
-CYAN = '\033[96m'
-ROSE = '\033[91m'
-BLUE = '\033[94m'
-PURPLE = '\033[95m'
-LIGHT_PURPLE = '\033[38;5;147m'
-YELLOW = '\033[93m'
-ORANGE = '\033[38;5;208m'
-SOFT_GOLD = '\033[38;5;178m'
-PEACH = '\033[38;5;216m'
-LAVENDER = '\033[38;5;183m'
-SAGE = '\033[38;5;151m'
-SKY_BLUE = '\033[38;5;153m'
-RESET = '\033[0m'
+# Colour themes: an RGB value per colour name, rendered to suit the terminal
+THEMES = {
+    'default': {
+        'CYAN': '#5fffff', 'ROSE': '#ff5f5f', 'BLUE': '#5f87ff', 'PURPLE': '#ff5fff',
+        'LIGHT_PURPLE': '#afafff', 'YELLOW': '#ffff5f', 'ORANGE': '#ff8700', 'SOFT_GOLD': '#d7af00',
+        'PEACH': '#ffaf87', 'LAVENDER': '#d7afff', 'SAGE': '#afd7af', 'SKY_BLUE': '#afd7ff',
+    },
+    'high-contrast': {
+        'CYAN': '#00ffff', 'ROSE': '#ff0000', 'BLUE': '#0080ff', 'PURPLE': '#ff00ff',
+        'LIGHT_PURPLE': '#c080ff', 'YELLOW': '#ffff00', 'ORANGE': '#ff8000', 'SOFT_GOLD': '#ffd700',
+        'PEACH': '#ffa060', 'LAVENDER': '#e0a0ff', 'SAGE': '#00ff80', 'SKY_BLUE': '#80c0ff',
+    },
+    'solarized': {
+        'CYAN': '#2aa198', 'ROSE': '#dc322f', 'BLUE': '#268bd2', 'PURPLE': '#d33682',
+        'LIGHT_PURPLE': '#6c71c4', 'YELLOW': '#b58900', 'ORANGE': '#cb4b16', 'SOFT_GOLD': '#b58900',
+        'PEACH': '#cb4b16', 'LAVENDER': '#6c71c4', 'SAGE': '#859900', 'SKY_BLUE': '#268bd2',
+    },
+    'plain': None, # No colours at all
+}
+DEFAULT_THEME = 'default'
+
+# The 16 basic ANSI colours (foreground codes) and their usual RGB values
+ANSI_16 = {
+    30: (0, 0, 0), 31: (205, 0, 0), 32: (0, 205, 0), 33: (205, 205, 0),
+    34: (0, 0, 238), 35: (205, 0, 205), 36: (0, 205, 205), 37: (229, 229, 229),
+    90: (127, 127, 127), 91: (255, 0, 0), 92: (0, 255, 0), 93: (255, 255, 0),
+    94: (92, 92, 255), 95: (255, 0, 255), 96: (0, 255, 255), 97: (255, 255, 255),
+}
+CUBE_LEVELS = (0, 95, 135, 175, 215, 255) # Channel values of the xterm 6x6x6 colour cube
+
+# Styled messages; colour names are filled in once per theme, the rest per message
+MESSAGE_TEMPLATES = {
+    'correct': "{CYAN}Correct! Well done!{RESET}",
+    'case_mismatch': "{PEACH}Wrong capitalisation. Please check your casing.{RESET}",
+    'incorrect': "{ROSE}Incorrect. The correct answer is: {answer}{RESET}",
+    'skip': "The answer is: {CYAN}{answer}{RESET}",
+    'hint': "{YELLOW}{hint}{RESET}",
+}
+# Explanation card, compiled for each outcome's colour
+CARD_TEMPLATE = ("{color}[{points:+d} points]{RESET}\n"
+                 "\n{color}" + "=" * 50 + "{RESET}\n"
+                 "{color}Command:{RESET}     {command}\n"
+                 "{color}Purpose:{RESET}     {explanation}\n"
+                 "{color}Example:{RESET}     {example}")
+CARD_OUTPUT_TEMPLATE = "{color}Sample Output:{RESET}\n{output}"
+CARD_LIVE_TEMPLATE = "{color}Live Output:{RESET}\n{output}"
+CARD_END_TEMPLATE = "{color}" + "=" * 50 + "{RESET}"
+OUTCOME_COLORS = {'correct': 'CYAN', 'case_mismatch': 'PEACH', 'incorrect': 'ROSE'}
+
+def detect_color_depth(stream=None) -> str:
+    """Return 'truecolor', '256', '16' or 'none' for the given output stream."""
+    stream = stream or sys.stdout
+    if os.environ.get('NO_COLOR'):
+        return 'none'
+    if not (hasattr(stream, 'isatty') and stream.isatty()):
+        return 'none'
+    term = os.environ.get('TERM', '')
+    if term == 'dumb':
+        return 'none'
+    if os.environ.get('COLORTERM', '').lower() in ('truecolor', '24bit'):
+        return 'truecolor'
+    if '256' in term:
+        return '256'
+    return '16'
+
+def _rgb(color: str) -> Tuple[int, int, int]:
+    return int(color[1:3], 16), int(color[3:5], 16), int(color[5:7], 16)
+
+def _distance(a: Tuple[int, int, int], b: Tuple[int, int, int]) -> int:
+    return sum((x - y) ** 2 for x, y in zip(a, b))
+
+def color_escape(color: str, depth: str) -> str:
+    """ANSI foreground escape for an '#rrggbb' colour at a colour depth."""
+    rgb = _rgb(color)
+    if depth == 'truecolor':
+        return '\033[38;2;{};{};{}m'.format(*rgb)
+    if depth == '256':
+        cube = [min(range(6), key=lambda i: abs(CUBE_LEVELS[i] - channel)) for channel in rgb]
+        cube_rgb = tuple(CUBE_LEVELS[i] for i in cube)
+        gray = min(23, max(0, round((sum(rgb) / 3 - 8) / 10)))
+        gray_rgb = (8 + 10 * gray,) * 3
+        if _distance(rgb, gray_rgb) < _distance(rgb, cube_rgb):
+            return f'\033[38;5;{232 + gray}m'
+        return f'\033[38;5;{16 + 36 * cube[0] + 6 * cube[1] + cube[2]}m'
+    if depth == '16':
+        code = min(ANSI_16, key=lambda code: _distance(rgb, ANSI_16[code]))
+        return f'\033[{code}m'
+    return ''
+
+class Theme:
+    """Colour codes and pre-styled message templates for one theme and terminal.
+
+    The terminal's colour depth is detected once; every template is compiled
+    with its colour codes up front, so rendering a message is a single
+    ``str.format`` of the values that change.
+    """
+
+    def __init__(self, name: str = DEFAULT_THEME, depth: Optional[str] = None):
+        if name not in THEMES:
+            raise ValueError(f"unknown theme {name!r}")
+        palette = THEMES[name]
+        self.name = name
+        self.depth = 'none' if palette is None else depth or detect_color_depth()
+        self.codes = {role: color_escape(color, self.depth)
+                      for role, color in (palette or THEMES[DEFAULT_THEME]).items()}
+        self.codes['RESET'] = '\033[0m' if self.depth != 'none' else ''
+        self.templates = {name: self._compile(template) for name, template in MESSAGE_TEMPLATES.items()}
+        for outcome, role in OUTCOME_COLORS.items():
+            color = self.codes[role]
+            self.templates[f'card_{outcome}'] = self._compile(CARD_TEMPLATE, color=color)
+            self.templates[f'card_output_{outcome}'] = self._compile(CARD_OUTPUT_TEMPLATE, color=color)
+            self.templates[f'card_live_{outcome}'] = self._compile(CARD_LIVE_TEMPLATE, color=color)
+            self.templates[f'card_end_{outcome}'] = self._compile(CARD_END_TEMPLATE, color=color)
+
+    def _compile(self, template: str, **extra) -> str:
+        """Fill in colour codes, leaving the other fields (and their format specs) in place."""
+        known = dict(self.codes, **extra)
+        parts = []
+        for literal, field_name, spec, conversion in string.Formatter().parse(template):
+            parts.append(literal.replace('{', '{{').replace('}', '}}'))
+            if field_name is None:
+                continue
+            if field_name in known:
+                parts.append(known[field_name])
+            else:
+                parts.append('{' + field_name + (f'!{conversion}' if conversion else '')
+                             + (f':{spec}' if spec else '') + '}')
+        return ''.join(parts)
+
+    def render(self, name: str, **values) -> str:
+        return self.templates[name].format(**values)
+
+def load_theme(name: str) -> Theme:
+    """Build the named theme, falling back to the default one with a warning if it is unknown."""
+    try:
+        return Theme(name)
+    except ValueError as e:
+        print(f"bash-tutor: {e}, using the {DEFAULT_THEME!r} theme "
+              f"(choose from {', '.join(THEMES)})", file=sys.stderr)
+        return Theme(DEFAULT_THEME)
+
+THEME = load_theme(os.environ.get('BASH_TUTOR_THEME', DEFAULT_THEME))
+
+# ANSI escape codes for colors, as rendered by the active theme
+CYAN = THEME.codes['CYAN']
+ROSE = THEME.codes['ROSE']
+BLUE = THEME.codes['BLUE']
+PURPLE = THEME.codes['PURPLE']
+LIGHT_PURPLE = THEME.codes['LIGHT_PURPLE']
+YELLOW = THEME.codes['YELLOW']
+ORANGE = THEME.codes['ORANGE']
+SOFT_GOLD = THEME.codes['SOFT_GOLD']
+PEACH = THEME.codes['PEACH']
+LAVENDER = THEME.codes['LAVENDER']
+SAGE = THEME.codes['SAGE']
+SKY_BLUE = THEME.codes['SKY_BLUE']
+RESET = THEME.codes['RESET']
+
+def set_theme(name: str, depth: Optional[str] = None):
+    """Switch the active theme, including the module-level colour constants."""
+    global THEME
+    THEME = Theme(name, depth)
+    globals().update(THEME.codes)
 
 # Score constants
 CORRECT_POINTS = 1
 INCORRECT_POINTS = -5
 CASE_MISMATCH_POINTS = -2
 
+# Question packs
+PACK_DIR = os.environ.get('BASH_TUTOR_PACKS',
+                          os.path.join(os.path.dirname(os.path.abspath(__file__)), 'packs'))
+PACK_CACHE_FILE = 'bash-tutor-pack-cache.bin'
+PACK_CACHE_VERSION = 3 # 3: template slots
+
+# Catalog validation
+VALIDATE_CACHE_FILE = 'bash-tutor-validate-cache.json'
+VALIDATE_CHECKS_VERSION = 2 # Bump when the checks change to invalidate cached results
+VALIDATE_CHUNK_SIZE = 32
+
+# Sample output checks
+OUTPUTS_CACHE_FILE = 'bash-tutor-outputs-cache.json'
+OUTPUTS_VERSION = 1 # Bump when running or normalising changes to invalidate cached runs
+OUTPUTS_TIMEOUT = 5.0
+# Programs an example may use to be run; anything else (network, sudo, package
+# managers, system state, rm, and eval/source/xargs/env/command/builtin, which run
+# other commands) is skipped
+OUTPUTS_SAFE_PROGRAMS = frozenset("""
+    echo printf cat head tail wc sort uniq cut tr grep egrep fgrep sed awk basename dirname
+    expr seq true false test [ [[ pwd ls mkdir rmdir touch cp mv ln find tee diff
+    comm paste rev tac nl fold fmt column od base64 md5sum sha256sum date sleep whoami id
+    printenv stat du file chmod realpath readlink bc yes tar gzip gunzip zcat
+    if then else elif fi for while until do done case esac in function return local declare
+    typeset readonly export unset read shift set let exit break continue trap
+    cd pushd popd dirs type alias unalias wait jobs getopts mapfile
+""".split())
+OUTPUTS_UNSAFE_PATH = re.compile(r"(?:^|[\s=<>'\"])(?:/(?!dev/null)|~)|\$HOME"
+                                 r"|(?<![^\s=<>'\"/:])\.\.(?![^\s/;|&)'\"])") # Outside the sandbox, or '..'
+OUTPUTS_UNSAFE_FIND = re.compile(r"(?:^|\s)-(?:exec|execdir|ok|okdir|delete)\b") # find actions that run or remove
+# Files every example starts with; referenced by many examples and sample outputs
+OUTPUTS_FIXTURE = {
+    'notes.txt': "This is the content of notes.txt\nIt shows all lines at once\n",
+    'file.txt': "line one\nline two\nline three\n",
+    'document.txt': "A short document.\n",
+    'example.txt': "example\n",
+    'readme.txt': "Read me first.\n",
+    'test.txt': "test\n",
+    'todo.txt': "- write tests\n",
+    'data.csv': "name,age\nalice,30\nbob,25\n",
+    'script.sh': "#!/bin/bash\necho \"Hello from script\"\n",
+    'documents/report.txt': "Quarterly report\n",
+    'downloads/archive.txt': "archived\n",
+    'pictures/.keep': "",
+}
+
+# Export settings
+EXPORT_DIR = 'bash-tutor-export'
+EXPORT_MANIFEST = '.bash-tutor-export.json' # Digest of the entries behind each output file
+EXPORT_FORMAT_VERSION = 2 # Bump when the output layout changes to regenerate every file
+EXPORT_FORMATS = ('anki', 'jsonl', 'markdown', 'html')
+
+# Shared storage
+DATA_DIR = os.environ.get('BASH_TUTOR_DATA', '.')
+LEADERBOARD_FILE = 'bash-tutor-leaderboard.jsonl'
+LEADERBOARD_SIZE = 10 # Entries shown by the 'top' command
+
+# Answer prompt
+HISTORY_FILE = 'bash-tutor-history'
+HISTORY_LENGTH = 1000
+MAX_COMPLETIONS = 100 # Completions cached per trie node
+SESSION_COMMANDS = ('exit', 'hint', 'skip', 'mode', 'mix', 'adaptive', 'drill', 'top',
+                    'review', 'explain', 'clears', 'clearh', 'clearb')
+PIPELINE_SEPARATOR = re.compile(r'[|;&]|\$\(|`') # Starts a new command when completing
+
+# Profiling: methods timed by --profile, as (attribute, phase name)
+PROFILE_TUTOR_PHASES = (('get_random_question', 'select'), ('check_answer', 'check_answer'),
+                        ('display_explanation', 'display_explanation'),
+                        ('update_score', 'update_score'), ('save_high_score', 'save_high_score'),
+                        ('print_question', 'render'))
+PROFILE_MEMORY_TOP = 10 # Allocation sites listed by --profile-memory
+
+# Command explanations
+MAN_INDEX_FILE = 'bash-tutor-man-index.sqlite3'
+MAN_INDEX_VERSION = 1 # Bump when man page parsing changes to rebuild the index
+MAN_PATH = os.environ.get('MANPATH') or '/usr/local/share/man:/usr/share/man'
+MAN_SECTIONS = ('1', '8', '6') # Sections that document commands, in lookup order
+MAN_FLAG_TEXT_LENGTH = 200 # Flag explanations keep their first sentence, up to this length
+MAN_PARALLEL_THRESHOLD = 64 # Parse in worker processes when this many pages changed
+COMMAND_WRAPPERS = ('sudo', 'time', 'env', 'nohup', 'nice', 'xargs', 'exec', 'command', 'builtin', 'watch')
+OPERATOR_EXPLANATIONS = {
+    '|': "pipe: send the output of the previous command to the next one",
+    '||': "run the next command only if the previous one failed",
+    '&&': "run the next command only if the previous one succeeded",
+    ';': "run the next command after the previous one",
+    '&': "run the previous command in the background",
+    '>': "redirect output to a file, replacing it",
+    '>>': "redirect output to a file, appending to it",
+    '<': "read input from a file",
+}
+
+# Live evaluation
+LIVE_MODES = ('v', 's') # Keys of the modes (Variables, Scripting) whose examples --live runs
+LIVE_TIMEOUT = 2.0 # Seconds an evaluation may run before its shell is killed
+LIVE_CPU_SECONDS = 2 # ulimit -t for each evaluation
+LIVE_FILE_BLOCKS = 1024 # ulimit -f (1 KiB blocks) for each evaluation
+LIVE_OUTPUT_LIMIT = 64 * 1024 # Bytes of output kept per evaluation
+VARIABLE_REFERENCE = re.compile(r'\$(?:\w+|[?$!#@*0-9-]|\{\w+\})') # Answers --live may expand
+# Runs in each coprocess: read a byte count and that many bytes of code, evaluate the
+# code in a subshell inside the sandbox, then print a marker line with the exit status
+LIVE_LOOP = r"""
+__bash_tutor_token=%s
+__bash_tutor_loop() {
+    local __n __code
+    while IFS= read -r __n; do
+        IFS= read -r -N "$__n" __code
+        # BASH_SUBSHELL=0 so the snippet sees the values of a top-level shell
+        ( ulimit -t %d -f %d -c 0 2>/dev/null; BASH_SUBSHELL=0; cd "$HOME" && eval "$__code" ) </dev/null 2>&1
+        printf '\n%%s %%d\n' "$__bash_tutor_token" "$?"
+    done
+}
+__bash_tutor_loop
+"""
+
+# Mock API server
+MOCK_API_HOST = '127.0.0.1'
+MOCK_API_PORT = 8787 # Port of the 'mock-api' subcommand; --mock-api picks a free one
+# Hosts used by the API questions; answers are sent to the mock server instead
+MOCK_API_HOSTS = re.compile(r'https?://(?:api\.example\.com|openrouter\.ai|example\.com)(?=[/"\'\s]|$)')
+MOCK_API_RATE_LIMIT = 120 # Requests per client address (and trace) per window
+MOCK_API_RATE_WINDOW = 60 # Seconds
+MOCK_API_TRACES = 10000 # Traced request lists kept for grading
+MOCK_API_TIMEOUT = 10 # Seconds a graded curl command may run
+MOCK_API_ENV = {'OPENROUTER_KEY': 'sk-or-tutor-key'} # Variables the API answers use
+MOCK_CURL_REFUSED = ('-K', '--config', '-:', '--next') # Options that read other options or start a new transfer
+MOCK_CURL_OUTSIDE = re.compile(r"(?:^|[@=<])(?:/|~)|(?:^|[/@=<])\.\.(?:/|$)") # Absolute, home or '..' paths
+MOCK_API_RESOURCES = ({'id': 1, 'key': 'value'}, {'id': 2, 'key': 'other_value'}) # What /data starts with
+
+# Classroom broadcast
+CLASSROOM_HOST = '0.0.0.0'
+CLASSROOM_PORT = 8788
+CLASSROOM_BACKLOG = 1 << 20 # Unsent bytes after which a stalled learner is dropped
+CLASSROOM_REDRAW = 0.2 # Seconds between histogram redraws
+CLASSROOM_HISTOGRAM_WIDTH = 30
+
+# Exams
+EXAM_DIR = 'bash-tutor-exam' # Where 'exam generate' writes papers
+EXAM_VERSION = 3 # 2: papers carry the examiner's token and a digest of their questions; 3: signed results
+EXAM_MINUTES = 30 # Default time allowed for a sitting
+EXAM_KEY_ENV = 'BASH_TUTOR_EXAM_KEY' # Examiner's secret for issuing papers; else EXAM_KEY_FILE is used
+EXAM_KEY_FILE = 'bash-tutor-exam.key'
+EXAM_SITTING_KEY_ENV = 'BASH_TUTOR_SITTING_KEY' # A paper's sitting key, as printed by 'exam release'
+
+# Grading cache
+GRADING_CACHE_FILE = 'bash-tutor-grading-cache.json'
+GRADING_CACHE_SIZE = 4096 # Graded answers remembered, least recently used dropped first
+GRADING_CACHE_VERSION = 2 # Bump when grading changes to drop saved verdicts; 2: raw answer keys
+
+# Review queue
+REVIEW_FILE = 'bash-tutor-review.json'
+REVIEW_QUEUE_SIZE = 50 # Missed questions remembered per learner
+REVIEW_SAVE_EVERY = 20 # Review queue changes between writes; the rest are written at exit
+
+# Session checkpoints
+CHECKPOINT_MAGIC = b'BTCK'
+CHECKPOINT_VERSION = 3 # 2: random seed and generator state, 3: review mode
+RNG_STATE_WORDS = 625 # Mersenne Twister state words plus position, as in random.getstate()
+
+# Event log
+EVENTS_FILE = 'bash-tutor-events.jsonl'
+
+# Timed drills
+LATENCY_FILE = 'bash-tutor-latency.json'
+DRILL_FAST_SECONDS = 5 # Correct answers faster than this earn DRILL_FAST_BONUS
+DRILL_FAST_BONUS = 2
+DRILL_OK_SECONDS = 10 # ...and faster than this DRILL_OK_BONUS
+DRILL_OK_BONUS = 1
+
+# Cohort analytics (two-parameter logistic item response model)
+CALIBRATION_FILE = 'bash-tutor-calibration.json'
+IRT_ITERATIONS = 200
+IRT_TOLERANCE = 1e-3 # Stop once no parameter moves further than this (logits)
+IRT_MAX_STEP = 1.0 # Largest change of a parameter per iteration (logits)
+IRT_DIFFICULTY_SD = 2.0 # Priors keep learners and questions with uniform answers finite
+IRT_DISCRIMINATION_SD = 0.5
+IRT_MIN_ANSWERS = 20 # Questions with fewer answers are calibrated but not reported
+IRT_MIN_DISCRIMINATION = 0.2 # Below this a question barely separates strong and weak learners
+ELO_PER_LOGIT = 400 / math.log(10) # Converts a calibrated difficulty to a question rating
+ANALYTICS_TOP = 5 # Hardest and easiest questions listed
+# An answer event as EventLog writes it, matched without a JSON parse; strings stay JSON-encoded
+_JSON_STRING = rb'"[^"\\\n]*(?:\\.[^"\\\n]*)*"'
+ANSWER_EVENT = re.compile(rb'\{"event": "answer", "time": [^,]*, "user": (' + _JSON_STRING + rb'|null), '
+                          rb'"seed": [^,]*, "question": (' + _JSON_STRING + rb'), '
+                          rb'"correct": (true|false), "case_mismatch": (true|false)')
+
+# Adaptive difficulty (Elo-style ratings)
+RATINGS_FILE = 'bash-tutor-ratings.json'
+INITIAL_LEARNER_RATING = 1000
+LEARNER_K = 32 # How far one answer moves the learner's rating
+QUESTION_K = 16 # How far one answer moves a question's rating
+TARGET_SUCCESS = 0.65 # Adaptive mode aims for questions answered correctly this often
+DIFFICULTY_BUCKET_WIDTH = 50
+RATINGS_SAVE_EVERY = 20 # Answers between ratings writes; the rest are written at exit
+
+def write_json_atomic(path: str, data) -> None:
+    """Write JSON to a temp file and rename it over ``path``."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+class Storage:
+    """Local storage backend for the files tutor processes share.
+
+    All files live in one data directory. ``lock`` serialises read-modify-write
+    cycles between processes with flock(2) where it is available.
+    """
+
+    def __init__(self, root: str = DATA_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    @contextmanager
+    def lock(self, name: str, shared: bool = False):
+        with open(self.path(f"{name}.lock"), 'a') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def read_json(self, name: str, default=None):
+        try:
+            with open(self.path(name), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return default
+
+    def write_json(self, name: str, data):
+        write_json_atomic(self.path(name), data)
+
+    def read_bytes(self, name: str) -> Optional[bytes]:
+        try:
+            with open(self.path(name), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def write_bytes(self, name: str, data: bytes):
+        """Write to a temp file and rename it into place, so readers never see a partial file."""
+        path = self.path(name)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def remove(self, name: str):
+        try:
+            os.remove(self.path(name))
+        except FileNotFoundError:
+            pass
+
 class Mode(Enum):
     BEGINNER = 'b'
     INTERMEDIATE = 'i'
@@ -46,22 +496,2550 @@ class Mode(Enum):
     API = 'p'
     GIT = 'g'
 
+# Flags that mean the same thing for a program, mapped to one canonical spelling
+FLAG_EQUIVALENCES = {
+    'cp': {'-R': '-r', '--recursive': '-r'},
+    'rm': {'-R': '-r', '--recursive': '-r', '--force': '-f', '--interactive': '-i'},
+    'mkdir': {'--parents': '-p'},
+    'grep': {'--recursive': '-r', '--ignore-case': '-i'},
+    'ls': {'--all': '-a'},
+    'git': {'--message': '-m'},
+}
+PIPELINE_OPERATORS = ('|', '||', '&&', ';')
+SHELL_OPERATOR_CHARS = '|&;<>()'
+UNQUOTED_SPECIAL = '$`*?[{~' # Expansions that unquoted words undergo
+DOUBLE_QUOTED_SPECIAL = '$`\\' # Still active inside double quotes
+
+def _closing(text: str, start: int, opening: str, closing: str) -> int:
+    """Index just past the bracket that closes the one at ``start``."""
+    depth = 0
+    for i in range(start, len(text)):
+        if text[i] == opening:
+            depth += 1
+        elif text[i] == closing:
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    raise ValueError("unbalanced expansion")
+
+def shell_words(text: str) -> List[List[Tuple[str, str]]]:
+    """Split a command line into words made of (kind, text) parts.
+
+    ``kind`` is 'lit' for text the shell passes on unchanged (quoted, escaped
+    or plain), 'raw' for unquoted text that undergoes expansion, 'dq' for
+    double-quoted text containing expansions and 'op' for operators and
+    redirections. Raises ValueError for unterminated quotes.
+    """
+    words, parts, i, n = [], [], 0, len(text)
+    while i < n:
+        char = text[i]
+        if char.isspace() or char in SHELL_OPERATOR_CHARS:
+            j = i
+            while j < n and text[j] in SHELL_OPERATOR_CHARS:
+                j += 1
+            if j > i:
+                operator = text[i:j]
+                if operator[0] in '<>' and len(parts) == 1 and parts[0][0] == 'lit' and parts[0][1].isdigit():
+                    operator, parts = parts[0][1] + operator, [] # A file descriptor, as in 2>&1
+            if parts:
+                words.append(parts)
+                parts = []
+            if j > i:
+                words.append([('op', operator)])
+            i = max(j, i + 1) if char.isspace() else j
+        elif char == "'":
+            j = text.find("'", i + 1)
+            if j < 0:
+                raise ValueError("unterminated single quote")
+            parts.append(('lit', text[i + 1:j]))
+            i = j + 1
+        elif char == '"':
+            j = i + 1
+            while j < n and text[j] != '"':
+                j += 2 if text[j] == '\\' else 1
+            if j >= n:
+                raise ValueError("unterminated double quote")
+            body = text[i + 1:j]
+            parts.append(('dq' if any(c in body for c in DOUBLE_QUOTED_SPECIAL) else 'lit', body))
+            i = j + 1
+        else:
+            j, expands = i, False
+            while j < n and not (text[j].isspace() or text[j] in SHELL_OPERATOR_CHARS or text[j] in '\'"'):
+                if text[j] == '\\':
+                    j += 2
+                    continue
+                if text[j:j + 2] in ('$(', '${'):
+                    j = _closing(text, j + 1, text[j + 1], ')' if text[j + 1] == '(' else '}')
+                elif text[j] == '`':
+                    end = text.find('`', j + 1)
+                    if end < 0:
+                        raise ValueError("unterminated backquote")
+                    j = end + 1
+                else:
+                    j += 1
+                expands = expands or text[j - 1] in UNQUOTED_SPECIAL or text[j - 1] in ')}'
+            segment = text[i:j]
+            parts.append(('raw', segment) if expands else ('lit', re.sub(r'\\(.)', r'\1', segment)))
+            i = j
+        if len(parts) > 1 and parts[-1][0] == parts[-2][0] == 'lit':
+            parts[-2:] = [('lit', parts[-2][1] + parts[-1][1])]
+    if parts:
+        words.append(parts)
+    return words
+
+def _render_word(parts: List[Tuple[str, str]]) -> str:
+    return ''.join(shlex.quote(text) if kind == 'lit' else f'"{text}"' if kind == 'dq' else text
+                   for kind, text in parts)
+
+def canonical_answer(text: str, equivalences: Dict[str, str] = None) -> str:
+    """Normalise an answer so that equivalent spellings compare equal.
+
+    Spacing and quoting are normalised word by word, keeping apart words the
+    shell would treat differently (``$HOME``, ``"$HOME"`` and ``'$HOME'``).
+    Per-program flag aliases (FLAG_EQUIVALENCES) and the question's own
+    ``equivalences`` are then applied to the literal words.
+    """
+    text = text.strip()
+    try:
+        words = shell_words(text)
+    except ValueError:
+        words = [[('raw', word)] for word in text.split()]
+    program = None
+    rendered = []
+    for parts in words:
+        kind, word = parts[0] if len(parts) == 1 else ('raw', _render_word(parts))
+        if kind == 'op':
+            if word in PIPELINE_OPERATORS:
+                program = None
+            rendered.append(word)
+            continue
+        if kind == 'lit':
+            if program is None:
+                program = word
+            else:
+                word = FLAG_EQUIVALENCES.get(program, {}).get(word, word)
+            if equivalences:
+                word = equivalences.get(word, word)
+            rendered.append(shlex.quote(word))
+        else:
+            if program is None:
+                program = word
+            rendered.append(_render_word(parts))
+    return ' '.join(rendered)
+
 @dataclass
 class Command:
     command: str
     explanation: str
     example: str
     output: str = "" # Optional output for demonstration
+    alternatives: Tuple[str, ...] = () # Other answers that are also correct
+    equivalences: Tuple[Tuple[str, str], ...] = () # (word, same-meaning word) rules for this question
+    accepted: frozenset = field(init=False, repr=False, compare=False)
+    accepted_folded: frozenset = field(init=False, repr=False, compare=False)
+    digest: str = field(init=False, repr=False, compare=False) # Hash of what grading depends on
+
+    def __post_init__(self):
+        # Compile every accepted answer once, so grading is a set lookup
+        rules = dict(self.equivalences)
+        self.accepted = frozenset(canonical_answer(answer, rules)
+                                  for answer in (self.command,) + tuple(self.alternatives))
+        self.accepted_folded = frozenset(answer.lower() for answer in self.accepted)
+        self.digest = hashlib.sha1(repr((self.command, tuple(self.alternatives),
+                                         tuple(self.equivalences))).encode('utf-8')).hexdigest()
+
+    def canonical(self, answer: str) -> str:
+        return canonical_answer(answer, dict(self.equivalences))
+
+def grade_answer(command: Command, user_answer: str) -> Tuple[bool, bool]:
+    """Return (is_correct, is_case_mismatch) for an answer to ``command``."""
+    answer = command.canonical(user_answer)
+    if answer in command.accepted:
+        return True, False
+    if answer.lower() in command.accepted_folded:
+        return False, True
+    return False, False
     
+SLOT_PATTERN = re.compile(r'\{(\w+)\}')
+SLOT_RANGE = re.compile(r'^(-?\d+)\.\.(-?\d+)$')
+
+def fill_slots(text: str, params: Dict[str, str]) -> str:
+    """Replace {slot} fields, leaving other braces (awk programs, ${var}) alone."""
+    return SLOT_PATTERN.sub(lambda m: params.get(m.group(1), m.group(0)), text)
+
+@dataclass
+class QuestionTemplate:
+    """A question with {slots}, instantiated with fresh values each time it is drawn.
+
+    ``slots`` maps each slot to its choices, either a tuple of strings or a
+    range such as "5..50". The answer, alternatives, explanation and example
+    are filled from the same values as the question, so one template stands
+    for every combination without storing any of them.
+    """
+    command: str
+    explanation: str
+    example: str
+    output: str = ""
+    alternatives: Tuple[str, ...] = ()
+    equivalences: Tuple[Tuple[str, str], ...] = ()
+    slots: Dict[str, Union[str, Tuple[str, ...]]] = field(default_factory=dict)
+    choices: Dict[str, Union[range, Tuple[str, ...]]] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.choices = {}
+        for name, spec in sorted(self.slots.items()):
+            match = SLOT_RANGE.match(spec) if isinstance(spec, str) else None
+            self.choices[name] = range(int(match.group(1)), int(match.group(2)) + 1) if match else tuple(spec)
+            if not self.choices[name]:
+                raise ValueError(f"slot {name!r} has no values")
+
+    @property
+    def variants(self) -> int:
+        return math.prod(len(values) for values in self.choices.values())
+
+    def instantiate(self, question: str, rng=random) -> Tuple[str, Command]:
+        """Draw slot values and return the filled-in question and its Command."""
+        params = {name: str(rng.choice(values)) for name, values in self.choices.items()}
+        return fill_slots(question, params), Command(
+            fill_slots(self.command, params), fill_slots(self.explanation, params),
+            fill_slots(self.example, params), fill_slots(self.output, params),
+            tuple(fill_slots(answer, params) for answer in self.alternatives),
+            tuple((fill_slots(word, params), fill_slots(same, params)) for word, same in self.equivalences))
+
+    def sample(self, question: str) -> Tuple[str, Command]:
+        """One fixed instance of the template, the same on every run, for static listings."""
+        return self.instantiate(question, random.Random(question))
+
 @dataclass
 class Variable:
     name: str
     explanation: str
     example: str
-    output: str = "" # Optional oputput for the example
+    output: str = "" # Optional output for the example
+
+@dataclass(frozen=True)
+class PackMode:
+    """A mode registered at runtime by a question pack."""
+    value: str
+    name: str
+    description: str = ""
+
+AnyMode = Union[Mode, PackMode]
+
+# Starting difficulty of questions that have no rating yet
+MODE_DIFFICULTY = {
+    Mode.BEGINNER: 800,
+    Mode.UNDERSTANDING: 900,
+    Mode.INTERMEDIATE: 1000,
+    Mode.VARIABLES: 1000,
+    Mode.GIT: 1000,
+    Mode.SCRIPTING: 1100,
+    Mode.API: 1100,
+    Mode.ADVANCED: 1200,
+}
+
+def question_id(mode: AnyMode, question: str) -> str:
+    """Stable identifier of a question across sessions."""
+    return f"{mode.value}:{question}"
+
+MODE_DESCRIPTIONS = {
+    Mode.BEGINNER: "Beginner (basic file operations, navigation)",
+    Mode.INTERMEDIATE: "Intermediate (file searching, system monitoring, processes, networking)",
+    Mode.ADVANCED: "Advanced (system administration, performance tuning)",
+    Mode.UNDERSTANDING: "Understanding (understanding of commands and flags)",
+    Mode.VARIABLES: "Variables (shell variables and their meanings)",
+    Mode.SCRIPTING: "Scripting (bash scripting concepts)",
+    Mode.API: "API (using curl to interact with APIs)",
+    Mode.GIT: "Git (basic git commands)",
+}
+
+class PackError(ValueError):
+    """Raised when a question pack file is malformed."""
+
+@dataclass
+class Pack:
+    path: str
+    mode: PackMode
+    questions: Dict[str, Command] = field(default_factory=dict)
+
+def validate_pack(data) -> dict:
+    """Check the structure of a parsed pack and return it normalised.
+
+    A pack is a JSON object of the form::
+
+        {"mode": {"key": "k", "name": "Kubernetes", "description": "..."},
+         "questions": {"How do you list pods?": {"command": "kubectl get pods",
+                                                 "explanation": "...",
+                                                 "example": "...",
+                                                 "output": "..."}}}
+
+    Using the key of a built-in mode (e.g. "g") adds the questions to that mode.
+    Questions may also list other correct answers under "alternatives" and
+    words with the same meaning under "equivalences" (e.g. {"--all": "-a"}).
+    A question with "slots" is a template: {"slots": {"ext": ["txt", "log"],
+    "n": "1..20"}} fills {ext} and {n} in the question and its fields.
+    """
+    if not isinstance(data, dict):
+        raise PackError("pack must be a JSON object")
+    mode = data.get('mode')
+    if not isinstance(mode, dict) or not isinstance(mode.get('key'), str) or not mode['key'].strip():
+        raise PackError("pack needs a 'mode' object with a non-empty 'key'")
+    key = mode['key'].strip().lower()
+    if key == 'exit' or ':' in key or any(c.isspace() for c in key):
+        raise PackError(f"invalid mode key {mode['key']!r}")
+    questions = data.get('questions')
+    if not isinstance(questions, dict) or not questions:
+        raise PackError("pack needs a non-empty 'questions' object")
+    normalised = {}
+    for question, entry in questions.items():
+        if not isinstance(entry, dict):
+            raise PackError(f"question {question!r} must be an object")
+        for required in ('command', 'explanation', 'example'):
+            if not isinstance(entry.get(required), str) or not entry[required].strip():
+                raise PackError(f"question {question!r} is missing '{required}'")
+        if not isinstance(entry.get('output', ''), str):
+            raise PackError(f"question {question!r} has a non-string 'output'")
+        alternatives = entry.get('alternatives', [])
+        if not isinstance(alternatives, list) or not all(isinstance(a, str) and a.strip() for a in alternatives):
+            raise PackError(f"question {question!r} needs 'alternatives' to be a list of answers")
+        equivalences = entry.get('equivalences', {})
+        if not isinstance(equivalences, dict) or not all(isinstance(v, str) for v in equivalences.values()):
+            raise PackError(f"question {question!r} needs 'equivalences' to map words to words")
+        normalised[question] = {name: entry.get(name, '')
+                                for name in ('command', 'explanation', 'example', 'output')}
+        normalised[question]['alternatives'] = alternatives
+        normalised[question]['equivalences'] = sorted(equivalences.items())
+        slots = entry.get('slots')
+        if slots is not None:
+            if not isinstance(slots, dict) or not slots or not all(
+                    (isinstance(spec, str) and SLOT_RANGE.match(spec))
+                    or (isinstance(spec, list) and spec and all(isinstance(v, (str, int)) for v in spec))
+                    for spec in slots.values()):
+                raise PackError(f"question {question!r} needs 'slots' to map names to value lists or ranges like \"1..20\"")
+            unknown = set(SLOT_PATTERN.findall(question)) - set(slots)
+            if unknown:
+                raise PackError(f"question {question!r} uses undefined slots: {', '.join(sorted(unknown))}")
+            normalised[question]['slots'] = {name: spec if isinstance(spec, str) else [str(v) for v in spec]
+                                             for name, spec in slots.items()}
+    return {
+        'mode': {'key': key,
+                 'name': str(mode.get('name') or key),
+                 'description': str(mode.get('description', ''))},
+        'questions': normalised,
+    }
+
+class PackLoader:
+    """Discovers question packs in a directory and loads them incrementally.
+
+    Parsed packs are cached on disk keyed by file mtime/size and content hash,
+    so on startup only packs that actually changed are read and validated again.
+    The cache is written with ``marshal``, which loads several times faster
+    than JSON; entries of the wrong shape are dropped and their packs re-parsed.
+    """
+
+    def __init__(self, directory: str = PACK_DIR, cache_path: str = PACK_CACHE_FILE):
+        self.directory = os.path.abspath(directory)
+        self.cache_path = cache_path
+        self.cache = self._load_cache()
+
+    def _load_cache(self) -> dict:
+        try:
+            with open(self.cache_path, 'rb') as f:
+                cache = marshal.load(f)
+        except (OSError, ValueError, EOFError, TypeError):
+            return {}
+        if not isinstance(cache, dict) or cache.get('version') != PACK_CACHE_VERSION:
+            return {}
+        packs = cache.get('packs')
+        if not isinstance(packs, dict):
+            return {}
+        return {path: entry for path, entry in packs.items() if self._valid_entry(entry)}
+
+    @staticmethod
+    def _valid_entry(entry) -> bool:
+        return (isinstance(entry, dict) and isinstance(entry.get('mtime_ns'), int)
+                and isinstance(entry.get('size'), int) and isinstance(entry.get('sha256'), str)
+                and isinstance(entry.get('data'), dict) and isinstance(entry['data'].get('mode'), dict)
+                and isinstance(entry['data'].get('questions'), dict))
+
+    def _save_cache(self):
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                marshal.dump({'version': PACK_CACHE_VERSION, 'packs': self.cache}, f)
+            os.replace(tmp_path, self.cache_path)
+        except (OSError, ValueError) as e:
+            print(f"Error saving pack cache: {e}")
+
+    def discover(self) -> List[str]:
+        """Return the pack files in the pack directory, sorted by name."""
+        try:
+            entries = os.scandir(self.directory)
+        except OSError:
+            return []
+        with entries:
+            return sorted(entry.path for entry in entries
+                          if entry.name.endswith('.json') and entry.is_file())
+
+    def _read(self, path: str) -> Tuple[dict, bool]:
+        """Return (cached entry, content changed) for a pack, re-parsing only if needed."""
+        st = os.stat(path)
+        cached = self.cache.get(path)
+        if cached and cached['mtime_ns'] == st.st_mtime_ns and cached['size'] == st.st_size:
+            return cached, False
+        with open(path, 'rb') as f:
+            raw = f.read()
+        digest = hashlib.sha256(raw).hexdigest()
+        if cached and cached['sha256'] == digest:
+            # Touched but not modified: keep the parsed data, refresh the stat key
+            cached.update(mtime_ns=st.st_mtime_ns, size=st.st_size)
+            self.dirty = True
+            return cached, False
+        data = validate_pack(json.loads(raw.decode('utf-8')))
+        entry = {'mtime_ns': st.st_mtime_ns, 'size': st.st_size, 'sha256': digest, 'data': data}
+        self.cache[path] = entry
+        self.dirty = True
+        return entry, True
+
+    def load(self) -> List[Pack]:
+        """Load every valid pack in the directory.
+
+        Afterwards ``modified`` holds the paths whose content changed since the
+        previous load and ``removed`` the paths that disappeared.
+        """
+        paths = self.discover()
+        self.dirty = False
+        self.modified = set()
+        packs = []
+        for path in paths:
+            try:
+                entry, changed = self._read(path)
+            except (OSError, ValueError) as e:
+                entry, changed = self.cache.get(path), False
+                if entry is None:
+                    print(f"Error loading pack {path}: {e}")
+                    continue
+                print(f"Error loading pack {path}: {e} (keeping previous version)")
+            if changed:
+                self.modified.add(path)
+            packs.append(self._build(path, entry['data']))
+        present = set(paths)
+        self.removed = {path for path in self.cache if path not in present}
+        for path in self.removed:
+            del self.cache[path]
+        if self.dirty or self.removed:
+            self._save_cache()
+        return packs
+
+    @staticmethod
+    def _build(path: str, data: dict) -> Pack:
+        mode = data['mode']
+        return Pack(
+            path,
+            PackMode(mode['key'], mode['name'], mode['description']),
+            {question: (QuestionTemplate if 'slots' in entry else Command)(
+                entry['command'], entry['explanation'], entry['example'], entry['output'],
+                tuple(entry['alternatives']), tuple(map(tuple, entry['equivalences'])),
+                **({'slots': {name: spec if isinstance(spec, str) else tuple(spec)
+                              for name, spec in entry['slots'].items()}} if 'slots' in entry else {}))
+             for question, entry in data['questions'].items()},
+        )
+
+class AliasSampler:
+    """Weighted sampling with Vose's alias method: O(n) setup, O(1) per draw."""
+
+    def __init__(self, items: list, weights: List[float]):
+        if not items or len(items) != len(weights) or any(w < 0 for w in weights) or sum(weights) <= 0:
+            raise ValueError("need at least one item with a positive weight")
+        n = len(items)
+        total = sum(weights)
+        scaled = [w * n / total for w in weights]
+        self.items = list(items)
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.prob[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+
+    def draw(self, rng=random):
+        i = rng.randrange(len(self.items))
+        return self.items[i] if rng.random() < self.prob[i] else self.items[self.alias[i]]
+
+def parse_mode_mix(spec: str, modes: Dict[str, AnyMode]) -> Dict[str, float]:
+    """Parse a mix such as "g=50,s=30,a=20" into {mode key: weight}."""
+    weights = {}
+    for part in spec.split(','):
+        key, sep, weight = part.strip().partition('=')
+        key = key.strip().lower()
+        if not sep or key not in modes:
+            raise ValueError(f"expected mode=weight with a known mode, got {part.strip()!r}")
+        try:
+            value = float(weight.strip().rstrip('%'))
+        except ValueError:
+            raise ValueError(f"invalid weight for mode {key!r}: {weight.strip()!r}") from None
+        if not math.isfinite(value):
+            raise ValueError(f"weight for mode {key!r} must be a finite number")
+        if value < 0:
+            raise ValueError(f"weight for mode {key!r} must not be negative")
+        weights[key] = weights.get(key, 0) + value
+    if not any(weights.values()):
+        raise ValueError("at least one mode needs a positive weight")
+    if not math.isfinite(sum(weights.values())):
+        raise ValueError("the weights are too large")
+    return weights
+
+def expected_success(learner_rating: float, question_rating: float) -> float:
+    """Probability that a learner answers a question correctly under the Elo model."""
+    return 1.0 / (1.0 + 10 ** ((question_rating - learner_rating) / 400.0))
+
+class DifficultyIndex:
+    """Questions bucketed by rating, for finding questions near a given level.
+
+    Moving a question between buckets is O(1) (swap-remove), and a lookup
+    only scans outwards from the target bucket.
+    """
+
+    def __init__(self, width: int = DIFFICULTY_BUCKET_WIDTH):
+        self.width = width
+        self.buckets: Dict[int, List[str]] = {}
+        self.positions: Dict[str, Tuple[int, int]] = {}
+        self.low = self.high = 0
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def update(self, qid: str, rating: float):
+        bucket = int(rating // self.width)
+        position = self.positions.get(qid)
+        if position is not None:
+            if position[0] == bucket:
+                return
+            self.remove(qid)
+        if not self.positions:
+            self.low = self.high = bucket
+        self.low, self.high = min(self.low, bucket), max(self.high, bucket)
+        entries = self.buckets.setdefault(bucket, [])
+        self.positions[qid] = (bucket, len(entries))
+        entries.append(qid)
+
+    def remove(self, qid: str):
+        bucket, index = self.positions.pop(qid)
+        entries = self.buckets[bucket]
+        last = entries.pop()
+        if index < len(entries):
+            entries[index] = last
+            self.positions[last] = (bucket, index)
+
+    def nearest(self, rating: float, exclude=lambda qid: False, rng=random) -> Optional[str]:
+        """Random question from the closest non-empty bucket to ``rating``."""
+        target = int(rating // self.width)
+        for distance in range(max(target - self.low, self.high - target) + 1):
+            for bucket in {target - distance, target + distance}:
+                entries = self.buckets.get(bucket)
+                if not entries:
+                    continue
+                for _ in range(8):
+                    qid = rng.choice(entries)
+                    if not exclude(qid):
+                        return qid
+                candidates = [qid for qid in entries if not exclude(qid)]
+                if candidates:
+                    return rng.choice(candidates)
+        return None
+
+class SkillModel:
+    """Elo-style ratings for learners and questions, persisted to a JSON file."""
+
+    def __init__(self, storage: Storage, name: str = RATINGS_FILE):
+        self.storage = storage
+        self.name = name
+        data = storage.read_json(name, {})
+        self.learners: Dict[str, float] = data.get('learners', {})
+        self.question_ratings: Dict[str, float] = data.get('questions', {})
+        # Difficulties fitted by the analytics command seed questions nobody has rated yet
+        self.calibration: Dict[str, dict] = storage.read_json(CALIBRATION_FILE, {})
+        self.index = DifficultyIndex()
+        self._indexed_catalog = None
+        self.unsaved = 0 # Updates since the last save
+
+    def learner_rating(self, user: str) -> float:
+        return self.learners.get(user, INITIAL_LEARNER_RATING)
+
+    def question_rating(self, mode: AnyMode, question: str) -> float:
+        qid = question_id(mode, question)
+        if qid in self.question_ratings:
+            return self.question_ratings[qid]
+        if qid in self.calibration:
+            return INITIAL_LEARNER_RATING + self.calibration[qid]['difficulty'] * ELO_PER_LOGIT
+        return MODE_DIFFICULTY.get(mode, INITIAL_LEARNER_RATING)
+
+    def index_catalog(self, questions: Dict[AnyMode, dict]):
+        """(Re)build the difficulty index when the catalog object changes."""
+        if self._indexed_catalog is questions:
+            return
+        self.index = DifficultyIndex()
+        for mode, entries in questions.items():
+            for question in entries:
+                self.index.update(question_id(mode, question), self.question_rating(mode, question))
+        self._indexed_catalog = questions
+
+    def update(self, user: str, mode: AnyMode, question: str, outcome: float):
+        """Apply one answer (1 correct, 0.5 case mismatch, 0 wrong) to both ratings."""
+        qid = question_id(mode, question)
+        learner = self.learner_rating(user)
+        difficulty = self.question_rating(mode, question)
+        surprise = outcome - expected_success(learner, difficulty)
+        self.learners[user] = learner + LEARNER_K * surprise
+        self.question_ratings[qid] = difficulty - QUESTION_K * surprise
+        self.unsaved += 1
+        if qid in self.index.positions:
+            self.index.update(qid, self.question_ratings[qid])
+
+    def save(self):
+        try:
+            self.storage.write_json(self.name, {'learners': self.learners, 'questions': self.question_ratings})
+            self.unsaved = 0
+        except OSError as e:
+            print(f"Error saving ratings: {e}")
+
+class P2Quantile:
+    """Streaming quantile estimate with the P² algorithm (Jain & Chlamtac).
+
+    Keeps five markers whatever the number of observations, so the state can
+    be stored per learner and question without growing.
+    """
+
+    def __init__(self, p: float, state: Optional[list] = None):
+        self.p = p
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+        self.count, self.heights, self.positions = state if state else (0, [], [1, 2, 3, 4, 5])
+        # Desired marker positions advance by a fixed increment per observation
+        done = max(self.count - 5, 0)
+        self.desired = [start + done * inc
+                        for start, inc in zip((1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5), self.increments)]
+
+    def state(self) -> list:
+        return [self.count, self.heights, self.positions]
+
+    def add(self, x: float):
+        self.count += 1
+        q, n = self.heights, self.positions
+        if self.count <= 5:
+            q.append(x)
+            q.sort()
+            return
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(4) if q[i] <= x < q[i + 1])
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = height
+                n[i] += d
+
+    def value(self) -> Optional[float]:
+        if not self.count:
+            return None
+        if self.count <= 5:
+            return self.heights[min(len(self.heights) - 1, int(round(self.p * (len(self.heights) - 1))))]
+        return self.heights[2]
+
+class LatencyTracker:
+    """Per-learner, per-question answer time percentiles (median and 90th)."""
+
+    def __init__(self, storage: Storage, name: str = LATENCY_FILE):
+        self.storage = storage
+        self.name = name
+        self.data: Dict[str, Dict[str, dict]] = storage.read_json(name, {})
+        self.unsaved = 0 # Answers recorded since the last save
+
+    def record(self, user: str, qid: str, seconds: float):
+        self.unsaved += 1
+        entry = self.data.setdefault(user, {}).setdefault(qid, {'p50': None, 'p90': None})
+        for key, p in (('p50', 0.5), ('p90', 0.9)):
+            sketch = P2Quantile(p, entry[key])
+            sketch.add(seconds)
+            entry[key] = sketch.state()
+
+    def percentiles(self, user: str, qid: str) -> Tuple[Optional[float], Optional[float]]:
+        entry = self.data.get(user, {}).get(qid)
+        if not entry:
+            return None, None
+        return P2Quantile(0.5, entry['p50']).value(), P2Quantile(0.9, entry['p90']).value()
+
+    def save(self):
+        try:
+            self.storage.write_json(self.name, self.data)
+            self.unsaved = 0
+        except OSError as e:
+            print(f"Error saving answer times: {e}")
+
+class Metrics:
+    """Named counters of one tutor process, listed in the --profile report."""
+
+    def __init__(self):
+        self.counters: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counters)
+
+METRICS = Metrics()
+
+class GradingCache:
+    """Bounded LRU cache of verdicts keyed by (question id, answer).
+
+    Answers are keyed as typed, only trimmed, because spacing inside quotes
+    can change the verdict. Each verdict remembers the digest of the Command
+    it was graded against; a verdict whose question changed since (e.g. a
+    pack reload added an alternative) counts as a miss and is graded again.
+    With ``storage`` the cache is loaded at start, skipping malformed
+    entries, and saved by ``save``.
+    """
+
+    def __init__(self, size: int = GRADING_CACHE_SIZE, storage: Optional[Storage] = None,
+                 name: str = GRADING_CACHE_FILE):
+        self.size = size
+        self.storage = storage
+        self.name = name
+        self.entries: OrderedDict = OrderedDict()
+        if storage is not None:
+            data = storage.read_json(name, {})
+            if isinstance(data, dict) and data.get('version') == GRADING_CACHE_VERSION:
+                entries = data.get('entries')
+                for entry in (entries if isinstance(entries, list) else [])[-size:]:
+                    if self._valid_entry(entry):
+                        qid, answer, digest, is_correct, is_case_mismatch = entry
+                        self.entries[(qid, answer)] = (digest, is_correct, is_case_mismatch)
+
+    @staticmethod
+    def _valid_entry(entry) -> bool:
+        return (isinstance(entry, list) and len(entry) == 5
+                and all(isinstance(value, str) for value in entry[:3])
+                and all(isinstance(value, bool) for value in entry[3:]))
+
+    def grade(self, qid: str, command: Command, user_answer: str) -> Tuple[bool, bool]:
+        key = (qid, user_answer.strip())
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == command.digest:
+            self.entries.move_to_end(key)
+            METRICS.incr('grading_cache_hits')
+            return entry[1], entry[2]
+        METRICS.incr('grading_cache_misses')
+        is_correct, is_case_mismatch = grade_answer(command, user_answer)
+        self.entries[key] = (command.digest, is_correct, is_case_mismatch)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+            METRICS.incr('grading_cache_evictions')
+        return is_correct, is_case_mismatch
+
+    def save(self):
+        if self.storage is None:
+            return
+        try:
+            self.storage.write_json(self.name, {'version': GRADING_CACHE_VERSION,
+                                                'entries': [[qid, answer, *verdict] for (qid, answer), verdict
+                                                            in self.entries.items()]})
+        except OSError as e:
+            print(f"Error saving grading cache: {e}")
+
+class PhaseProfiler:
+    """Per-phase timers for --profile.
+
+    Phases are timed by replacing methods on an object with timed wrappers
+    (``instrument``), so a session without --profile runs the original
+    methods with no extra work. Durations go into power-of-two histogram
+    buckets plus P² median and 95th percentile estimates.
+    """
+
+    def __init__(self, dump_path: Optional[str] = None, memory_top: int = 0):
+        self.phases: Dict[str, dict] = {}
+        self.dump_path = dump_path
+        self.memory_top = memory_top
+        self.profile = None
+
+    def instrument(self, obj, phases):
+        for attribute, phase in phases:
+            setattr(obj, attribute, self.timed(phase, getattr(obj, attribute)))
+
+    def timed(self, phase: str, func):
+        record, clock = self.record, time.perf_counter_ns
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(phase, clock() - start)
+        return wrapper
+
+    def record(self, phase: str, elapsed_ns: int):
+        stats = self.phases.get(phase)
+        if stats is None:
+            stats = self.phases[phase] = {'count': 0, 'total': 0, 'max': 0, 'buckets': {},
+                                          'p50': P2Quantile(0.5), 'p95': P2Quantile(0.95)}
+        stats['count'] += 1
+        stats['total'] += elapsed_ns
+        stats['max'] = max(stats['max'], elapsed_ns)
+        # Bucket b holds durations in [2**(b-1), 2**b) microseconds
+        bucket = (elapsed_ns // 1000).bit_length()
+        stats['buckets'][bucket] = stats['buckets'].get(bucket, 0) + 1
+        stats['p50'].add(elapsed_ns)
+        stats['p95'].add(elapsed_ns)
+
+    def start(self):
+        if self.dump_path:
+            import cProfile
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        if self.memory_top:
+            import tracemalloc
+            tracemalloc.start()
+        atexit.register(self.report)
+
+    def report(self):
+        """Print the per-phase histograms, then write the optional dumps."""
+        if self.profile is not None:
+            self.profile.disable()
+        snapshot = None
+        if self.memory_top:
+            import tracemalloc
+            # Before reporting, so the report's own allocations are not listed
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+        print(f"\n{SOFT_GOLD}Profile (per phase):{RESET}")
+        for phase, stats in self.phases.items():
+            count = stats['count']
+            print(f"{SKY_BLUE}{phase}{RESET}: {count} calls, mean {_format_ns(stats['total'] / count)}, "
+                  f"p50 {_format_ns(stats['p50'].value())}, p95 {_format_ns(stats['p95'].value())}, "
+                  f"max {_format_ns(stats['max'])}")
+            largest = max(stats['buckets'].values())
+            for bucket in range(min(stats['buckets']), max(stats['buckets']) + 1):
+                hits = stats['buckets'].get(bucket, 0)
+                upper = _format_ns(1000 * 2 ** bucket)
+                print(f"  < {upper:>8} {'#' * math.ceil(30 * hits / largest):<30} {hits}")
+        counters = METRICS.snapshot()
+        if counters:
+            print(f"{SOFT_GOLD}Counters:{RESET}")
+            for name, value in sorted(counters.items()):
+                print(f"  {name}: {value}")
+        if self.profile is not None:
+            try:
+                self.profile.dump_stats(self.dump_path)
+                print(f"{SKY_BLUE}cProfile stats written to {self.dump_path} "
+                      f"(python -m pstats {self.dump_path}){RESET}")
+            except OSError as e:
+                print(f"Error writing profile: {e}")
+        if snapshot is not None:
+            print(f"{SOFT_GOLD}Top allocations:{RESET}")
+            for stat in snapshot.statistics('lineno')[:self.memory_top]:
+                print(f"  {stat}")
+
+def _format_ns(ns: float) -> str:
+    if ns < 1e6:
+        return f"{ns / 1e3:.0f}µs"
+    if ns < 1e9:
+        return f"{ns / 1e6:.1f}ms"
+    return f"{ns / 1e9:.2f}s"
+
+class Drill:
+    """A timed drill that ends after a number of questions or a countdown."""
+
+    def __init__(self, questions: Optional[int] = None, seconds: Optional[float] = None):
+        self.questions = questions
+        self.seconds = seconds
+        self.start()
+        self.answered = 0
+        self.correct = 0
+        self.points = 0
+        self.median = P2Quantile(0.5)
+        self.p90 = P2Quantile(0.9)
+
+    @classmethod
+    def parse(cls, spec: str) -> 'Drill':
+        """Parse "20" (questions), "90s" or "2m" (countdown)."""
+        spec = spec.strip().lower()
+        try:
+            if spec.endswith('s'):
+                seconds = float(spec[:-1])
+            elif spec.endswith('m'):
+                seconds = float(spec[:-1]) * 60
+            else:
+                count = int(spec)
+                if count <= 0:
+                    raise ValueError
+                return cls(questions=count)
+        except ValueError:
+            raise ValueError(f"expected a question count or a duration like 90s, got {spec!r}") from None
+        if seconds <= 0:
+            raise ValueError("drill duration must be positive")
+        return cls(seconds=seconds)
+
+    def start(self):
+        self.started_ns = time.perf_counter_ns()
+
+    def elapsed(self) -> float:
+        return (time.perf_counter_ns() - self.started_ns) / 1e9
+
+    def finished(self) -> bool:
+        if self.questions is not None:
+            return self.answered >= self.questions
+        return self.elapsed() >= self.seconds
+
+    def progress(self) -> str:
+        if self.questions is not None:
+            return f"[{self.answered + 1}/{self.questions}]"
+        return f"[{max(self.seconds - self.elapsed(), 0):.0f}s left]"
+
+    def record(self, seconds: float, is_correct: bool) -> int:
+        """Record an answer and return its speed bonus."""
+        self.answered += 1
+        self.median.add(seconds)
+        self.p90.add(seconds)
+        if not is_correct:
+            return 0
+        self.correct += 1
+        if seconds < DRILL_FAST_SECONDS:
+            return DRILL_FAST_BONUS
+        if seconds < DRILL_OK_SECONDS:
+            return DRILL_OK_BONUS
+        return 0
+
+class ReviewQueue:
+    """A learner's missed and skipped questions, most in need of review first.
+
+    Holds at most ``size`` questions, one entry each with its miss count and
+    when it was last missed; when full, the entry with the fewest and oldest
+    misses is dropped to make room for a new one. Queues are stored per
+    learner in one shared file.
+    """
+
+    def __init__(self, storage: Storage, user: str, name: str = REVIEW_FILE, size: int = REVIEW_QUEUE_SIZE):
+        self.storage = storage
+        self.user = user
+        self.name = name
+        self.size = size
+        stored = storage.read_json(name, {}).get(user, [])
+        self.entries: Dict[str, List[int]] = {qid: [misses, seen] for qid, misses, seen in stored}
+        self.clock = max((seen for _, seen in self.entries.values()), default=0)
+        self.unsaved = 0 # Changes since the last save
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, qid: str) -> bool:
+        return qid in self.entries
+
+    @staticmethod
+    def _priority(item) -> Tuple[int, int]:
+        misses, seen = item[1]
+        return misses, seen
+
+    def miss(self, qid: str):
+        self.clock += 1
+        if qid not in self.entries and len(self.entries) >= self.size:
+            del self.entries[min(self.entries.items(), key=self._priority)[0]]
+        entry = self.entries.setdefault(qid, [0, 0])
+        entry[0] += 1
+        entry[1] = self.clock
+        self.unsaved += 1
+
+    def hit(self, qid: str):
+        """A correct answer: the question needs one review less."""
+        entry = self.entries.get(qid)
+        if entry is None:
+            return
+        entry[0] -= 1
+        if entry[0] <= 0:
+            del self.entries[qid]
+        self.unsaved += 1
+
+    def discard(self, qid: str):
+        if self.entries.pop(qid, None) is not None:
+            self.unsaved += 1
+
+    def ordered(self) -> List[str]:
+        """Question ids, most missed and most recent first."""
+        return [qid for qid, _ in sorted(self.entries.items(), key=self._priority, reverse=True)]
+
+    def next(self, recent: List[str] = ()) -> Optional[str]:
+        """The entry most in need of review that was not asked recently.
+
+        ``recent`` lists recently asked questions, oldest first; if every
+        entry was asked recently, the one asked longest ago comes next.
+        """
+        if not self.entries:
+            return None
+        asked = {question: i for i, question in enumerate(recent)}
+        fresh = [item for item in self.entries.items() if item[0].split(':', 1)[1] not in asked]
+        if fresh:
+            return max(fresh, key=self._priority)[0]
+        return min(self.entries, key=lambda qid: asked[qid.split(':', 1)[1]])
+
+    def save(self):
+        try:
+            with self.storage.lock(self.name):
+                queues = self.storage.read_json(self.name, {})
+                queues[self.user] = [[qid, misses, seen] for qid, (misses, seen) in self.entries.items()]
+                self.storage.write_json(self.name, queues)
+            self.unsaved = 0
+        except OSError as e:
+            print(f"Error saving review queue: {e}")
+
+class _SkipNode:
+    __slots__ = ('key', 'next', 'width')
+
+    def __init__(self, key, level: int):
+        self.key = key
+        self.next: List[Optional['_SkipNode']] = [None] * level
+        self.width = [1] * level
+
+class RankedSkipList:
+    """Sorted keys with O(log n) insert, remove, rank and index lookups.
+
+    An indexable skip list: each link records how many positions it skips,
+    so the rank of a key is the sum of the widths followed to reach it.
+    """
+
+    MAX_LEVEL = 24
+
+    def __init__(self):
+        self.head = _SkipNode(None, self.MAX_LEVEL)
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self):
+        node = self.head.next[0]
+        while node is not None:
+            yield node.key
+            node = node.next[0]
+
+    def _path(self, key):
+        """Return the last node before ``key`` on each level and its position."""
+        update = [self.head] * self.MAX_LEVEL
+        positions = [0] * self.MAX_LEVEL
+        node, position = self.head, 0
+        for level in reversed(range(self.MAX_LEVEL)):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+            update[level] = node
+            positions[level] = position
+        return update, positions
+
+    def insert(self, key):
+        update, positions = self._path(key)
+        level = 1
+        while level < self.MAX_LEVEL and random.random() < 0.5:
+            level += 1
+        node = _SkipNode(key, level)
+        position = positions[0]
+        for i in range(self.MAX_LEVEL):
+            prev = update[i]
+            if i < level:
+                skipped = position - positions[i]
+                node.next[i] = prev.next[i]
+                prev.next[i] = node
+                node.width[i] = prev.width[i] - skipped
+                prev.width[i] = skipped + 1
+            else:
+                prev.width[i] += 1
+        self.size += 1
+
+    def remove(self, key):
+        update, _ = self._path(key)
+        node = update[0].next[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+        for i in range(self.MAX_LEVEL):
+            prev = update[i]
+            if prev.next[i] is node:
+                prev.width[i] += node.width[i] - 1
+                prev.next[i] = node.next[i]
+            else:
+                prev.width[i] -= 1
+        self.size -= 1
+
+    def rank(self, key) -> int:
+        """Zero-based position of ``key``."""
+        update, positions = self._path(key)
+        node = update[0].next[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+        return positions[0]
+
+class Leaderboard:
+    """Best scores per board ("all" and one per mode), shared between processes.
+
+    Updates are appended to a journal in the storage backend under a lock.
+    Each process replays only the journal lines it has not seen yet into its
+    in-memory skip lists, so updates and rank lookups stay O(log n).
+    """
+
+    def __init__(self, storage: Storage, name: str = LEADERBOARD_FILE):
+        self.storage = storage
+        self.name = name
+        self._reset()
+
+    def _reset(self):
+        self.scores: Dict[str, Dict[str, int]] = {}
+        self.ranks: Dict[str, RankedSkipList] = {}
+        self.offset = 0
+        self.inode = None
+        self.lines = 0
+
+    def _apply(self, board: str, user: str, score: int):
+        scores = self.scores.setdefault(board, {})
+        ranks = self.ranks.setdefault(board, RankedSkipList())
+        best = scores.get(user)
+        if best is not None and best >= score:
+            return
+        if best is not None:
+            ranks.remove((-best, user))
+        scores[user] = score
+        ranks.insert((-score, user))
+
+    def _sync(self):
+        """Replay journal entries written since the last sync."""
+        path = self.storage.path(self.name)
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            inode = os.fstat(f.fileno()).st_ino
+            if inode != self.inode:
+                # First sync, or the journal was compacted: start over
+                self._reset()
+                self.inode = inode
+            f.seek(self.offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            try:
+                board, user, score = json.loads(line)
+                score = int(score)
+                if not isinstance(board, str) or not isinstance(user, str):
+                    raise TypeError(line)
+            except (ValueError, TypeError):
+                continue # A hand edit or another version's line must not break every reader
+            self._apply(board, user, score)
+            self.lines += 1
+        self.offset += end
+
+    def _compact(self):
+        """Rewrite the journal with one line per user and board."""
+        tmp_path = self.storage.path(f"{self.name}.tmp")
+        with open(tmp_path, 'w') as f:
+            for board, scores in self.scores.items():
+                for user, score in scores.items():
+                    f.write(json.dumps([board, user, score]) + "\n")
+        os.replace(tmp_path, self.storage.path(self.name))
+        self.inode = None
+        self._sync()
+
+    def refresh(self):
+        with self.storage.lock(self.name, shared=True):
+            self._sync()
+
+    def submit(self, board: str, user: str, score: int) -> bool:
+        """Record a score; returns True if it is the user's new best on the board."""
+        if self.scores.get(board, {}).get(user, -1) >= score:
+            return False
+        with self.storage.lock(self.name):
+            self._sync()
+            if self.scores.get(board, {}).get(user, -1) >= score:
+                return False
+            with open(self.storage.path(self.name), 'a') as f:
+                f.write(json.dumps([board, user, score]) + "\n")
+            self._sync()
+            entries = sum(len(scores) for scores in self.scores.values())
+            if self.lines > 4 * entries + 1000:
+                self._compact()
+        return True
+
+    def rank(self, board: str, user: str) -> Optional[int]:
+        """One-based rank of a user on a board, or None if they have no score."""
+        score = self.scores.get(board, {}).get(user)
+        if score is None:
+            return None
+        return self.ranks[board].rank((-score, user)) + 1
+
+    def top(self, board: str, count: int = LEADERBOARD_SIZE) -> List[Tuple[str, int]]:
+        ranks = self.ranks.get(board)
+        if ranks is None:
+            return []
+        return [(user, -score) for score, user in islice(ranks, count)]
+
+class EventLog:
+    """Append-only JSON Lines log of session events in the storage backend.
+
+    Each event is one short line written with a single append, so sessions
+    of several learners can share the file without locking.
+    """
+
+    def __init__(self, storage: Storage, name: str = EVENTS_FILE):
+        self.storage = storage
+        self.name = name
+
+    def record(self, event: str, **fields):
+        line = json.dumps({'event': event, 'time': round(time.time(), 3), **fields})
+        try:
+            with open(self.storage.path(self.name), 'a') as f:
+                f.write(line + "\n")
+        except OSError as e:
+            print(f"Error writing event log: {e}")
+
+@dataclass
+class SessionSnapshot:
+    """The parts of a BashTutor session needed to resume it."""
+    user: str
+    score: int
+    mode: Optional[str] = None
+    question: Optional[str] = None
+    history: List[str] = field(default_factory=list)
+    adaptive: bool = False
+    mix: Dict[str, float] = field(default_factory=dict)
+    mode_scores: Dict[str, int] = field(default_factory=dict)
+    saved_at: float = 0.0
+    seed: Optional[int] = None
+    rng_state: Optional[tuple] = None # random.Random.getstate() of the session generator
+    reviewing: bool = False
+
+    def encode(self) -> bytes:
+        """Serialise to the versioned little-endian checkpoint format."""
+        parts = [CHECKPOINT_MAGIC, struct.pack('<HdiB', CHECKPOINT_VERSION, self.saved_at,
+                                                self.score, self.adaptive)]
+        for text in (self.user, self.mode or '', self.question or ''):
+            parts.append(_encode_str(text))
+        parts.append(struct.pack('<H', len(self.history)))
+        parts.extend(_encode_str(question) for question in self.history)
+        parts.append(struct.pack('<H', len(self.mix)))
+        for key, weight in self.mix.items():
+            parts.append(_encode_str(key) + struct.pack('<d', weight))
+        parts.append(struct.pack('<H', len(self.mode_scores)))
+        for key, points in self.mode_scores.items():
+            parts.append(_encode_str(key) + struct.pack('<i', points))
+        if self.seed is None:
+            parts.append(struct.pack('<B', 0))
+        else:
+            parts.append(struct.pack(f'<BQ{RNG_STATE_WORDS}I', 1, self.seed, *self.rng_state[1]))
+        parts.append(struct.pack('<B', self.reviewing))
+        return b''.join(parts)
+
+    @classmethod
+    def decode(cls, data: bytes) -> 'SessionSnapshot':
+        if data[:4] != CHECKPOINT_MAGIC:
+            raise ValueError("not a bash-tutor checkpoint")
+        reader = _Reader(data, 4)
+        version, saved_at, score, adaptive = reader.unpack('<HdiB')
+        if version > CHECKPOINT_VERSION:
+            raise ValueError(f"checkpoint version {version} is newer than this tutor")
+        user, mode, question = reader.text(), reader.text(), reader.text()
+        history = [reader.text() for _ in range(reader.unpack('<H')[0])]
+        mix = {}
+        for _ in range(reader.unpack('<H')[0]):
+            key = reader.text()
+            mix[key] = reader.unpack('<d')[0]
+        mode_scores = {}
+        for _ in range(reader.unpack('<H')[0]):
+            key = reader.text()
+            mode_scores[key] = reader.unpack('<i')[0]
+        seed = rng_state = None
+        if version >= 2 and reader.unpack('<B')[0]:
+            seed, = reader.unpack('<Q')
+            rng_state = (3, reader.unpack(f'<{RNG_STATE_WORDS}I'), None)
+        reviewing = version >= 3 and bool(reader.unpack('<B')[0])
+        return cls(user, score, mode or None, question or None, history, bool(adaptive),
+                   mix, mode_scores, saved_at, seed, rng_state, reviewing)
+
+def _encode_str(text: str) -> bytes:
+    data = text.encode('utf-8')
+    return struct.pack('<H', len(data)) + data
+
+class _Reader:
+    """Sequential reader over a checkpoint buffer."""
+
+    def __init__(self, data: bytes, offset: int = 0):
+        self.data = data
+        self.offset = offset
+
+    def unpack(self, fmt: str) -> tuple:
+        try:
+            values = struct.unpack_from(fmt, self.data, self.offset)
+        except struct.error:
+            raise ValueError("truncated checkpoint") from None
+        self.offset += struct.calcsize(fmt)
+        return values
+
+    def text(self) -> str:
+        length, = self.unpack('<H')
+        data = self.data[self.offset:self.offset + length]
+        if len(data) != length:
+            raise ValueError("truncated checkpoint")
+        self.offset += length
+        return data.decode('utf-8')
+
+class Checkpointer(threading.Thread):
+    """Writes session snapshots on a background thread.
+
+    ``save`` only stores the latest snapshot and wakes the thread, so the
+    answer path never waits on the disk; snapshots taken while a write is in
+    progress are coalesced into the next write.
+    """
+
+    def __init__(self, storage: Storage, name: str):
+        super().__init__(name='checkpointer', daemon=True)
+        self.storage = storage
+        self.name = name
+        self.pending: Optional[SessionSnapshot] = None
+        self.condition = threading.Condition()
+        self.writing = False
+        self.start()
+        atexit.register(self.flush)
+
+    def save(self, snapshot: SessionSnapshot):
+        with self.condition:
+            self.pending = snapshot
+            self.condition.notify_all()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None:
+                    self.condition.wait()
+                snapshot, self.pending = self.pending, None
+                self.writing = True
+            try:
+                self.storage.write_bytes(self.name, snapshot.encode())
+            except OSError as e:
+                print(f"Error saving session checkpoint: {e}")
+            with self.condition:
+                self.writing = False
+                self.condition.notify_all()
+
+    def flush(self, timeout: float = 2.0):
+        """Wait until every requested snapshot has been written."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.pending is None and not self.writing, timeout)
+
+    def discard(self):
+        """Drop the checkpoint, e.g. when the learner exits on purpose."""
+        self.flush()
+        self.storage.remove(self.name)
+
+# inotify(7) event masks used by PackWatcher
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+PACK_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+class PackWatcher(threading.Thread):
+    """Background thread that calls ``on_change`` when the pack directory changes.
+
+    Uses inotify on Linux and falls back to polling file mtimes elsewhere (or
+    when the directory does not exist yet).
+    """
+
+    def __init__(self, directory: str, on_change, interval: float = 1.0, debounce: float = 0.2):
+        super().__init__(name='pack-watcher', daemon=True)
+        self.directory = directory
+        self.on_change = on_change
+        self.interval = interval
+        self.debounce = debounce
+        self.stopped = threading.Event()
+        self.fd = self._inotify()
+
+    def _inotify(self) -> Optional[int]:
+        """Return an inotify descriptor watching the directory, or None."""
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            import ctypes
+            import ctypes.util
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                return None
+            if libc.inotify_add_watch(fd, os.fsencode(self.directory), PACK_WATCH_MASK) < 0:
+                os.close(fd)
+                return None
+            return fd
+        except (OSError, AttributeError):
+            return None
+
+    def _drain(self):
+        try:
+            while os.read(self.fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _signature(self) -> Dict[str, Tuple[int, int]]:
+        try:
+            with os.scandir(self.directory) as entries:
+                return {entry.path: (entry.stat().st_mtime_ns, entry.stat().st_size)
+                        for entry in entries if entry.name.endswith('.json')}
+        except OSError:
+            return {}
+
+    def _notify(self):
+        try:
+            self.on_change()
+        except Exception as e:
+            print(f"Error reloading packs: {e}")
+
+    def run(self):
+        if self.fd is None:
+            self._poll()
+            return
+        try:
+            while not self.stopped.is_set():
+                ready, _, _ = select.select([self.fd], [], [], self.interval)
+                if not ready:
+                    continue
+                # Editors write in several steps; wait for them to settle
+                time.sleep(self.debounce)
+                self._drain()
+                self._notify()
+        finally:
+            os.close(self.fd)
+
+    def _poll(self):
+        last = self._signature()
+        while not self.stopped.wait(self.interval):
+            current = self._signature()
+            if current != last:
+                last = current
+                self._notify()
+
+    def stop(self):
+        self.stopped.set()
+
+class _TrieNode:
+    __slots__ = ('children', 'completions')
+
+    def __init__(self):
+        self.children: Dict[str, '_TrieNode'] = {}
+        self.completions: List[str] = []
+
+class CompletionTrie:
+    """Prefix trie whose nodes store their (sorted, capped) completions.
+
+    Finding the completions of a prefix walks one node per character and
+    returns the stored list, however many words the trie holds.
+    """
+
+    def __init__(self, words=()):
+        self.root = _TrieNode()
+        for word in sorted(set(words)):
+            node = self.root
+            self._add(node, word)
+            for char in word:
+                node = node.children.setdefault(char, _TrieNode())
+                self._add(node, word)
+
+    @staticmethod
+    def _add(node: _TrieNode, word: str):
+        # Words arrive sorted, so the first MAX_COMPLETIONS are the ones to keep
+        if len(node.completions) < MAX_COMPLETIONS:
+            node.completions.append(word)
+
+    def complete(self, prefix: str) -> List[str]:
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return node.completions
+
+PROGRAM_NAME = re.compile(r'^[A-Za-z_][\w.+-]*$')
+
+class AnswerPrompt:
+    """Reads answers with readline: line editing, persistent history and completion.
+
+    Program names complete from the first word of every answer in the catalog,
+    later words from the flags and subcommands used with that program. Falls
+    back to plain ``input`` when readline is unavailable.
+    """
+
+    def __init__(self, catalog, history_path: Optional[str] = None):
+        self.catalog = catalog
+        self.history_path = history_path
+        self._indexed_catalog = None
+        self.programs = CompletionTrie()
+        self.arguments: Dict[str, CompletionTrie] = {}
+        try:
+            import readline
+        except ImportError:
+            self.readline = None
+            return
+        self.readline = readline
+        readline.set_completer(self.complete)
+        readline.set_completer_delims(' \t\n;|&')
+        if 'libedit' in (readline.__doc__ or ''):
+            readline.parse_and_bind('bind ^I rl_complete')
+        else:
+            readline.parse_and_bind('tab: complete')
+        readline.set_history_length(HISTORY_LENGTH)
+        if history_path:
+            try:
+                readline.read_history_file(history_path)
+            except OSError:
+                pass
+            atexit.register(self.save_history)
+
+    def save_history(self):
+        try:
+            self.readline.write_history_file(self.history_path)
+        except OSError:
+            pass
+
+    def _index(self):
+        """Build the tries once, and again only after the catalog is swapped."""
+        questions = self.catalog()
+        if self._indexed_catalog is questions:
+            return
+        programs = set(SESSION_COMMANDS)
+        arguments: Dict[str, set] = {}
+        for mode, entries in questions.items():
+            if mode is Mode.UNDERSTANDING:
+                continue # Its answers are words like "list", not commands
+            for command in entries.values():
+                try:
+                    words = shlex.split(command.command)
+                except ValueError:
+                    words = command.command.split()
+                program, position = None, 0
+                for word in words:
+                    if word in ('|', '||', '&&', ';'):
+                        program = None
+                    elif program is None:
+                        program = word if PROGRAM_NAME.match(word) else ''
+                        position = 0
+                        if program:
+                            programs.add(program)
+                            arguments.setdefault(program, set())
+                    elif program:
+                        position += 1
+                        if '{' in word:
+                            continue # A template slot such as {file}
+                        if (word.startswith('-') and len(word) > 1) or (position == 1 and PROGRAM_NAME.match(word)):
+                            arguments[program].add(word.split('=', 1)[0] + ('=' if '=' in word else ''))
+        self.programs = CompletionTrie(programs)
+        self.arguments = {program: CompletionTrie(words) for program, words in arguments.items()}
+        self._indexed_catalog = questions
+
+    def candidates(self, line: str, text: str) -> List[str]:
+        """Completions of ``text`` after ``line``, the input before the word being typed."""
+        self._index()
+        words = PIPELINE_SEPARATOR.split(line)[-1].split()
+        if not words:
+            return self.programs.complete(text)
+        trie = self.arguments.get(words[0])
+        return trie.complete(text) if trie else []
+
+    def complete(self, text: str, state: int) -> Optional[str]:
+        if state == 0:
+            line = self.readline.get_line_buffer()[:self.readline.get_begidx()]
+            self._matches = self.candidates(line, text)
+        if state < len(self._matches):
+            return self._matches[state] + ' '
+        return None
+
+    def read(self, prompt: str = "> ") -> str:
+        return input(prompt)
+
+ROFF_ESCAPE = re.compile(r"\\(?:f(?:\[[^\]]*\]|\(..|.)|\*(?:\[[^\]]*\]|\(..|.)|\((..)|\[([^\]]*)\]|s[+-]?\d|(.))")
+ROFF_GLYPHS = {'aq': "'", 'dq': '"', 'lq': '"', 'rq': '"', 'oq': "'", 'cq': "'", 'em': '-', 'en': '-',
+               'hy': '-', 'mi': '-', 'ti': '~', 'ha': '^', 'rs': '\\', 'bu': '*', 'co': '(c)'}
+ROFF_CHARS = {'-': '-', 'e': '\\', '\\': '\\', ' ': ' ', '~': ' ', '0': ' ', '.': '.', "'": "'", '`': '`'}
+ROFF_FONT_MACROS = ('B', 'I', 'SM', 'SB', 'BR', 'BI', 'IB', 'IR', 'RB', 'RI')
+MDOC_INLINE_MACROS = ('Ar', 'Pa', 'Cm', 'Em', 'Sy', 'Dq', 'Ql', 'Sq', 'Nm', 'Xr', 'Ev', 'Va', 'Li', 'Op', 'No', 'Ic')
+MAN_FLAG = re.compile(r'(?<![\w-])(--?[A-Za-z0-9?#@][\w-]*)')
+
+def _roff_escape(match) -> str:
+    glyph, named, char = match.group(1), match.group(2), match.group(3)
+    if glyph:
+        return ROFF_GLYPHS.get(glyph, '')
+    if named:
+        return ROFF_GLYPHS.get(named, '')
+    if char:
+        return ROFF_CHARS.get(char, '')
+    return ''
+
+def _macro_args(text: str) -> List[str]:
+    return [quoted if quoted or not bare else bare for quoted, bare in re.findall(r'"([^"]*)"|(\S+)', text)]
+
+def roff_text(line: str) -> str:
+    """Plain text of one line of man(7)/mdoc(7) source; other requests give ''."""
+    if line.startswith(('.', "'")):
+        macro, _, rest = line[1:].strip().partition(' ')
+        if macro in ROFF_FONT_MACROS:
+            args = _macro_args(rest)
+            line = (' ' if len(macro) < 2 or macro in ('SM', 'SB') else '').join(args)
+        elif macro in MDOC_INLINE_MACROS or macro == 'Fl':
+            words = [macro] + rest.split()
+            parts = []
+            for i, word in enumerate(words):
+                if i > 0 and words[i - 1] == 'Fl':
+                    parts.append('-' + word)
+                elif word not in MDOC_INLINE_MACROS and word != 'Fl':
+                    parts.append(word)
+            line = ' '.join(parts)
+        else:
+            return ''
+    return ROFF_ESCAPE.sub(_roff_escape, line).strip()
+
+def _shorten(text: str, width: int = MAN_FLAG_TEXT_LENGTH) -> str:
+    text = re.sub(r'\s+', ' ', text).strip()
+    end = text.find('. ', 20)
+    if end != -1:
+        text = text[:end + 1]
+    return text if len(text) <= width else text[:width].rsplit(' ', 1)[0] + '...'
+
+def parse_man_page(source: str) -> Tuple[str, Dict[str, str]]:
+    """Return (one-line summary, {flag: explanation}) from man(7) or mdoc(7) source.
+
+    Flags are taken from the tags of .TP/.IP items (man) and .It Fl items
+    (mdoc) anywhere in the page; the first item describing a flag wins.
+    """
+    summary = ''
+    flags: Dict[str, str] = {}
+    section = ''
+    name_lines: List[str] = []
+    tags: List[str] = []
+    body: List[str] = []
+    expecting_tag = False
+    paragraph: List[str] = [] # Text since the last .PP, a possible tag for a following .RS block
+    indented_item = False
+
+    def flush():
+        if tags and body:
+            text = _shorten(' '.join(body))
+            for tag in tags:
+                for flag in MAN_FLAG.findall(tag):
+                    flags.setdefault(flag, text)
+        tags.clear()
+        body.clear()
+
+    for line in source.splitlines():
+        if line.startswith(('.\\"', "'\\\"", '.\\#')):
+            continue
+        if line.startswith(('.', "'")):
+            macro, _, rest = line[1:].strip().partition(' ')
+            if macro in ('SH', 'Sh'):
+                flush()
+                section = ' '.join(_macro_args(rest)).upper()
+                expecting_tag = False
+                continue
+            if macro == 'TP':
+                flush()
+                expecting_tag = True
+                continue
+            if macro == 'TQ':
+                expecting_tag = True
+                continue
+            if macro == 'IP':
+                flush()
+                args = _macro_args(rest)
+                if args:
+                    tags.append(ROFF_ESCAPE.sub(_roff_escape, args[0]))
+                continue
+            if macro == 'It':
+                flush()
+                tags.append(roff_text('.' + rest) if rest.startswith('Fl') else '')
+                continue
+            if macro == 'Nd':
+                summary = roff_text('.No ' + rest)
+                continue
+            if macro in ('PP', 'LP', 'P', 'SS', 'Ss', 'El', 'Pp'):
+                flush()
+                paragraph.clear()
+                continue
+            if macro == 'RS' and not tags and len(paragraph) == 1 and paragraph[0].startswith('-'):
+                # DocBook-generated pages: ".PP", the option line, then the text in ".RS"/".RE"
+                tags.append(paragraph[0])
+                indented_item = True
+                continue
+            if macro == 'RE' and indented_item:
+                flush()
+                indented_item = False
+                continue
+        text = roff_text(line)
+        if not text:
+            continue
+        paragraph.append(text)
+        if expecting_tag:
+            tags.append(text)
+            expecting_tag = False
+        elif section == 'NAME' and not summary:
+            name_lines.append(text)
+        elif tags:
+            body.append(text)
+    flush()
+    if not summary and name_lines:
+        summary = ' '.join(name_lines).partition(' - ')[2]
+    return _shorten(summary), flags
+
+def _read_man_file(path: str) -> str:
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        return f.read().decode('utf-8', errors='replace')
+
+def _parse_man_file(args: Tuple[str, str]) -> Optional[Tuple[str, Dict[str, str]]]:
+    """Parse one man page file (following a .so redirect) in a worker process."""
+    path, root = args
+    try:
+        source = _read_man_file(path)
+        if source.startswith('.so '):
+            target = os.path.join(root, source[4:].strip())
+            source = _read_man_file(target if os.path.exists(target) else target + '.gz')
+        return parse_man_page(source)
+    except (OSError, EOFError):
+        return None
+
+class ManIndex:
+    """Explanations of programs and flags from local man pages and the catalog.
+
+    Man pages are parsed once into a small SQLite lookup table, so queries are
+    indexed lookups that never run man or groff. Each update compares the man
+    directories' modification times with the ones recorded; only when they
+    differ are the pages scanned, and only pages whose mtime or size changed
+    are parsed again. Catalog explanations are reloaded when the catalog's
+    hash changes.
+    """
+
+    def __init__(self, path: str, catalog, man_path: str = MAN_PATH):
+        self.path = path
+        self.catalog = catalog
+        self.roots = [root for root in man_path.split(':') if root]
+        self.db = sqlite3.connect(path)
+        self._create()
+
+    def _create(self):
+        db = self.db
+        db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID")
+        if self._meta('version') != str(MAN_INDEX_VERSION):
+            db.executescript("DROP TABLE IF EXISTS pages; DROP TABLE IF EXISTS flags; "
+                             "DROP TABLE IF EXISTS catalog; DELETE FROM meta;")
+        db.executescript("""
+            CREATE TABLE IF NOT EXISTS pages (id INTEGER PRIMARY KEY, source TEXT UNIQUE, program TEXT,
+                                              section TEXT, summary TEXT, mtime INTEGER, size INTEGER);
+            CREATE INDEX IF NOT EXISTS pages_program ON pages (program, section);
+            CREATE TABLE IF NOT EXISTS flags (page INTEGER, flag TEXT, text TEXT,
+                                              PRIMARY KEY (page, flag)) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS catalog (command TEXT, program TEXT, explanation TEXT);
+            CREATE INDEX IF NOT EXISTS catalog_command ON catalog (command);
+            CREATE INDEX IF NOT EXISTS catalog_program ON catalog (program);
+        """)
+        self._set_meta('version', str(MAN_INDEX_VERSION))
+        db.commit()
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str):
+        self.db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+    def _man_dirs(self) -> List[Tuple[str, str, str]]:
+        dirs = []
+        for root in self.roots:
+            for section in MAN_SECTIONS:
+                directory = os.path.join(root, f"man{section}")
+                if os.path.isdir(directory):
+                    dirs.append((root, section, directory))
+        return dirs
+
+    def update(self, force: bool = False) -> int:
+        """Bring the index up to date; returns the number of man pages parsed."""
+        parsed = 0
+        dirs = self._man_dirs()
+        stamp = json.dumps([[directory, os.stat(directory).st_mtime_ns] for _, _, directory in dirs])
+        if force or self._meta('dirs') != stamp:
+            parsed = self._update_pages(dirs)
+            self._set_meta('dirs', stamp)
+        self._update_catalog()
+        self.db.commit()
+        return parsed
+
+    def _update_pages(self, dirs) -> int:
+        found = {}
+        for root, section, directory in dirs:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    name = entry.name[:-3] if entry.name.endswith('.gz') else entry.name
+                    program = name.rsplit('.', 1)[0]
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    found[entry.path] = (root, program, section, st.st_mtime_ns, st.st_size)
+        known = {source: (page, mtime, size) for page, source, mtime, size in
+                 self.db.execute("SELECT id, source, mtime, size FROM pages")}
+        changed = [path for path, info in found.items() if known.get(path, (None,))[1:] != info[3:]]
+        removed = [path for path in known if path not in found]
+        jobs = [(path, found[path][0]) for path in changed]
+        if len(jobs) >= MAN_PARALLEL_THRESHOLD:
+            with ProcessPoolExecutor() as pool:
+                results = list(pool.map(_parse_man_file, jobs, chunksize=32))
+        else:
+            results = [_parse_man_file(job) for job in jobs]
+        db = self.db
+        for path in removed + changed:
+            if path in known:
+                db.execute("DELETE FROM pages WHERE id = ?", (known[path][0],))
+                db.execute("DELETE FROM flags WHERE page = ?", (known[path][0],))
+        for path, result in zip(changed, results):
+            _, program, section, mtime, size = found[path]
+            summary, flags = result or ('', {})
+            page = db.execute("INSERT INTO pages (source, program, section, summary, mtime, size) "
+                              "VALUES (?, ?, ?, ?, ?, ?)", (path, program, section, summary, mtime, size)).lastrowid
+            db.executemany("INSERT INTO flags VALUES (?, ?, ?)",
+                           [(page, flag, text) for flag, text in flags.items()])
+        if len(changed) >= MAN_PARALLEL_THRESHOLD or len(removed) >= MAN_PARALLEL_THRESHOLD:
+            db.commit()
+            db.execute("VACUUM") # Give the space of replaced rows back after big rebuilds
+        return len(changed)
+
+    def _update_catalog(self):
+        questions = self.catalog()
+        rows = []
+        for mode, entries in questions.items():
+            if mode is Mode.UNDERSTANDING:
+                continue # Answers are words such as "list", not commands
+            for question, entry in entries.items():
+                if isinstance(entry, QuestionTemplate):
+                    entry = entry.sample(question)[1]
+                fields = entry_fields(entry)
+                command = fields['command'].strip()
+                program = command.split()[0] if command.split() else ''
+                # Variables are looked up by name ($HOME), commands in canonical form
+                key = command if isinstance(entry, Variable) or command.startswith('$') \
+                    else canonical_answer(command)
+                rows.append((key, program, fields['explanation']))
+        digest = hashlib.sha256(json.dumps(rows).encode('utf-8')).hexdigest()
+        if self._meta('catalog') == digest:
+            return
+        self.db.execute("DELETE FROM catalog")
+        self.db.executemany("INSERT INTO catalog VALUES (?, ?, ?)", rows)
+        self._set_meta('catalog', digest)
+
+    def program(self, name: str) -> Optional[Tuple[int, str]]:
+        """(page id, summary) of the man page documenting ``name``."""
+        sections = {section: i for i, section in enumerate(MAN_SECTIONS)}
+        rows = self.db.execute("SELECT id, section, summary FROM pages WHERE program = ?", (name,)).fetchall()
+        if not rows:
+            return None
+        source, _, summary = min(rows, key=lambda row: sections.get(row[1], len(sections)))
+        return source, summary
+
+    def flag(self, page: int, flag: str) -> Optional[str]:
+        row = self.db.execute("SELECT text FROM flags WHERE page = ? AND flag = ?", (page, flag)).fetchone()
+        return row[0] if row else None
+
+    def catalog_command(self, command: str) -> Optional[str]:
+        row = self.db.execute("SELECT explanation FROM catalog WHERE command = ?", (command,)).fetchone()
+        return row[0] if row else None
+
+    def catalog_program(self, program: str) -> Optional[str]:
+        """Catalog explanation of a program without a man page, naming the command it is from."""
+        row = self.db.execute("SELECT command, explanation FROM catalog WHERE command = ? OR program = ? "
+                              "ORDER BY command != ? LIMIT 1", (program, program, program)).fetchone()
+        if row is None:
+            return None
+        command, explanation = row
+        return explanation if command == program else f"as in '{command}': {explanation}"
+
+    def _explain_flag(self, page_id: Optional[int], word: str) -> List[Tuple[str, Optional[str]]]:
+        flag = word.split('=', 1)[0] if word.startswith('--') else word
+        text = self.flag(page_id, flag) if page_id else None
+        if text or word.startswith('--') or len(word) <= 2:
+            return [(word, text)]
+        # Bundled short options such as -la
+        letters = [(f"-{letter}", self.flag(page_id, f"-{letter}")) for letter in word[1:]]
+        return letters if all(text for _, text in letters) else [(word, None)]
+
+    def explain(self, command_line: str) -> List[Tuple[str, Optional[str]]]:
+        """Return (word, explanation or None) for the programs, flags and operators of a command line."""
+        results = []
+        whole = self.catalog_command(canonical_answer(command_line))
+        if whole:
+            results.append((command_line.strip(), whole))
+        lexer = shlex.shlex(command_line, posix=True, punctuation_chars=True)
+        lexer.whitespace_split = True
+        try:
+            words = list(lexer)
+        except ValueError:
+            words = command_line.split()
+        program = page_id = None
+        subcommand = False
+        for word in words:
+            if word in OPERATOR_EXPLANATIONS or (word and set(word) <= set('|&;<>()')):
+                results.append((word, OPERATOR_EXPLANATIONS.get(word)))
+                if word not in ('>', '>>', '<'):
+                    program = page_id = None
+                continue
+            if program is None:
+                if re.match(r'^\w+=', word):
+                    results.append((word, "set an environment variable for the command"))
+                    continue
+                program = os.path.basename(word)
+                page = self.program(program)
+                page_id = page[0] if page else None
+                results.append((word, (page[1] if page else None) or self.catalog_program(program)))
+                subcommand = True
+                if program in COMMAND_WRAPPERS:
+                    program = None # The next word is the program being run
+                continue
+            if word.startswith('-') and len(word) > 1:
+                results.extend(self._explain_flag(page_id, word))
+                continue
+            if subcommand:
+                subcommand = False
+                page = self.program(f"{program}-{word}")
+                if page:
+                    # git commit, apt-get install and similar documented subcommands
+                    page_id = page[0]
+                    results.append((word, page[1]))
+                    continue
+            if word.startswith('$'):
+                text = self.catalog_command(word.replace('{', '').replace('}', ''))
+                if text:
+                    results.append((word, text))
+        return results
+
+    def close(self):
+        self.db.close()
+
+@dataclass
+class LiveResult:
+    output: str
+    status: Optional[int] # None when the evaluation timed out
+    timed_out: bool = False
+
+class BashCoprocess:
+    """A long-lived bash that evaluates snippets in fresh subshells.
+
+    Each snippet runs in ``( ... )`` inside a private temporary directory
+    that is also $HOME, so variables, functions, traps and directory changes
+    made by one evaluation are gone by the next, and files it leaves behind
+    are removed afterwards. Only the subshell is forked per evaluation. The
+    shell starts without rc files, with a minimal environment and with CPU
+    time and file size limits on every evaluation.
+    """
+
+    def __init__(self):
+        self.sandbox = tempfile.mkdtemp(prefix='bash-tutor-live-')
+        self.token = secrets.token_hex(16)
+        env = {'PATH': os.environ.get('PATH', os.defpath), 'HOME': self.sandbox, 'LC_ALL': 'C',
+               'TERM': 'dumb', 'USER': os.environ.get('USER', 'learner'), 'SHELL': '/bin/bash'}
+        self.process = subprocess.Popen(['bash', '--norc', '--noprofile'], stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                        cwd=self.sandbox, env=env, start_new_session=True)
+        self.process.stdin.write((LIVE_LOOP % (self.token, LIVE_CPU_SECONDS, LIVE_FILE_BLOCKS)).encode())
+        self.process.stdin.flush()
+        self.marker = f"\n{self.token} ".encode()
+
+    @property
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def evaluate(self, code: str, timeout: float = LIVE_TIMEOUT) -> LiveResult:
+        data = code.encode('utf-8')
+        try:
+            self.process.stdin.write(f"{len(data)}\n".encode() + data)
+            self.process.stdin.flush()
+        except OSError:
+            self.close()
+            return LiveResult("", None)
+        fd = self.process.stdout.fileno()
+        buffer = b""
+        deadline = time.monotonic() + timeout
+        while True:
+            end = buffer.find(self.marker)
+            if end != -1 and buffer.endswith(b"\n"):
+                status = buffer[end + len(self.marker):].strip()
+                self._clean_sandbox()
+                return LiveResult(buffer[:end][:LIVE_OUTPUT_LIMIT].decode('utf-8', errors='replace'),
+                                  int(status) if status.isdigit() else None)
+            remaining = deadline - time.monotonic()
+            ready = select.select([fd], [], [], remaining)[0] if remaining > 0 else []
+            chunk = os.read(fd, 65536) if ready else b""
+            if not chunk or len(buffer) > 4 * LIVE_OUTPUT_LIMIT:
+                # Timed out, flooded its output or the shell died: start over with a new one
+                self.close()
+                return LiveResult(buffer[:LIVE_OUTPUT_LIMIT].decode('utf-8', errors='replace'), None,
+                                  timed_out=bool(not ready))
+            buffer += chunk
+
+    def _clean_sandbox(self):
+        with os.scandir(self.sandbox) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                else:
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+
+    def close(self):
+        if self.alive:
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except OSError:
+                pass
+        self.process.wait()
+        for stream in (self.process.stdin, self.process.stdout):
+            try:
+                stream.close()
+            except OSError:
+                pass
+        shutil.rmtree(self.sandbox, ignore_errors=True)
+
+class BashPool:
+    """Bash coprocesses shared by the threads of one tutor process.
+
+    Up to ``size`` coprocesses (one per core by default) are started on
+    demand and reused; one that times out or dies is replaced on next use.
+    """
+
+    def __init__(self, size: Optional[int] = None, timeout: float = LIVE_TIMEOUT):
+        self.size = size or os.cpu_count() or 1
+        self.timeout = timeout
+        self.idle: queue.LifoQueue = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(self.size)
+        self.closed = False
+        atexit.register(self.close)
+
+    def evaluate(self, code: str, timeout: Optional[float] = None) -> LiveResult:
+        with self.slots:
+            try:
+                shell = self.idle.get_nowait()
+            except queue.Empty:
+                shell = BashCoprocess()
+            try:
+                return shell.evaluate(code, timeout or self.timeout)
+            finally:
+                if shell.alive and not self.closed:
+                    self.idle.put(shell)
+                else:
+                    shell.close()
+
+    def close(self):
+        self.closed = True
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+@dataclass
+class MockAPIStore:
+    """The resources one client of the mock API sees."""
+    resources: Dict[int, dict] = field(default_factory=lambda: {r['id']: dict(r) for r in MOCK_API_RESOURCES})
+    next_id: int = len(MOCK_API_RESOURCES) + 1
+
+class MockAPIState:
+    """Data shared by the mock API's request threads, guarded by one lock.
+
+    Plain requests share one store. Traced requests get a fresh store per
+    trace, so a learner's DELETE cannot change what another learner's
+    answer is graded against.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.shared = MockAPIStore()
+        self.windows: OrderedDict = OrderedDict() # Client address and trace -> [window start, requests], oldest first
+        self.traces: OrderedDict = OrderedDict() # Trace -> (store, [request records])
+
+    def store(self, token: Optional[str]) -> MockAPIStore:
+        if not token:
+            return self.shared
+        with self.lock:
+            if token not in self.traces:
+                self.traces[token] = (MockAPIStore(), [])
+                while len(self.traces) > MOCK_API_TRACES:
+                    self.traces.popitem(last=False)
+            return self.traces[token][0]
+
+    def rate(self, client: str) -> Tuple[int, int]:
+        """Count a request; returns (remaining requests, seconds until the window resets)."""
+        now = int(time.time())
+        with self.lock:
+            window = self.windows.get(client)
+            if window is None or now - window[0] >= MOCK_API_RATE_WINDOW:
+                window = self.windows[client] = [now, 0]
+                self.windows.move_to_end(client)
+                # Every graded answer has its own trace, so expired windows are dropped as they pile up
+                while now - next(iter(self.windows.values()))[0] >= MOCK_API_RATE_WINDOW:
+                    self.windows.popitem(last=False)
+            window[1] += 1
+            return MOCK_API_RATE_LIMIT - window[1], window[0] + MOCK_API_RATE_WINDOW - now
+
+    def trace(self, token: str, record: dict):
+        with self.lock:
+            if token in self.traces:
+                self.traces[token][1].append(record)
+
+class MockAPIHandler(BaseHTTPRequestHandler):
+    """The endpoints used by the API questions, answering JSON.
+
+    Requests carrying an ``X-Tutor-Trace`` header are recorded under its
+    value, and ``GET /_tutor/trace/<token>`` returns them, so the tutor can
+    grade a learner's curl command on what reached the server.
+    """
+    protocol_version = 'HTTP/1.1'
+    server_version = 'bash-tutor-mock-api/1'
+
+    def log_message(self, format, *args):
+        pass # A classroom of requests would flood the terminal
+
+    def do_GET(self):
+        self.handle_api('GET')
+
+    def do_HEAD(self):
+        self.handle_api('HEAD')
+
+    def do_POST(self):
+        self.handle_api('POST')
+
+    def do_PUT(self):
+        self.handle_api('PUT')
+
+    def do_PATCH(self):
+        self.handle_api('PATCH')
+
+    def do_DELETE(self):
+        self.handle_api('DELETE')
+
+    def handle_api(self, method: str):
+        url = urlsplit(self.path)
+        path = url.path.rstrip('/') or '/'
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            if length < 0:
+                raise ValueError(length)
+        except ValueError:
+            # The body cannot be skipped, so the connection is not reusable
+            self.respond(method, 400, {'error': 'invalid Content-Length header'}, {'Connection': 'close'})
+            return
+        body = self.rfile.read(length) if length else b''
+        state: MockAPIState = self.server.state
+        if path.startswith('/_tutor/trace/'):
+            with state.lock:
+                records = list(state.traces.get(path.rsplit('/', 1)[1], (None, []))[1])
+            self.respond(method, 200, records)
+            return
+        token = self.headers.get('X-Tutor-Trace')
+        # Graded commands are limited on their own, so a classroom behind one address is not starved
+        # A trace header alone must not buy a fresh window, so the address is always part of the key
+        remaining, reset = state.rate(f"{self.client_address[0]} {token or ''}")
+        headers = {'X-RateLimit-Limit': str(MOCK_API_RATE_LIMIT),
+                   'X-RateLimit-Remaining': str(max(remaining, 0)),
+                   'X-RateLimit-Reset': str(reset)}
+        if remaining < 0:
+            status, payload = 429, {'error': 'rate limit exceeded, try again later'}
+            headers['Retry-After'] = str(reset)
+        else:
+            status, payload, extra = self.route(method, path, dict(parse_qsl(url.query)), body, state.store(token))
+            headers.update(extra)
+        if token:
+            content_type = self.headers.get('Content-Type', '').split(';')[0].strip()
+            try:
+                parsed = json.loads(body) if content_type == 'application/json' else None
+            except ValueError:
+                parsed = None
+            upload = re.search(rb'filename="([^"]*)"', body)
+            auth = self.headers.get('Authorization', '').split(' ')[0] or None
+            state.trace(token, {'method': method, 'path': path, 'query': sorted(parse_qsl(url.query)),
+                                'content_type': content_type or None, 'auth': auth,
+                                'body': parsed if parsed is not None else
+                                upload.group(1).decode(errors='replace') if upload else
+                                hashlib.sha1(body).hexdigest() if body else None,
+                                'status': status})
+        self.respond(method, status, payload, headers)
+
+    def route(self, method: str, path: str, query: Dict[str, str], body: bytes, store: MockAPIStore):
+        state: MockAPIState = self.server.state
+        reading = method in ('GET', 'HEAD')
+        if path == '/' and reading:
+            return 200, {'name': 'bash-tutor mock API',
+                         'endpoints': ['/data', '/search?query=', '/resource/<id>', '/create', '/secure',
+                                       '/upload', '/path/to/file', '/redirecting-url',
+                                       '/api/v1/chat/completions', '/status/<code>', '/delay/<seconds>']}, {}
+        if path == '/data' and reading:
+            with state.lock:
+                items = list(store.resources.values())
+            return 200, {'data': items, 'count': len(items)}, {}
+        if path == '/search' and reading:
+            if not query.get('query'):
+                return 400, {'error': "missing 'query' parameter"}, {}
+            page = int(query['page']) if query.get('page', '').isdigit() else 1
+            return 200, {'query': query['query'], 'page': page,
+                         'results': [f"{query['query']} result {i}" for i in range(1, 4)]}, {}
+        if path == '/path/to/file' and reading:
+            return 200, "Hello from the bash-tutor mock API\n", {}
+        if path == '/redirecting-url':
+            return 302, {'redirect': '/data'}, {'Location': '/data'}
+        match = re.match(r'^/status/(\d{3})$', path)
+        if match:
+            return int(match.group(1)), {'status': int(match.group(1))}, {}
+        match = re.match(r'^/delay/(\d+(?:\.\d+)?)$', path)
+        if match:
+            time.sleep(min(float(match.group(1)), MOCK_API_TIMEOUT))
+            return 200, {'delayed': float(match.group(1))}, {}
+
+        bearer = self.headers.get('Authorization', '')
+        if path in ('/secure', '/api/v1/chat/completions') and not re.match(r'^Bearer \S+$', bearer):
+            return 401, {'error': 'missing or invalid bearer token'}, {'WWW-Authenticate': 'Bearer'}
+        if path == '/secure' and reading:
+            return 200, {'user': 'learner', 'scopes': ['read', 'write']}, {}
+
+        if path == '/upload' and method == 'POST':
+            upload = re.search(rb'filename="([^"]*)"', body)
+            if not upload:
+                return 400, {'error': 'expected a multipart file upload (-F "file=@name")'}, {}
+            return 201, {'filename': upload.group(1).decode(errors='replace'), 'bytes': len(body)}, {}
+
+        data = None
+        if method in ('POST', 'PUT', 'PATCH'):
+            if self.headers.get('Content-Type', '').split(';')[0].strip() != 'application/json':
+                return 415, {'error': 'send JSON with -H "Content-Type: application/json"'}, {}
+            try:
+                data = json.loads(body or b'null')
+            except ValueError:
+                return 400, {'error': 'request body is not valid JSON'}, {}
+            if not isinstance(data, dict):
+                return 400, {'error': 'request body must be a JSON object'}, {}
+
+        if path == '/api/v1/chat/completions' and method == 'POST':
+            if not data.get('model') or not isinstance(data.get('messages'), list):
+                return 400, {'error': "'model' and 'messages' are required"}, {}
+            return 200, {'id': 'chatcmpl-tutor', 'object': 'chat.completion', 'model': data['model'],
+                         'choices': [{'index': 0, 'finish_reason': 'stop',
+                                      'message': {'role': 'assistant',
+                                                  'content': "Hello! This is a canned reply from the mock API."}}]}, {}
+        if path in ('/create', '/resource', '/resources') and method == 'POST':
+            with state.lock:
+                item = dict(data, id=store.next_id)
+                store.resources[store.next_id] = item
+                store.next_id += 1
+            return 201, item, {'Location': f"/resource/{item['id']}"}
+        if path in ('/resource', '/resources') and reading:
+            with state.lock:
+                return 200, list(store.resources.values()), {}
+        match = re.match(r'^/resources?/(\d+)$', path)
+        if match:
+            resource_id = int(match.group(1))
+            with state.lock:
+                item = store.resources.get(resource_id)
+                if item is None:
+                    return 404, {'error': f"resource {resource_id} not found"}, {}
+                if reading:
+                    return 200, item, {}
+                if method == 'PUT':
+                    item = store.resources[resource_id] = dict(data, id=resource_id)
+                    return 200, item, {}
+                if method == 'PATCH':
+                    item.update(data, id=resource_id)
+                    return 200, item, {}
+                if method == 'DELETE':
+                    del store.resources[resource_id]
+                    return 200, {'deleted': resource_id}, {}
+        return 404, {'error': f"no endpoint {method} {path}"}, {}
+
+    def respond(self, method: str, status: int, payload, headers: Optional[Dict[str, str]] = None):
+        if isinstance(payload, str):
+            data, content_type = payload.encode('utf-8'), 'text/plain; charset=utf-8'
+        else:
+            data, content_type = (json.dumps(payload, indent=2) + "\n").encode('utf-8'), 'application/json'
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if method != 'HEAD':
+            self.wfile.write(data)
+
+class MockAPIServer(ThreadingHTTPServer):
+    """Threaded mock of the APIs in the API questions, one thread per connection."""
+    daemon_threads = True
+    request_queue_size = 256 # A classroom connecting at the same moment
+
+    def __init__(self, host: str = MOCK_API_HOST, port: int = MOCK_API_PORT):
+        super().__init__((host, port), MockAPIHandler)
+        self.state = MockAPIState()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'MockAPIServer':
+        threading.Thread(target=self.serve_forever, name='mock-api', daemon=True).start()
+        return self
+
+def run_mock_curl(command: str, base_url: str) -> Optional[dict]:
+    """Run a curl answer against the mock API and describe its effect.
+
+    Only a single curl command is run (no pipes, redirections or command
+    substitution), with the API hosts rewritten to ``base_url``, inside a
+    temporary directory holding the files the questions mention. Whatever
+    host a URL names, curl connects to the mock server over plain HTTP, and
+    paths outside the directory are refused. Returns None for anything
+    else. The result lists the requests the server saw and the client-side
+    effects (files written, headers or verbose output).
+    """
+    command = command.replace('\\\n', ' ')
+    if re.search(r'[|;&<>`]|\$\(', re.sub(r"'[^']*'|\"(?:[^\"\\\\]|\\\\.)*\"", "''", command)):
+        return None
+    try:
+        words = shlex.split(command)
+    except ValueError:
+        return None
+    if not words or words[0] != 'curl':
+        return None
+    args = [MOCK_API_HOSTS.sub(base_url, re.sub(r'\$\{?(\w+)\}?', lambda m: MOCK_API_ENV.get(m.group(1), m.group(0)), word))
+            for word in words[1:]]
+    if any(arg.startswith(MOCK_CURL_REFUSED) or (MOCK_CURL_OUTSIDE.search(arg) and not arg.startswith(base_url))
+           for arg in args):
+        return None
+    server = urlsplit(base_url)
+    pinned = ['--proto', '=http', '--proto-redir', '=http',
+              '--connect-to', f"::{server.hostname}:{server.port or 80}"]
+    env = {'PATH': os.environ.get('PATH', os.defpath), 'LC_ALL': 'C'} # No proxies and no ~/.curlrc
+    token = secrets.token_hex(12)
+    with tempfile.TemporaryDirectory(prefix='bash-tutor-api-') as workdir:
+        with open(os.path.join(workdir, 'filename.txt'), 'w') as f:
+            f.write("uploaded by bash-tutor\n")
+        before = set(os.listdir(workdir))
+        try:
+            result = subprocess.run(['curl', '-q', *args, *pinned, '-H', f"X-Tutor-Trace: {token}"], cwd=workdir,
+                                    env=env, stdin=subprocess.DEVNULL, capture_output=True,
+                                    timeout=MOCK_API_TIMEOUT)
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+        files = sorted(set(os.listdir(workdir)) - before)
+    try:
+        with urllib.request.urlopen(f"{base_url}/_tutor/trace/{token}", timeout=MOCK_API_TIMEOUT) as response:
+            requests = json.load(response)
+    except (OSError, ValueError):
+        return None
+    return {'requests': requests, 'files': files, 'exit': result.returncode,
+            'headers': result.stdout.startswith(b'HTTP/'),
+            'verbose': b'\n> ' in b'\n' + result.stderr,
+            'output': result.stdout[:4096].decode('utf-8', errors='replace')}
+
+class ClassroomServer:
+    """Instructor side of a classroom: one question at a time goes to every learner.
+
+    Learners speak newline-delimited JSON over TCP. Each question is
+    serialised once and the same bytes are queued on every connection, and
+    answers are graded as they arrive with the tutor's ``check_answer``.
+    """
+
+    def __init__(self, tutor: 'BashTutor'):
+        self.tutor = tutor
+        self.learners: Dict[asyncio.StreamWriter, str] = {}
+        self.round = 0
+        self.answers: Dict[asyncio.StreamWriter, Tuple[str, str]] = {} # Learner -> (answer, outcome)
+        self.tally: Counter = Counter()
+        self.redraw_pending = False
+        self.sessions = set() # Tasks handling the learners, awaited at shutdown
+
+    def broadcast(self, message: dict):
+        data = (json.dumps(message) + "\n").encode('utf-8')
+        for writer in list(self.learners):
+            # write() only queues; a learner that stopped reading is dropped instead of awaited
+            if writer.transport.get_write_buffer_size() > CLASSROOM_BACKLOG:
+                self.drop(writer)
+            else:
+                writer.write(data)
+        METRICS.incr('classroom_broadcasts')
+
+    def send(self, writer: asyncio.StreamWriter, message: dict):
+        writer.write((json.dumps(message) + "\n").encode('utf-8'))
+
+    def drop(self, writer: asyncio.StreamWriter):
+        if self.learners.pop(writer, None) is not None:
+            self.schedule_redraw()
+        writer.close()
+
+    def question_message(self) -> dict:
+        return {'type': 'question', 'round': self.round, 'mode': mode_title(self.tutor.current_mode),
+                'question': self.tutor.current_prompt}
+
+    async def handle_learner(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.sessions.add(asyncio.current_task())
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    continue
+                if message.get('type') == 'hello' and writer not in self.learners:
+                    self.learners[writer] = str(message.get('name') or 'learner')[:40]
+                    self.send(writer, {'type': 'welcome', 'learners': len(self.learners)})
+                    if self.round:
+                        self.send(writer, self.question_message())
+                    self.schedule_redraw()
+                elif message.get('type') == 'answer' and writer in self.learners:
+                    self.record_answer(writer, message)
+        except (ConnectionError, ValueError):
+            pass # Reset connections and over-long lines both end the learner's session
+        finally:
+            self.drop(writer)
+            self.sessions.discard(asyncio.current_task())
+
+    def record_answer(self, writer: asyncio.StreamWriter, message: dict):
+        if message.get('round') != self.round or writer in self.answers:
+            self.send(writer, {'type': 'result', 'round': message.get('round'), 'outcome': None})
+            return
+        answer = str(message.get('answer', '')).strip()
+        is_correct, is_case_mismatch = self.tutor.check_answer(answer)
+        outcome = 'correct' if is_correct else 'case_mismatch' if is_case_mismatch else 'incorrect'
+        self.answers[writer] = (answer, outcome)
+        self.tally[outcome] += 1
+        self.send(writer, {'type': 'result', 'round': self.round, 'outcome': outcome})
+        self.schedule_redraw()
+
+    def schedule_redraw(self):
+        """Redraw the histogram soon; answers arriving together share one redraw."""
+        if not self.redraw_pending:
+            self.redraw_pending = True
+            asyncio.get_running_loop().call_later(CLASSROOM_REDRAW, self.redraw)
+
+    def redraw(self):
+        self.redraw_pending = False
+        sys.stdout.write("\r\033[K" + self.histogram())
+        sys.stdout.flush()
+
+    def histogram(self) -> str:
+        if not self.round:
+            return f"{BLUE}{len(self.learners)} learners connected; type 'next' to ask a question{RESET}"
+        total = max(len(self.answers), 1)
+        bars = []
+        for outcome, label in (('correct', 'correct'), ('case_mismatch', 'case'), ('incorrect', 'wrong')):
+            count = self.tally[outcome]
+            color = THEME.codes[OUTCOME_COLORS[outcome]]
+            bars.append(f"{color}{label} {'█' * round(count * CLASSROOM_HISTOGRAM_WIDTH / total)} {count}{RESET}")
+        return f"Q{self.round}: {len(self.answers)}/{len(self.learners)} answered  " + "  ".join(bars)
+
+    def ask(self):
+        self.tutor.get_random_question()
+        self.round += 1
+        self.answers.clear()
+        self.tally.clear()
+        print(f"\r\033[K{YELLOW}Q{self.round} ({mode_title(self.tutor.current_mode)}): "
+              f"{self.tutor.current_prompt}{RESET}")
+        self.broadcast(self.question_message())
+        self.redraw()
+
+    def reveal(self):
+        answer = self.tutor.current_answer
+        self.broadcast({'type': 'reveal', 'round': self.round, 'answer': answer.command,
+                        'explanation': answer.explanation, 'example': answer.example})
+        print(f"\r\033[K{self.histogram()}")
+        print(f"{CYAN}Answer: {answer.command}{RESET}")
+        wrong = Counter(text for text, outcome in self.answers.values() if outcome != 'correct')
+        for text, count in wrong.most_common(3):
+            print(f"  {ROSE}{count} x {text or '(empty)'}{RESET}")
+
+    async def console(self, server: asyncio.AbstractServer):
+        loop = asyncio.get_running_loop()
+        print(f"{BLUE}Commands: next, reveal, mode <key>, mix <spec>, who, quit{RESET}")
+        self.redraw()
+        while True:
+            line = await loop.run_in_executor(None, sys.stdin.readline)
+            command = line.strip()
+            if not line or command in ('quit', 'exit'):
+                break
+            if command in ('next', 'n'):
+                if self.round and self.answers:
+                    self.reveal()
+                self.ask()
+            elif command in ('reveal', 'r'):
+                if self.round:
+                    self.reveal()
+            elif command.startswith('mode '):
+                key = command[5:].strip()
+                if key in self.tutor.modes:
+                    self.tutor.set_mode_mix(None)
+                    self.tutor.current_mode = self.tutor.modes[key]
+                    print(f"{BLUE}Next questions come from {mode_title(self.tutor.current_mode)}.{RESET}")
+                else:
+                    print(f"{ROSE}Unknown mode {key!r}{RESET}")
+            elif command.startswith('mix '):
+                try:
+                    self.tutor.set_mode_mix(command[4:].strip())
+                    print(f"{BLUE}Mixing {self.tutor.describe_mode_mix()}.{RESET}")
+                except ValueError as e:
+                    print(f"{ROSE}{e}{RESET}")
+            elif command == 'who':
+                names = Counter(self.learners.values())
+                print(", ".join(f"{name} x{count}" if count > 1 else name for name, count in sorted(names.items()))
+                      or "No learners connected.")
+            elif command:
+                print(f"{ROSE}Unknown command {command!r}{RESET}")
+            self.redraw()
+        self.broadcast({'type': 'bye'})
+        server.close()
+
+    async def serve(self, host: str, port: int):
+        server = await asyncio.start_server(self.handle_learner, host, port, backlog=512)
+        addresses = ", ".join(f"{a[0]}:{a[1]}" for a in (s.getsockname() for s in server.sockets))
+        print(f"{SAGE}Classroom open on {addresses}{RESET}")
+        print(f"Learners run: python main.py --join HOST:{server.sockets[0].getsockname()[1]}")
+        async with server:
+            await self.console(server)
+            for writer in list(self.learners):
+                self.drop(writer)
+            await asyncio.gather(*self.sessions, return_exceptions=True)
 
 class BashTutor:
-    def __init__ (self):
+    def __init__ (self, pack_dir: Optional[str] = PACK_DIR, watch: bool = False,
+                  user: Optional[str] = None, storage: Optional[Storage] = None,
+                  seed: Optional[int] = None):
         self.questions = {  
             Mode.BEGINNER: {
                 "What command creates a new file?": Command(
@@ -119,6 +3097,25 @@ class BashTutor:
                     "# No output is shown if successful"
                 ),
                 
+                "How do you copy all .{ext} files from {src} into {dest}?": QuestionTemplate(
+                    "cp {src}/*.{ext} {dest}/",
+                    "Copies every file ending in .{ext} from {src} into {dest}; the shell expands *.{ext} to the matching names",
+                    "cp {src}/*.{ext} {dest}/\ncp -v {src}/*.{ext} {dest}/  # Show each file as it is copied",
+                    "# No output is shown if successful",
+                    alternatives=("cp {src}/*.{ext} {dest}", "cp ./{src}/*.{ext} {dest}/"),
+                    slots={'ext': ('txt', 'log', 'csv', 'md', 'json', 'py', 'sh', 'conf'),
+                           'src': ('downloads', 'docs', 'src', 'logs', 'build', 'photos'),
+                           'dest': ('backup', 'archive', 'tmp', 'old', 'shared', 'export')}
+                ),
+
+                "How do you show the last {n} lines of {file}?": QuestionTemplate(
+                    "tail -n {n} {file}",
+                    "Prints the last {n} lines of {file} (-n sets how many lines)",
+                    "tail -n {n} {file}\ntail -f {file}  # Keep printing new lines as they are added",
+                    alternatives=("tail -{n} {file}", "tail --lines={n} {file}", "tail -n{n} {file}"),
+                    slots={'n': '2..100', 'file': ('app.log', 'access.log', 'error.log', 'notes.txt', 'data.csv')}
+                ),
+
                 "How do you move or rename a file?": Command(
                     "mv source destination",
                     "Moves a file to new location or renames it if destination is in same directory",
@@ -163,9 +3160,11 @@ class BashTutor:
                 
                 "How do you exit the terminal?": Command(
                     "exit",
-                    "Closes the current terminal session or shell",
-                    "exit",
-                    "# Terminal window will close"
+                    "Closes the current terminal session or shell. Pressing Ctrl-D at an empty "
+                    "prompt sends end of input, which closes the shell too",
+                    "exit\nlogout  # In a login shell",
+                    "# Terminal window will close",
+                    alternatives=("logout", "Ctrl-D", "Ctrl+D", "^D")
                 ),
                 
                 "How do you shut down the system?": Command(
@@ -317,6 +3316,27 @@ class BashTutor:
                     "src/main.c:// TODO: Implement error handling\nlogs/app.log:Error: Connection refused"
                 ),
 
+                "How do you find the .{ext} files under {dir} changed in the last {days} days?": QuestionTemplate(
+                    "find {dir} -name '*.{ext}' -mtime -{days}",
+                    "Searches {dir} recursively for names matching *.{ext} (quoted so find, not the shell, "
+                    "expands it) modified less than {days} days ago (-mtime -{days})",
+                    "find {dir} -name '*.{ext}' -mtime -{days}\nfind {dir} -name '*.{ext}' -mtime -{days} -ls  # With details",
+                    "{dir}/report.{ext}\n{dir}/notes/summary.{ext}",
+                    alternatives=("find {dir} -mtime -{days} -name '*.{ext}'",
+                                  "find {dir} -type f -name '*.{ext}' -mtime -{days}"),
+                    slots={'ext': ('txt', 'log', 'pdf', 'py', 'conf', 'jpg'),
+                           'dir': ('.', '/var/log', '/etc', '~/projects', '/tmp', 'src'),
+                           'days': '1..30'}
+                ),
+
+                "How do you send SIGTERM to the process with PID {pid}?": QuestionTemplate(
+                    "kill {pid}",
+                    "Asks process {pid} to terminate; kill sends SIGTERM (15) unless told otherwise",
+                    "kill {pid}\nkill -9 {pid}  # SIGKILL if it does not exit",
+                    alternatives=("kill -15 {pid}", "kill -TERM {pid}", "kill -SIGTERM {pid}", "kill -s TERM {pid}"),
+                    slots={'pid': '300..65535'}
+                ),
+
                 "How do you check running processes?": Command(
                     "ps",
                     "Shows snapshot of current processes in simple format",
@@ -913,7 +3933,7 @@ class BashTutor:
                 "What is the shell variable for system type?": Command(
                     "$OSTYPE",
                     "Contains the operating system type. Useful for writing cross-platform compatible scripts.",
-                    "case \"$OSTYPE\" in\n  linux*) echo \"Linux\";;\\n  darwin*) echo \"Mac\";;\\n  *) echo \"Other\";;\nesac",
+                    "case \"$OSTYPE\" in\n  linux*) echo \"Linux\";;\n  darwin*) echo \"Mac\";;\n  *) echo \"Other\";;\nesac",
                     "Linux"
                 ),
 
@@ -1187,7 +4207,7 @@ class BashTutor:
                 "How do you create a case statement?": Command(
                     'case $variable in pattern) commands;; esac',
                     "Creates a switch-like statement to handle multiple conditions.",
-                    'case "$answer" in\n  yes|Y) echo "Proceeding";;\\n  no|N) echo "Aborting";;\\n  *) echo "Invalid input";;\\nesac',
+                    'case "$answer" in\n  yes|Y) echo "Proceeding";;\n  no|N) echo "Aborting";;\n  *) echo "Invalid input";;\nesac',
                     "Proceeding"
                 ),
 
@@ -1208,7 +4228,7 @@ class BashTutor:
                 "How do you parse command line options?": Command(
                     'while getopts "options" var; do case $var in ...; esac done',
                     "Processes command-line flags and options using getopts.",
-                    'while getopts "f:v" opt; do\n    case $opt in\n        f) file="$OPTARG";;\\n        v) verbose=true;;\n    esac\ndone',
+                    'while getopts "f:v" opt; do\n    case $opt in\n        f) file="$OPTARG";;\n        v) verbose=true;;\n    esac\ndone',
                     "# Script can now handle -f file -v"
                 ),
 
@@ -1318,11 +4338,12 @@ class BashTutor:
                     "* Connected to api.example.com\n> GET / HTTP/1.1\n> Host: api.example.com\n< HTTP/1.1 200 OK\n< Content-Type: application/json"
                 ),
 
-                "How do you retry failed requests?": Command(
-                    "curl --retry n https://api.example.com",
-                    "Retries failed requests up to specified number of times",
-                    "curl --retry 5 --retry-delay 2 https://api.example.com  # Wait 2 seconds between retries\ncurl --retry 3 --retry-connrefused https://api.example.com",
-                    "# Will retry up to 3 times on failure"
+                "How do you retry failed requests up to {n} times?": QuestionTemplate(
+                    "curl --retry {n} https://api.example.com",
+                    "Retries failed requests up to {n} times",
+                    "curl --retry {n} --retry-delay 2 https://api.example.com  # Wait 2 seconds between retries\ncurl --retry {n} --retry-connrefused https://api.example.com",
+                    "# Will retry up to {n} times on failure",
+                    slots={'n': '2..5'}
                 ),
 
                 "How do you query OpenRouter's API for a chat completion?": Command(
@@ -1421,7 +4442,8 @@ class BashTutor:
                     "git checkout -b branch_name",
                     "Creates a new branch and switches to it immediately",
                     "git checkout -b feature/login\ngit checkout -b bugfix/issue-123 main  # Branch from main",
-                    "Switched to a new branch 'feature/login'"
+                    "Switched to a new branch 'feature/login'",
+                    alternatives=("git switch -c branch_name",)
                 ),
 
                 "How do you merge a branch into current branch?": Command(
@@ -1456,14 +4478,16 @@ class BashTutor:
                     "git checkout -- filename",
                     "Discards changes in working directory, reverting file to last commit",
                     "git checkout -- file.txt\ngit checkout -- .  # Discard all changes",
-                    "# No output if successful"
+                    "# No output if successful",
+                    alternatives=("git restore filename",)
                 ),
 
                 "How do you remove a file from staging?": Command(
                     "git reset HEAD filename",
                     "Unstages a file while preserving its contents",
                     "git reset HEAD file.txt\ngit reset HEAD .  # Unstage all changes",
-                    "Unstaged changes after reset:\nM       file.txt"
+                    "Unstaged changes after reset:\nM       file.txt",
+                    alternatives=("git restore --staged filename",)
                 ),
 
                 "How do you view changes in a file?": Command(
@@ -1484,7 +4508,8 @@ class BashTutor:
                     "git reset HEAD~1",
                     "Moves HEAD and branch pointer back one commit, preserving changes as unstaged",
                     "git reset HEAD~1\ngit reset --hard HEAD~1  # Discard changes completely",
-                    "Unstaged changes after reset:\nM       file.txt"
+                    "Unstaged changes after reset:\nM       file.txt",
+                    alternatives=("git reset --mixed HEAD~1",)
                 ),
                 "How do you view all remote repositories?": Command(
                     "git remote -v",
@@ -1511,7 +4536,8 @@ class BashTutor:
                     "git remote remove name",
                     "Removes a remote repository from local configuration",
                     "git remote remove upstream\ngit remote rm origin  # Alternative syntax",
-                    "# No output if successful"
+                    "# No output if successful",
+                    alternatives=("git remote rm name",)
                 ),
 
                 "How do you configure your Git username globally?": Command(
@@ -1557,13 +4583,157 @@ class BashTutor:
                 )
             }
         }
-        self.current_mode: Optional[Mode] = None
+        self.modes: Dict[str, AnyMode] = {mode.value: mode for mode in Mode}
+        self.builtin_questions = self.questions
+        self.packs: Dict[str, Pack] = {}
+        self.pack_loader = PackLoader(pack_dir) if pack_dir else None
+        self._reload_lock = threading.Lock()
+        self.pack_watcher = None
+        if self.pack_loader:
+            self.reload_packs()
+            if watch:
+                self.pack_watcher = PackWatcher(self.pack_loader.directory, self.reload_packs)
+                self.pack_watcher.start()
+        self.current_mode: Optional[AnyMode] = None
         self.current_question = None
+        self.current_prompt = None # current_question with template slots filled in
         self.current_answer: str = ""
         self.question_history = deque(maxlen=6) # Keeps last 6 questions
+        self.mode_weights: Dict[str, float] = {}
+        self.mode_mix: Optional[AliasSampler] = None
+        self._question_keys: Dict[AnyMode, Tuple[dict, List[str]]] = {}
+        self.user = user or os.environ.get('USER') or 'learner'
+        self.storage = storage or Storage()
+        # Every random choice of the session comes from this generator, so a seed replays it
+        self.seed = seed if seed is not None else random.getrandbits(63)
+        self.rng = random.Random(self.seed)
+        self.events = EventLog(self.storage)
+        self.skill = SkillModel(self.storage)
+        self.adaptive = False
+        self.drill: Optional[Drill] = None
+        self.latency = LatencyTracker(self.storage)
+        self.leaderboard = Leaderboard(self.storage)
+        self.mode_scores: Dict[str, int] = {}
+        self.streak = 0
+        self.review = ReviewQueue(self.storage, self.user)
+        self.reviewing = False
+        self.resumed = False
+        self._checkpointer: Optional[Checkpointer] = None
+        self._prompt: Optional[AnswerPrompt] = None
+        self._man_index: Optional[ManIndex] = None
+        self._man_indexed_catalog = None # self.questions as of the last man index update
+        self.live: Optional[BashPool] = None # Set by --live to run examples for real
+        self.grading_cache = GradingCache()
+        self.mock_api_url: Optional[str] = None # Set by --mock-api to run API answers for real
+        self.api_response: Optional[str] = None # What the last API answer got back
+        self.question_started_ns = 0
         self.score = 0
         self.high_score = self.load_high_score()
 
+    def reload_packs(self) -> int:
+        """Re-read the pack directory and swap in an updated catalog.
+
+        Only modes touched by changed packs are rebuilt, and unchanged entries
+        keep their existing Command objects. The new catalog is built on the
+        side and published with plain reference assignments, so the answer path
+        needs no lock and a question that is already being answered keeps its
+        ``current_answer``. Returns the number of packs that changed.
+        """
+        with self._reload_lock:
+            packs = {pack.path: pack for pack in self.pack_loader.load()}
+            changed = {path for path in packs
+                       if path in self.pack_loader.modified or path not in self.packs}
+            changed |= {path for path in self.packs if path not in packs}
+            if not changed:
+                return 0
+            affected = ({self.packs[path].mode.value for path in changed if path in self.packs}
+                        | {packs[path].mode.value for path in changed if path in packs})
+            questions = dict(self.questions)
+            modes = dict(self.modes)
+            for key in affected:
+                sources = [pack for pack in packs.values() if pack.mode.value == key]
+                old_mode = modes.get(key)
+                old_questions = questions.pop(old_mode, {}) if old_mode else {}
+                if isinstance(old_mode, Mode):
+                    mode = old_mode
+                    merged = dict(self.builtin_questions[mode])
+                elif sources:
+                    mode = sources[0].mode
+                    merged = {}
+                else:
+                    # Last pack for this mode was removed
+                    del modes[key]
+                    continue
+                for pack in sources:
+                    merged.update(pack.questions)
+                for question, command in merged.items():
+                    if old_questions.get(question) == command:
+                        merged[question] = old_questions[question]
+                questions[mode] = merged
+                modes[key] = mode
+            self.packs = packs
+            # Publish questions before modes so a listed mode always has questions
+            self.questions = questions
+            self.modes = modes
+            return len(changed)
+
+    @property
+    def prompt(self) -> 'AnswerPrompt':
+        """The readline prompt, set up on first use so one-shot subcommands leave history alone."""
+        if self._prompt is None:
+            self._prompt = AnswerPrompt(lambda: self.questions, self.storage.path(HISTORY_FILE))
+        return self._prompt
+
+    @property
+    def checkpoint_name(self) -> str:
+        safe_user = re.sub(r'[^\w.-]', '_', self.user)
+        return f"bash-tutor-session-{safe_user}.ckpt"
+
+    def checkpoint(self):
+        """Queue a snapshot of the session for the background checkpoint writer."""
+        if self._checkpointer is None:
+            self._checkpointer = Checkpointer(self.storage, self.checkpoint_name)
+        self._checkpointer.save(SessionSnapshot(
+            self.user, self.score,
+            self.current_mode.value if self.current_mode else None,
+            self.current_question, list(self.question_history), self.adaptive,
+            dict(self.mode_weights), dict(self.mode_scores), time.time(),
+            self.seed, self.rng.getstate(), self.reviewing))
+
+    def end_session(self):
+        """Forget the checkpoint of a session the learner ended on purpose."""
+        if self._checkpointer is not None:
+            self._checkpointer.discard()
+
+    def resume(self) -> bool:
+        """Restore the last checkpointed session of this user, if there is one."""
+        data = self.storage.read_bytes(self.checkpoint_name)
+        if data is None:
+            return False
+        try:
+            snapshot = SessionSnapshot.decode(data)
+        except (ValueError, UnicodeDecodeError) as e:
+            print(f"Error loading session checkpoint: {e}")
+            return False
+        self.score = snapshot.score
+        self.mode_scores = snapshot.mode_scores
+        if snapshot.seed is not None:
+            self.seed = snapshot.seed
+            self.rng.setstate(snapshot.rng_state)
+        self.adaptive = snapshot.adaptive
+        self.reviewing = snapshot.reviewing
+        self.question_history.extend(snapshot.history)
+        mix = {key: weight for key, weight in snapshot.mix.items() if key in self.modes}
+        if mix:
+            self.set_mode_mix(",".join(f"{key}={weight}" for key, weight in mix.items()))
+        self.current_mode = self.modes.get(snapshot.mode) if snapshot.mode else None
+        question = snapshot.question
+        if self.current_mode is not None and question in self.questions.get(self.current_mode, {}):
+            # A template question comes back with new slot values
+            self.set_question(self.current_mode, question, remember=False)
+        self.resumed = True
+        return True
+
     def load_high_score(self) -> int:
         """Load high score from file, create if doesn't exist."""
         try:
@@ -1592,7 +4762,36 @@ class BashTutor:
         if self.score > self.high_score:
             self.high_score = self.score
             self.save_high_score()
-            print(f"{SAGE}New High Score: {self.high_score}!{RESET}")
+            self.notify(f"New High Score: {self.high_score}!", 'good')
+
+        self.leaderboard.submit('all', self.user, self.score)
+        if self.current_mode is not None:
+            key = self.current_mode.value
+            self.mode_scores[key] = max(self.mode_scores.get(key, 0) + points, 0)
+            self.leaderboard.submit(key, self.user, self.mode_scores[key])
+
+    def display_leaderboard(self, board: str = 'all'):
+        """Show the top scores on a board and the user's own rank."""
+        print(f"\n{SOFT_GOLD}{self.leaderboard_title(board)}{RESET}")
+        lines = self.leaderboard_lines(board)
+        if not lines:
+            print("No scores yet.")
+        for line, mine in lines:
+            print(f"{SAGE if mine else LAVENDER}{line}{RESET}")
+
+    def leaderboard_title(self, board: str = 'all') -> str:
+        return f"{'All-time' if board == 'all' else self.modes[board].name.title()} Leaderboard"
+
+    def leaderboard_lines(self, board: str = 'all') -> List[Tuple[str, bool]]:
+        """Return the top scores on a board, then the user's own rank if lower, as (line, is the user) pairs."""
+        self.leaderboard.refresh()
+        entries = self.leaderboard.top(board)
+        lines = [(f"{position:>3}. {user:<20} {score}", user == self.user)
+                 for position, (user, score) in enumerate(entries, 1)]
+        rank = self.leaderboard.rank(board, self.user)
+        if rank is not None and rank > len(entries):
+            lines.append((f"{rank:>3}. {self.user:<20} {self.leaderboard.scores[board][self.user]}", True))
+        return lines
 
     def display_score(self):
         """Display current score and high score."""
@@ -1602,105 +4801,368 @@ class BashTutor:
         else:
             print(f"\n{BLUE}Current Score: {self.score}")  
             print(f"High Score: {self.high_score}{RESET}")
+        if self.adaptive:
+            print(f"{SKY_BLUE}Skill Rating: {self.skill.learner_rating(self.user):.0f}{RESET}")
 
     def clear_screen(self) -> None:
         """Clear the terminal screen."""
         os.system('clear' if os.name == 'posix' else 'cls')
 
-    def get_mode(self) -> Mode:
+    def get_mode(self) -> AnyMode:
         """Get the user's selected mode."""
+        keys = list(self.modes)
         while True:
             self.display_score() # Show scores when selecting mode
             print("\nSelect a mode:")
-            print(f"{LIGHT_PURPLE}b - Beginner (basic file operations, navigation)")
-            print("i - Intermediate (file searching, system monitoring, processes, networking)")
-            print("a - Advanced (system administration, performance tuning)")
-            print("u - Understanding (understanding of commands and flags)")
-            print("v - Variables (shell variables and their meanings)")
-            print("s - Scripting (bash scripting concepts)")
-            print("p - API (using curl to interact with APIs)")
-            print(f"g - Git (basic git commands){RESET}")
+            lines = []
+            for key, mode in self.modes.items():
+                if isinstance(mode, Mode):
+                    lines.append(f"{key} - {MODE_DESCRIPTIONS[mode]}")
+                elif mode.description:
+                    lines.append(f"{key} - {mode.name} ({mode.description})")
+                else:
+                    lines.append(f"{key} - {mode.name}")
+            print(f"{LIGHT_PURPLE}" + "\n".join(lines) + f"{RESET}")
             try:
-                choice = input("\nEnter mode (b/i/a/u/v/s/p/g): ").lower()
+                choice = input(f"\nEnter mode ({'/'.join(keys)}): ").lower()
                 if choice == 'exit':
+                    self.end_session()
                     print(f"{BLUE}Final Score: {self.score}")
                     print(f"High Score: {self.high_score}")
                     print(f"Thanks for learning! Goodbye!{RESET}")
                     sys.exit(0)
-                if choice in [m.value for m in Mode]:
-                    return Mode(choice)
-                print("Invalid choice. Please select b, i, a, u, v, s, p or g.")
+                if choice in self.modes:
+                    return self.modes[choice]
+                print(f"Invalid choice. Please select {', '.join(keys[:-1])} or {keys[-1]}.")
             except (KeyboardInterrupt, EOFError):
                 print(f"\n{BLUE}Final Score: {self.score}")
                 print(f"High Score: {self.high_score}")
                 print(f"Thanks for learning! Goodbye!{RESET}")
                 sys.exit(0)
 
+    def set_mode_mix(self, spec: Optional[str]):
+        """Draw questions from several modes with the given weights, or stop mixing."""
+        if not spec:
+            self.mode_weights, self.mode_mix = {}, None
+            return
+        weights = parse_mode_mix(spec, self.modes)
+        self.mode_mix = AliasSampler(list(weights), list(weights.values()))
+        self.mode_weights = weights
+
+    def describe_mode_mix(self) -> str:
+        total = sum(self.mode_weights.values())
+        return ", ".join(f"{self.modes[key].name.title() if key in self.modes else key} "
+                         f"{weight * 100 / total:.0f}%" for key, weight in self.mode_weights.items())
+
+    def draw_mode(self) -> AnyMode:
+        """Pick the mode for the next question, honouring a mode mix if one is set."""
+        while self.mode_mix:
+            key = self.mode_mix.draw(self.rng)
+            if key in self.modes and self.modes[key] in self.questions:
+                return self.modes[key]
+            # The mode was removed by a pack reload; drop it from the mix
+            del self.mode_weights[key]
+            self.set_mode_mix(",".join(f"{k}={w}" for k, w in self.mode_weights.items()
+                                       if w > 0))
+        return self.current_mode
+
+    def question_keys(self, mode: AnyMode) -> List[str]:
+        """Indexable list of a mode's questions, rebuilt only when the mode changes."""
+        questions = self.questions[mode]
+        cached = self._question_keys.get(mode)
+        if cached is None or cached[0] is not questions:
+            cached = (questions, list(questions))
+            self._question_keys[mode] = cached
+        return cached[1]
+
+    def set_question(self, mode: AnyMode, question: str, remember: bool = True) -> Tuple[str, Command]:
+        """Make ``question`` of ``mode`` current; templates get fresh slot values from the session RNG.
+
+        ``current_question`` stays the catalog key (what ratings, history and
+        the review queue track) and ``current_prompt`` is the text shown.
+        """
+        entry = self.questions[mode][question]
+        self.current_mode = mode
+        self.current_question = question
+        if isinstance(entry, QuestionTemplate):
+            self.current_prompt, self.current_answer = entry.instantiate(question, self.rng)
+        else:
+            self.current_prompt, self.current_answer = question, entry
+        if remember:
+            self.question_history.append(question)
+        return self.current_prompt, self.current_answer
+
+    def get_adaptive_question(self) -> Tuple[str, Command]:
+        """Get a question whose difficulty matches the learner's current rating."""
+        self.skill.index_catalog(self.questions)
+        learner = self.skill.learner_rating(self.user)
+        # Aim a little below the learner's level so most answers succeed
+        target = learner - 400 * math.log10(TARGET_SUCCESS / (1 - TARGET_SUCCESS))
+        history = set(self.question_history)
+        qid = self.skill.index.nearest(target, lambda qid: qid.split(':', 1)[1] in history, self.rng)
+        if qid is None:
+            self.question_history.clear()
+            qid = self.skill.index.nearest(target, rng=self.rng)
+        key, question = qid.split(':', 1)
+        return self.set_question(self.modes[key], question)
+
+    def record_result(self, is_correct: bool, is_case_mismatch: bool):
+        """Update the learner's and the question's ratings from an answer."""
+        if self.current_question is None or self.current_mode not in self.questions:
+            return
+        outcome = 1.0 if is_correct else 0.5 if is_case_mismatch else 0.0
+        self.skill.update(self.user, self.current_mode, self.current_question, outcome)
+        if self.skill.unsaved >= RATINGS_SAVE_EVERY:
+            self.skill.save()
+        qid = question_id(self.current_mode, self.current_question)
+        if is_correct:
+            self.review.hit(qid)
+        else:
+            self.review.miss(qid)
+        if self.review.unsaved >= REVIEW_SAVE_EVERY:
+            self.review.save()
+
+    def get_review_question(self) -> Optional[Tuple[str, Command]]:
+        """Get the queued question most in need of review, or None if the queue is empty."""
+        while len(self.review):
+            qid = self.review.next(list(self.question_history))
+            key, question = qid.split(':', 1)
+            mode = self.modes.get(key)
+            if mode is None or question not in self.questions.get(mode, {}):
+                # Removed from the catalog since it was missed
+                self.review.discard(qid)
+                continue
+            return self.set_question(mode, question)
+        return None
+
     def get_random_question(self) -> Tuple[str, Command]:
-        """Get a random question and its answer for the current mode."""
+        """Get a random question and its answer for the current mode (or mode mix)."""
+        if self.reviewing:
+            question = self.get_review_question()
+            if question is not None:
+                return question
+            self.reviewing = False
+            self.notify("Review queue is empty, back to regular questions!", 'good')
+            if self.current_mode is None:
+                self.current_mode = next(iter(self.modes.values()))
+        if self.adaptive:
+            return self.get_adaptive_question()
+        self.current_mode = self.draw_mode()
         questions = self.questions[self.current_mode]
-        available_questions = [q for q in questions.keys() 
-                             if q not in self.question_history]
-        
-        # If all recent questions have been used, reset history
-        if not available_questions:
-            available_questions = list(questions.keys())
-            self.question_history.clear()
-            
-        self.current_question = random.choice(available_questions)
-        self.current_answer = questions[self.current_question]
-        self.question_history.append(self.current_question)
-        return self.current_question, self.current_answer
+        keys = self.question_keys(self.current_mode)
+
+        # Rejection sampling keeps each draw O(1); the history is only a few entries
+        question = None
+        if len(keys) > len(self.question_history):
+            for _ in range(16):
+                candidate = self.rng.choice(keys)
+                if candidate not in self.question_history:
+                    question = candidate
+                    break
+        if question is None:
+            available_questions = [q for q in keys if q not in self.question_history]
+
+            # If all recent questions have been used, reset history
+            if not available_questions:
+                available_questions = keys
+                self.question_history.clear()
+            question = self.rng.choice(available_questions)
+
+        return self.set_question(self.current_mode, question)
+
+    def notify(self, text: str, tone: str = 'info'):
+        """Show a short status message in a tone of 'info', 'good', 'warn' or 'bad'.
+
+        Front-ends other than run() replace this. Tones rather than colours are
+        passed, so the colour is looked up in the theme active when it is shown.
+        """
+        color = {'good': SAGE, 'warn': SOFT_GOLD, 'bad': ROSE}.get(tone, BLUE)
+        print(f"{color}{text}{RESET}")
+
+    def start_session(self):
+        """Start the drill clock and log the session with its seed."""
+        if self.drill:
+            self.drill.start()
+        self.events.record('start', user=self.user, seed=self.seed, resumed=self.resumed)
+        # Runs on every way out: exit, Ctrl-C, end of input or an error
+        atexit.register(self.save_progress)
+
+    def save_progress(self):
+        """Write the ratings, answer times and review queue changes that have not been saved yet."""
+        if self.skill.unsaved:
+            self.skill.save()
+        if self.review.unsaved:
+            self.review.save()
+        if self.latency.unsaved:
+            self.latency.save()
+
+    def apply_outcome(self, is_correct: bool, is_case_mismatch: bool = False) -> int:
+        """Score the answer to (or skip of) the current question; returns the points."""
+        self.record_result(is_correct, is_case_mismatch)
+        if self.current_mode is not None and self.current_question is not None:
+            latency_ms = (time.perf_counter_ns() - self.question_started_ns) // 1_000_000 \
+                if self.question_started_ns else None
+            self.events.record('answer', user=self.user, seed=self.seed,
+                               question=question_id(self.current_mode, self.current_question),
+                               correct=is_correct, case_mismatch=is_case_mismatch, latency_ms=latency_ms)
+        if is_case_mismatch:
+            points = CASE_MISMATCH_POINTS
+        elif is_correct:
+            points = CORRECT_POINTS
+        else:
+            points = INCORRECT_POINTS
+        self.streak = self.streak + 1 if is_correct else 0
+        self.update_score(points)
+        return points
 
     def display_explanation(self, command: Command, is_correct: bool = True, is_case_mismatch: bool = False) -> None:
         """Display detailed explanation of a command."""
-        if is_case_mismatch:
-            color = PEACH
-            self.update_score(CASE_MISMATCH_POINTS)
-            print(f"{color}[{CASE_MISMATCH_POINTS} points]{RESET}")
-        else:
-            if is_correct:
-                color = CYAN
-                self.update_score(CORRECT_POINTS)
-                print(f"{color}[+{CORRECT_POINTS} points]{RESET}")
-            else:
-                color = ROSE
-                self.update_score(INCORRECT_POINTS)
-                print(f"{color}[{INCORRECT_POINTS} points]{RESET}")
-            
-        print(f"\n{color}{'=' * 50}{RESET}")
-        print(f"{color}Command:{RESET}     {command.command}")
-        print(f"{color}Purpose:{RESET}     {command.explanation}")
-        print(f"{color}Example:{RESET}     {command.example}")
-        if command.output:
-            print(f"{color}Sample Output:{RESET}\n{command.output}")
-        print(f"{color}{'=' * 50}{RESET}")
+        points = self.apply_outcome(is_correct, is_case_mismatch)
+        outcome = 'case_mismatch' if is_case_mismatch else 'correct' if is_correct else 'incorrect'
+        print(THEME.render(f'card_{outcome}', points=points, command=command.command,
+                           explanation=command.explanation, example=command.example))
+        live = self.live_output(command.example)
+        if live is not None:
+            print(THEME.render(f'card_live_{outcome}', output=live))
+        elif command.output:
+            print(THEME.render(f'card_output_{outcome}', output=command.output))
+        print(THEME.render(f'card_end_{outcome}'))
+        if self.drill:
+            self.record_drill_answer(is_correct)
         self.display_score()
 
+    def live_output(self, code: str) -> Optional[str]:
+        """Output of ``code`` run in the live shell pool, or None when not running live."""
+        if self.live is None or self.current_mode is None or self.current_mode.value not in LIVE_MODES:
+            return None
+        result = self.live.evaluate(code)
+        output = result.output.rstrip('\n')
+        if result.timed_out:
+            output += f"\n(stopped after {self.live.timeout:g}s)"
+        return output or "(no output)"
+
+    def answer_expansion(self, answer: str) -> Optional[str]:
+        """What a variable answer such as $HOME expands to in the live shell.
+
+        Only a lone variable reference is expanded; any other answer is never
+        handed to the shell and gives None.
+        """
+        if not VARIABLE_REFERENCE.fullmatch(answer):
+            return None
+        return self.live_output(f'printf \'%s\\n\' "{answer}"')
+
+    def record_drill_answer(self, is_correct: bool):
+        """Time the answer to the current question and award the speed bonus."""
+        seconds = (time.perf_counter_ns() - self.question_started_ns) / 1e9
+        bonus = self.drill.record(seconds, is_correct)
+        self.drill.points += (CORRECT_POINTS + bonus) if is_correct else 0
+        if self.current_question is not None and self.current_mode in self.questions:
+            self.latency.record(self.user, question_id(self.current_mode, self.current_question), seconds)
+        if bonus:
+            self.update_score(bonus)
+            self.notify(f"{seconds:.1f}s [+{bonus} speed bonus]", 'warn')
+        else:
+            self.notify(f"{seconds:.1f}s", 'warn')
+
+    def finish_drill(self) -> List[str]:
+        """End the drill, save the answer times and return the summary lines."""
+        drill, self.drill = self.drill, None
+        self.latency.save()
+        accuracy = drill.correct * 100 / drill.answered if drill.answered else 0
+        lines = [f"Drill complete: {drill.answered} questions in {drill.elapsed():.1f}s",
+                 f"Accuracy:       {drill.correct}/{drill.answered} ({accuracy:.0f}%)"]
+        if drill.answered:
+            lines.append(f"Answer time:    median {drill.median.value():.1f}s, "
+                         f"90th percentile {drill.p90.value():.1f}s")
+        lines.append(f"Drill points:   {drill.points}")
+        return lines
+
     def check_answer(self, user_answer: str) -> (bool, bool):
-        """Check if the user's answer matches the correct answer."""
-        user_answer = user_answer.strip()
-        correct_answer = self.current_answer.command.strip()
-        
-        # Check if answer matches ignoring case
-        if user_answer.lower() == correct_answer.lower():
-            # If it matches ignoring case but doesn't match exactly,
-            # it's a case mismatch
-            if user_answer != correct_answer:
-                return False, True  # False for incorrect, True for case mismatch
-            return True, False  # True for correct, False for case mismatch
-        return False, False  # False for incorrect, False for case mismatch
+        """Check if the user's answer matches the correct answer (or an accepted alternative).
+
+        Returns (is_correct, is_case_mismatch); an answer that only matches
+        ignoring case is a case mismatch.
+        """
+        if self.current_mode is None or self.current_question is None:
+            return grade_answer(self.current_answer, user_answer)
+        # Keyed by the text shown, so each template instance has its own verdicts
+        is_correct, is_case_mismatch = self.grading_cache.grade(
+            question_id(self.current_mode, self.current_prompt), self.current_answer, user_answer)
+        self.api_response = None
+        if self.mock_api_url and self.current_mode is Mode.API:
+            is_correct = self.grade_api_response(user_answer) or is_correct
+        return is_correct, is_case_mismatch and not is_correct
+
+    def grade_api_response(self, user_answer: str) -> bool:
+        """Run the answer and the expected command against the mock API and compare their effects.
+
+        An answer spelled differently is correct when the server saw the same
+        requests (method, path, query, body, auth) with the same statuses, and
+        it wrote the same files and printed the same kind of output.
+        """
+        answer = run_mock_curl(user_answer, self.mock_api_url)
+        if answer is None:
+            return False
+        self.api_response = answer['output']
+        expected = run_mock_curl(self.current_answer.command, self.mock_api_url)
+        if expected is None or not expected['requests']:
+            return False
+        return all(answer[key] == expected[key] for key in ('requests', 'files', 'exit', 'headers', 'verbose'))
+
+    def is_session_command(self, user_input: str, name: str, takes_argument: bool = False) -> bool:
+        """Check for a session command such as 'top' or 'mix g=1'.
+
+        Input whose first word is also the first word of the current answer
+        (e.g. 'top' when the question is about top) is treated as an answer.
+        """
+        words = user_input.lower().split()
+        if not words or words[0] != name or (takes_argument and len(words) < 2):
+            return False
+        answer = self.current_answer.command.split() if self.current_answer else []
+        return not answer or answer[0].lower() != name
+
+    def explain_command(self, command_line: str) -> List[Tuple[str, Optional[str]]]:
+        """Explain each program, flag and operator of a command line from the man page index."""
+        if self._man_index is None:
+            path = self.storage.path(MAN_INDEX_FILE)
+            if not os.path.exists(path):
+                self.notify("Indexing the man pages, this only happens once...")
+            self._man_index = ManIndex(path, lambda: self.questions)
+        # Once per session, and again only after a pack reload swaps the catalog
+        if self._man_indexed_catalog is not self.questions:
+            questions = self.questions
+            self._man_index.update()
+            self._man_indexed_catalog = questions
+        return self._man_index.explain(command_line)
+
+    def print_command_explanation(self, command_line: str):
+        for word, text in self.explain_command(command_line):
+            if text:
+                print(f"{CYAN}{word}{RESET}  {text}")
+            else:
+                print(f"{CYAN}{word}{RESET}  {LAVENDER}(no explanation found){RESET}")
 
     def provide_hint(self) -> str:
         """Provide a hint for the current question."""
         return f"Hint: The answer starts with '{self.current_answer.command[0]}'"
 
+    def print_question(self, question: str):
+        if self.drill:
+            print(f"\n{SOFT_GOLD}{self.drill.progress()}{RESET} {PURPLE}{question}{RESET}")
+        else:
+            print(f"\n{PURPLE}{question}{RESET}")
+
     def run(self):
         """Main program loop."""
         self.clear_screen()
         print_rainbow('=' * 50)
         print("\nWelcome to bash-tutor!")        
         print("Type 'exit' to quit, 'hint' for a hint,\n'skip' to skip question, or 'mode' to change mode")
+        print("Type 'mix g=50,s=30,a=20' to mix modes with weights,\nor 'adaptive' to follow your skill level")
+        print("Type 'drill 20' or 'drill 90s' for a timed drill")
+        print("Type 'top' or 'top <mode>' to see the leaderboard")
+        print("Type 'review' to go over the questions you missed")
+        print("Type 'explain <command>' to explain any command line")
         print_rainbow('=' * 50)
         print(f"\n{BLUE}If you wish to reset the current score, type 'clears'{RESET}")
         print(f"{BLUE}If you wish to reset the high score, type 'clearh'{RESET}")
@@ -1712,18 +5174,40 @@ class BashTutor:
         print("-" * 40)
 
         # Get initial mode
-        self.current_mode = self.get_mode()
+        if self.resumed and (self.adaptive or self.mode_mix or self.current_mode):
+            print(f"{SKY_BLUE}Resumed session for {self.user} with score {self.score}{RESET}")
+        elif self.reviewing:
+            print(f"{SKY_BLUE}Reviewing {len(self.review)} missed questions{RESET}")
+            self.current_mode = None
+        elif self.adaptive:
+            print(f"{SKY_BLUE}Adaptive session for {self.user}: questions follow your skill rating{RESET}")
+            self.current_mode = None
+        elif self.mode_mix:
+            print(f"{SKY_BLUE}Mixed session: {self.describe_mode_mix()}{RESET}")
+            self.current_mode = self.draw_mode()
+        else:
+            self.current_mode = self.get_mode()
+        self.start_session()
 
         while True:
+            if self.current_mode not in self.questions and not (self.mode_mix or self.adaptive or self.reviewing):
+                # The mode was renamed or removed by a pack reload
+                self.current_mode = self.modes.get(self.current_mode.value) or self.get_mode()
+            if self.drill and self.drill.finished():
+                summary = "\n".join(self.finish_drill())
+                print(f"\n{SOFT_GOLD}{'=' * 50}\n{summary}\n{'=' * 50}{RESET}")
+                self.current_question = None
             if not hasattr(self, 'current_question') or self.current_question is None:
                 question, _ = self.get_random_question()
+                self.question_started_ns = time.perf_counter_ns()
             else:
-                question = self.current_question
+                question = self.current_prompt
 
-            print(f"\n{PURPLE}{question}{RESET}")
+            self.checkpoint()
+            self.print_question(question)
 
             try:
-                user_input = input("> ").strip()
+                user_input = self.prompt.read("> ").strip()
             except (KeyboardInterrupt, EOFError):
                 print("\nThanks for learning! Goodbye!")
                 sys.exit(0)
@@ -1733,33 +5217,82 @@ class BashTutor:
                 if question == "How do you exit the terminal?":
                     is_correct, is_case_mismatch = self.check_answer(user_input)
                     if is_correct:
-                        print(f"{CYAN}Correct! Well done!{RESET}")
+                        print(THEME.render('correct'))
                         self.display_explanation(self.current_answer, True, False)
                         self.current_question = None
                         continue  # Skip the normal answer handling below
                     else:
                         if is_case_mismatch:
-                            print(f"{PEACH}Wrong capitalisation. Please check your casing.{RESET}")
+                            print(THEME.render('case_mismatch'))
                             self.display_explanation(self.current_answer, False, True)
                         else:
-                            print(f"{ROSE}Incorrect. The correct answer is: {self.current_answer.command}{RESET}")
+                            print(THEME.render('incorrect', answer=self.current_answer.command))
                             self.display_explanation(self.current_answer, False, False)
                         self.current_question = None
                         continue  # Skip the normal answer handling below
                 else:
+                    self.end_session()
                     print(f"\n{BLUE}Final Score: {self.score}")
                     print(f"High Score: {self.high_score}")
                     print(f"Thanks for learning! Goodbye!{RESET}")
                     break
             elif user_input.lower() == 'hint':
-                print(f"{YELLOW}{self.provide_hint()}{RESET}")
+                print(THEME.render('hint', hint=self.provide_hint()))
                 continue  # Keep same question
             elif user_input.lower() == 'mode':
+                self.set_mode_mix(None)
+                self.adaptive = False
+                self.reviewing = False
                 self.current_mode = self.get_mode()
                 self.current_question = None  # Reset question for new mode
                 continue
+            elif self.is_session_command(user_input, 'top'):
+                board = user_input[4:].strip().lower() or 'all'
+                if board != 'all' and board not in self.modes:
+                    print(f"{ROSE}Unknown mode {board!r}. Use 'top' or 'top <mode>'.{RESET}")
+                else:
+                    self.display_leaderboard(board)
+                continue
+            elif self.is_session_command(user_input, 'drill', takes_argument=True):
+                try:
+                    self.drill = Drill.parse(user_input[6:])
+                except ValueError as e:
+                    print(f"{ROSE}Invalid drill: {e}{RESET}")
+                    continue
+                print(f"{SOFT_GOLD}Timed drill started: answer quickly for speed bonuses!{RESET}")
+                self.current_question = None
+                continue
+            elif self.is_session_command(user_input, 'explain', takes_argument=True):
+                self.print_command_explanation(user_input.split(None, 1)[1])
+                continue  # Keep same question
+            elif self.is_session_command(user_input, 'review'):
+                if not len(self.review):
+                    print(f"{SAGE}Nothing to review yet. Missed and skipped questions will show up here.{RESET}")
+                    continue
+                self.reviewing = True
+                print(f"{SKY_BLUE}Reviewing {len(self.review)} missed questions{RESET}")
+                self.current_question = None
+                continue
+            elif user_input.lower() == 'adaptive':
+                self.reviewing = False
+                self.adaptive = True
+                print(f"{SKY_BLUE}Adaptive session: questions follow your skill rating "
+                      f"({self.skill.learner_rating(self.user):.0f}){RESET}")
+                self.current_question = None
+                continue
+            elif self.is_session_command(user_input, 'mix', takes_argument=True):
+                self.adaptive = False
+                self.reviewing = False
+                try:
+                    self.set_mode_mix(user_input[4:])
+                except ValueError as e:
+                    print(f"{ROSE}Invalid mix: {e}{RESET}")
+                    continue
+                print(f"{SKY_BLUE}Mixed session: {self.describe_mode_mix()}{RESET}")
+                self.current_question = None  # Draw from the new mix
+                continue
             elif user_input.lower() == 'skip':
-                print(f"The answer is: {CYAN}{self.current_answer.command}{RESET}")
+                print(THEME.render('skip', answer=self.current_answer.command))
                 self.display_explanation(self.current_answer, False)
                 self.current_question = None  # Get new question next time
                 continue
@@ -1781,22 +5314,1507 @@ class BashTutor:
                 continue
 
             is_correct, is_case_mismatch = self.check_answer(user_input)
+            if self.api_response:
+                print(f"{SKY_BLUE}The mock API answered:{RESET}\n{self.api_response.rstrip()}")
+            if self.current_mode is Mode.VARIABLES:
+                expansion = self.answer_expansion(user_input)
+                if expansion is not None:
+                    print(f"{SKY_BLUE}Your answer expands to:{RESET} {expansion}")
             if is_correct:
-                print(f"{CYAN}Correct! Well done!{RESET}")
+                print(THEME.render('correct'))
                 self.display_explanation(self.current_answer, True, False)
                 self.current_question = None  # Get new question next time
             else:
                 if is_case_mismatch:
-                    print(f"{PEACH}Wrong capitalisation. Please check your casing.{RESET}")
+                    print(THEME.render('case_mismatch'))
                     self.display_explanation(self.current_answer, False, True)  # Note the True for is_case_mismatch
                 else:
-                    print(f"{ROSE}Incorrect. The correct answer is: {self.current_answer.command}{RESET}")
+                    print(THEME.render('incorrect', answer=self.current_answer.command))
                     self.display_explanation(self.current_answer, False, False)
                 self.current_question = None  # Get new question next time
 
+def mode_title(mode: AnyMode) -> str:
+    return mode.name.title() if isinstance(mode, Mode) else mode.name
+
+class Pane:
+    """A boxed region of the TUI that is only repainted when its content changes."""
+
+    def __init__(self, title: str = "", boxed: bool = True):
+        self.title = title
+        self.boxed = boxed
+        self.lines: List[Tuple[str, int]] = []
+        self.win = None
+        self.dirty = True
+
+    def place(self, height: int, width: int, y: int, x: int):
+        import curses
+        self.win = curses.newwin(height, width, y, x)
+        self.dirty = True
+
+    def set(self, lines: List[Tuple[str, int]]):
+        if lines != self.lines:
+            self.lines = lines
+            self.dirty = True
+
+    def render(self):
+        if not self.dirty or self.win is None:
+            return
+        import curses
+        height, width = self.win.getmaxyx()
+        border = 1 if self.boxed else 0
+        self.win.erase()
+        if self.boxed:
+            self.win.box()
+            if self.title:
+                self.win.addnstr(0, 2, f" {self.title} ", width - 4, curses.A_BOLD)
+        row = border
+        for text, attr in self.lines:
+            for paragraph in text.split("\n"):
+                for line in textwrap.wrap(paragraph, width - 2 * border - 1, subsequent_indent='  ') or ['']:
+                    if row >= height - border:
+                        break
+                    self.win.addnstr(row, border, line, width - 2 * border - 1, attr)
+                    row += 1
+        self.win.noutrefresh()
+        self.dirty = False
+
+class TutorTUI:
+    """Full-screen curses front-end driving the same BashTutor engine as run().
+
+    The screen is split into panes that are repainted only when their content
+    changes, and all changes are flushed with a single doupdate().
+    """
+
+    SIDEBAR_WIDTH = 30
+    NOTIFY_COLORS = {'good': 'good', 'warn': 'mismatch', 'bad': 'incorrect'} # tutor.notify tones to pairs
+
+    def __init__(self, tutor: BashTutor):
+        self.tutor = tutor
+        self.question = Pane("Question")
+        self.explanation = Pane("Explanation")
+        self.sidebar = Pane("Score")
+        self.answer = Pane("Answer")
+        self.footer = Pane(boxed=False)
+        self.panes = [self.question, self.explanation, self.sidebar, self.answer, self.footer]
+        self.buffer = ""
+        self.status: Tuple[str, int] = ("", 0)
+        self.running = True
+
+    def run(self):
+        import curses
+        curses.wrapper(self._main)
+
+    def paint(self):
+        """Redraw the dirty panes and flush them to the terminal in one update."""
+        self.update_sidebar()
+        for pane in self.panes:
+            pane.render()
+        self.stdscr.move(*self.cursor)
+        self.curses.doupdate()
+
+    def _main(self, stdscr):
+        import curses
+        self.curses = curses
+        names = ('correct', 'mismatch', 'incorrect', 'question', 'good', 'info')
+        self.colors = dict.fromkeys(names, 0)
+        if curses.has_colors():
+            try:
+                curses.use_default_colors()
+                background = -1
+            except curses.error:
+                background = curses.COLOR_BLACK
+            for pair, color in enumerate((curses.COLOR_CYAN, curses.COLOR_YELLOW, curses.COLOR_RED,
+                                          curses.COLOR_MAGENTA, curses.COLOR_GREEN, curses.COLOR_BLUE), 1):
+                curses.init_pair(pair, color, background)
+            self.colors = {name: curses.color_pair(pair) for pair, name in enumerate(names, 1)}
+        self.stdscr = stdscr
+        stdscr.keypad(True)
+        self.tutor.notify = self._notify
+        if self.tutor.current_mode is None and not (self.tutor.mode_mix or self.tutor.adaptive):
+            self.tutor.current_mode = next(iter(self.tutor.modes.values()))
+        self._layout()
+        self.tutor.start_session()
+        if self.tutor.current_question is None:
+            self.next_question()
+        else:
+            self.show_question()
+        while self.running:
+            self.paint()
+            try:
+                key = stdscr.get_wch()
+            except KeyboardInterrupt:
+                break
+            self.handle_key(key)
+
+    def _layout(self):
+        self.stdscr.erase()
+        self.stdscr.noutrefresh()
+        lines, cols = self.stdscr.getmaxyx()
+        main_width = max(cols - self.SIDEBAR_WIDTH, 20)
+        question_height = 5
+        answer_height = 3
+        explanation_height = max(lines - question_height - answer_height - 1, 3)
+        self.question.place(question_height, main_width, 0, 0)
+        self.explanation.place(explanation_height, main_width, question_height, 0)
+        self.answer.place(answer_height, main_width, question_height + explanation_height, 0)
+        self.sidebar.place(max(lines - 1, 3), max(cols - main_width, 10), 0, main_width)
+        self.footer.place(1, cols, lines - 1, 0)
+        self.update_answer()
+        self.update_footer()
+
+    def _notify(self, text: str, tone: str = 'info'):
+        self.status = (text, self.colors[self.NOTIFY_COLORS.get(tone, 'info')])
+        self.update_footer()
+
+    @property
+    def cursor(self) -> Tuple[int, int]:
+        y, x = self.answer.win.getbegyx()
+        width = self.answer.win.getmaxyx()[1]
+        return y + 1, x + min(3 + len(self.buffer), width - 2)
+
+    def update_answer(self):
+        width = self.answer.win.getmaxyx()[1] if self.answer.win else 80
+        visible = self.buffer[-(width - 6):] if len(self.buffer) > width - 6 else self.buffer
+        self.answer.set([(f"> {visible}", 0)])
+
+    def update_footer(self):
+        tutor = self.tutor
+        modes = " ".join(f"[{key}]" if mode == tutor.current_mode and not (tutor.mode_mix or tutor.adaptive)
+                         else key for key, mode in tutor.modes.items())
+        status, attr = self.status
+        self.footer.set([(f" F2 next mode | mode <key> | hint skip review exit | modes: {modes}   {status}", attr)])
+
+    def update_sidebar(self):
+        tutor = self.tutor
+        if tutor.reviewing:
+            session = f"Review ({len(tutor.review)} left)"
+        elif tutor.adaptive:
+            session = "Adaptive"
+        elif tutor.mode_mix:
+            session = f"Mixed: {tutor.describe_mode_mix()}"
+        else:
+            session = mode_title(tutor.current_mode) if tutor.current_mode else ""
+        lines = [(f"Score:      {tutor.score}", self.colors['good'] if tutor.score == tutor.high_score else 0),
+                 (f"High Score: {tutor.high_score}", 0),
+                 (f"Streak:     {tutor.streak}", self.colors['correct'] if tutor.streak else 0),
+                 ("", 0),
+                 (f"Mode: {session}", self.colors['info']),
+                 (f"Rating: {tutor.skill.learner_rating(tutor.user):.0f}", 0)]
+        if tutor.drill:
+            lines.append((f"Drill: {tutor.drill.progress()}", self.colors['mismatch']))
+        self.sidebar.set(lines)
+
+    def next_question(self):
+        tutor = self.tutor
+        if tutor.drill and tutor.drill.finished():
+            self.explanation.set([(line, self.colors['mismatch']) for line in tutor.finish_drill()])
+        tutor.get_random_question()
+        tutor.question_started_ns = time.perf_counter_ns()
+        self.show_question()
+
+    def show_question(self):
+        self.tutor.checkpoint()
+        self.question.set([(self.tutor.current_prompt, self.colors['question'] | self.curses.A_BOLD)])
+        self.update_footer()
+
+    def handle_key(self, key):
+        curses = self.curses
+        if key == curses.KEY_RESIZE:
+            self._layout()
+        elif key == curses.KEY_F2:
+            keys = list(self.tutor.modes)
+            current = self.tutor.current_mode.value if self.tutor.current_mode else keys[-1]
+            self.switch_mode(keys[(keys.index(current) + 1) % len(keys)] if current in keys else keys[0])
+        elif key in ('\n', '\r', curses.KEY_ENTER):
+            text, self.buffer = self.buffer.strip(), ""
+            self.update_answer()
+            if text:
+                self.submit(text)
+        elif key in (curses.KEY_BACKSPACE, '\x7f', '\b'):
+            self.buffer = self.buffer[:-1]
+            self.update_answer()
+        elif key == '\x15': # Ctrl-U
+            self.buffer = ""
+            self.update_answer()
+        elif key == '\x04' and not self.buffer: # Ctrl-D
+            self.running = False
+        elif isinstance(key, str) and key.isprintable():
+            self.buffer += key
+            self.update_answer()
+
+    def switch_mode(self, key: str):
+        tutor = self.tutor
+        tutor.set_mode_mix(None)
+        tutor.adaptive = False
+        tutor.reviewing = False
+        tutor.current_mode = tutor.modes[key]
+        self.status = (f"Mode: {mode_title(tutor.current_mode)}", self.colors['info'])
+        self.next_question()
+
+    def submit(self, text: str):
+        tutor = self.tutor
+        command = text.lower()
+        if command == 'exit' and tutor.current_question != "How do you exit the terminal?":
+            tutor.end_session()
+            self.running = False
+            return
+        if command == 'hint':
+            self.status = (tutor.provide_hint(), self.colors['mismatch'])
+            self.update_footer()
+            return
+        if tutor.is_session_command(text, 'explain', takes_argument=True):
+            self.explanation.set([(word, self.colors['question']) if text is None else
+                                  (f"{word}  {text}", 0)
+                                  for word, text in tutor.explain_command(text.split(None, 1)[1])])
+            return
+        if command == 'review' and tutor.is_session_command(text, 'review'):
+            if len(tutor.review):
+                tutor.reviewing = True
+                self.status = (f"Reviewing {len(tutor.review)} missed questions", self.colors['info'])
+                self.next_question()
+            else:
+                self.status = ("Nothing to review yet", self.colors['info'])
+                self.update_footer()
+            return
+        if self.session_command(text):
+            return
+        if command.startswith('mode '):
+            key = command[5:].strip()
+            if key in tutor.modes:
+                self.switch_mode(key)
+            else:
+                self.status = (f"Unknown mode {key!r}", self.colors['incorrect'])
+                self.update_footer()
+            return
+        if command == 'skip':
+            is_correct, is_case_mismatch = False, False
+            verdict = f"The answer is: {tutor.current_answer.command}"
+        else:
+            is_correct, is_case_mismatch = tutor.check_answer(text)
+            if is_correct:
+                verdict = "Correct! Well done!"
+            elif is_case_mismatch:
+                verdict = "Wrong capitalisation. Please check your casing."
+            else:
+                verdict = f"Incorrect. The correct answer is: {tutor.current_answer.command}"
+        self.status = ("", 0)
+        points = tutor.apply_outcome(is_correct, is_case_mismatch)
+        if tutor.drill:
+            tutor.record_drill_answer(is_correct)
+        color = self.colors['correct' if is_correct else 'mismatch' if is_case_mismatch else 'incorrect']
+        command_entry = tutor.current_answer
+        lines = [(f"{verdict} [{points:+d} points]", color | self.curses.A_BOLD),
+                 ("", 0),
+                 (f"Command:  {command_entry.command}", color),
+                 (f"Purpose:  {command_entry.explanation}", 0),
+                 (f"Example:  {command_entry.example}", 0)]
+        if command_entry.output:
+            lines.append((f"Sample Output:\n{command_entry.output}", 0))
+        if tutor.api_response and command != 'skip':
+            lines.append((f"The mock API answered:\n{tutor.api_response.rstrip()}", 0))
+        self.explanation.set(lines)
+        self.update_footer()
+        self.next_question()
+
+    def session_command(self, text: str) -> bool:
+        """Run the session commands the line interface also takes; False if text is an answer."""
+        tutor = self.tutor
+        command = text.lower()
+        if tutor.is_session_command(text, 'top'):
+            board = command[4:].strip() or 'all'
+            if board != 'all' and board not in tutor.modes:
+                self.status = (f"Unknown mode {board!r}", self.colors['incorrect'])
+            else:
+                lines = tutor.leaderboard_lines(board) or [("No scores yet.", False)]
+                self.explanation.set([(tutor.leaderboard_title(board), self.colors['mismatch'] | self.curses.A_BOLD)] +
+                                     [(line, self.colors['good'] if mine else 0) for line, mine in lines])
+                self.status = ("", 0)
+        elif tutor.is_session_command(text, 'drill', takes_argument=True):
+            try:
+                tutor.drill = Drill.parse(text[6:])
+            except ValueError as e:
+                self.status = (f"Invalid drill: {e}", self.colors['incorrect'])
+            else:
+                self.status = ("Timed drill started", self.colors['mismatch'])
+                self.next_question()
+        elif tutor.is_session_command(text, 'mix', takes_argument=True):
+            try:
+                tutor.set_mode_mix(text[4:])
+            except ValueError as e:
+                self.status = (f"Invalid mix: {e}", self.colors['incorrect'])
+            else:
+                tutor.adaptive = tutor.reviewing = False
+                self.status = (f"Mixed: {tutor.describe_mode_mix()}", self.colors['info'])
+                self.next_question()
+        elif command == 'adaptive' and tutor.is_session_command(text, 'adaptive'):
+            tutor.reviewing = False
+            tutor.adaptive = True
+            self.status = (f"Adaptive session ({tutor.skill.learner_rating(tutor.user):.0f})", self.colors['info'])
+            self.next_question()
+        elif command in ('clears', 'clearh', 'clearb') and tutor.is_session_command(text, command):
+            if command != 'clearh':
+                tutor.score = 0
+            if command != 'clears':
+                tutor.high_score = tutor.score
+                tutor.save_high_score()
+            self.status = ("Scores reset", self.colors['info'])
+        else:
+            return False
+        self.update_footer()
+        return True
+
+def entry_fields(entry) -> Dict[str, str]:
+    """Return the fields of a Command or Variable, with the answer under 'command'."""
+    fields = {f.name: getattr(entry, f.name) for f in dataclasses.fields(entry) if f.init}
+    if 'name' in fields:
+        fields['command'] = fields.pop('name')
+    return fields
+
+def entry_hash(mode: AnyMode, question: str, entry) -> str:
+    """Content hash of a catalog entry, used to cache per-entry results."""
+    payload = json.dumps([VALIDATE_CHECKS_VERSION, mode.value, question, entry_fields(entry)],
+                         sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+# First word of a runnable command: a program or keyword, a $variable,
+# an assignment, a shebang or a test/arithmetic bracket
+COMMAND_START = re.compile(r"^(?:[A-Za-z_.~/][\w.+/~-]*(?:\(\))?|\$\S+|\w+=\S*|#!\S+|\[\[?|\(\(?|\{|!)$")
+
+def _bash_syntax_errors(examples: List[str]) -> List[Optional[str]]:
+    """Run ``bash -n`` over many examples with as few processes as possible.
+
+    Each example is wrapped in its own function body so that an unclosed
+    construct cannot be completed by the next one. A batch that passes is
+    accepted in one process; a failing batch is bisected to find the culprits.
+    """
+    if not examples:
+        return []
+    script = ''.join(f"__example_{i}() {{\n:\n{example}\n}}\n" for i, example in enumerate(examples))
+    result = subprocess.run(['bash', '-n'], input=script, capture_output=True, text=True)
+    if result.returncode == 0:
+        return [None] * len(examples)
+    if len(examples) == 1:
+        error = result.stderr.strip().splitlines()[0] if result.stderr.strip() else "syntax error"
+        # Report line numbers relative to the example, not the wrapper
+        return [re.sub(r"line (\d+)", lambda m: f"line {max(int(m.group(1)) - 2, 1)}", error, count=1)]
+    middle = len(examples) // 2
+    return _bash_syntax_errors(examples[:middle]) + _bash_syntax_errors(examples[middle:])
+
+def _validate_chunk(chunk: List[Tuple[str, bool, Dict[str, str]]]) -> List[Tuple[str, List[List[str]]]]:
+    """Check a chunk of (hash, is_command, fields) entries in a worker process."""
+    results = []
+    for digest, is_command, fields in chunk:
+        issues = []
+        for required in ('command', 'explanation', 'example'):
+            if not fields.get(required, '').strip():
+                issues.append(['error', f"missing '{required}'"])
+        if is_command and fields.get('command', '').strip():
+            for answer in [fields['command']] + list(fields.get('alternatives', ())):
+                try:
+                    words = shlex.split(answer)
+                except ValueError as e:
+                    issues.append(['error', f"answer {answer!r} does not parse: {e}"])
+                    continue
+                # Alternatives may be key presses such as ^D; only the main answer must be a command
+                if answer is fields['command'] and words and not COMMAND_START.match(words[0]):
+                    issues.append(['warning', f"command does not start with a program: {words[0]!r}"])
+        results.append((digest, issues))
+    errors = _bash_syntax_errors([fields.get('example', '') for _, _, fields in chunk])
+    for (digest, issues), error in zip(results, errors):
+        if error:
+            issues.append(['error', f"example rejected by bash -n: {error}"])
+    return results
+
+class CatalogValidator:
+    """Lints every catalog entry, caching results by entry hash."""
+
+    def __init__(self, tutor: BashTutor, cache_path: str = VALIDATE_CACHE_FILE, workers: Optional[int] = None):
+        self.tutor = tutor
+        self.cache_path = cache_path
+        self.workers = workers
+
+    def _load_cache(self) -> Dict[str, list]:
+        try:
+            with open(self.cache_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_cache(self, cache: Dict[str, list]):
+        try:
+            write_json_atomic(self.cache_path, cache)
+        except OSError as e:
+            print(f"Error saving validation cache: {e}")
+
+    def validate(self) -> List[Tuple[str, str, str, str]]:
+        """Return (severity, mode name, question, message) for every issue found."""
+        entries = []
+        for mode, questions in self.tutor.questions.items():
+            for question, entry in questions.items():
+                entries.append((mode, question, entry, entry_hash(mode, question, entry)))
+
+        cache = self._load_cache()
+        pending = {}
+        for mode, question, entry, digest in entries:
+            if digest not in cache:
+                # Understanding answers are words ("list"), not commands
+                pending[digest] = (digest, mode is not Mode.UNDERSTANDING, entry_fields(entry))
+        if pending:
+            items = list(pending.values())
+            chunks = [items[i:i + VALIDATE_CHUNK_SIZE] for i in range(0, len(items), VALIDATE_CHUNK_SIZE)]
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                for results in pool.map(_validate_chunk, chunks):
+                    cache.update(results)
+        self._save_cache({digest: cache[digest] for _, _, _, digest in entries})
+
+        issues = []
+        for mode, question, _, digest in entries:
+            issues.extend((severity, mode.name, question, message) for severity, message in cache[digest])
+        issues.extend(self._duplicates(entries))
+        self.checked = len(pending)
+        return issues
+
+    @staticmethod
+    def _duplicates(entries) -> List[Tuple[str, str, str, str]]:
+        issues = []
+        seen_questions: Dict[str, str] = {}
+        seen_commands: Dict[str, Tuple[str, str]] = {}
+        for mode, question, entry, _ in entries:
+            if question in seen_questions and seen_questions[question] != mode.name:
+                issues.append(('error', mode.name, question,
+                               f"duplicate question, also in {seen_questions[question]}"))
+            seen_questions.setdefault(question, mode.name)
+            command = entry_fields(entry)['command'].strip()
+            other = seen_commands.setdefault(command, (mode.name, question))
+            if other[0] != mode.name:
+                issues.append(('warning', mode.name, question,
+                               f"same answer {command!r} as {other[0]}: {other[1]}"))
+        return issues
+
+OUTPUT_COMMAND_WORD = re.compile(r"(?:^|[|;&(`{]|\$\(|\b(?:then|do|else|elif|xargs|exec)\b)\s*(?:!\s*)?(\$?[\w.\[-][\w.+\[-]*)(=?)",
+                                 re.MULTILINE)
+OUTPUT_FUNCTION = re.compile(r"^\s*(?:function\s+)?([A-Za-z_]\w*)\s*\(\)", re.MULTILINE)
+
+def runnable_example(example: str) -> bool:
+    """Whether an example only uses programs that are safe to run in the output sandbox.
+
+    Examples touching absolute or home paths, using a '..' path component or
+    running other commands through find are never run.
+    """
+    code = '\n'.join(line.split(' #', 1)[0] for line in example.splitlines() if not line.lstrip().startswith('#'))
+    if not code.strip() or OUTPUTS_UNSAFE_PATH.search(code) or OUTPUTS_UNSAFE_FIND.search(code):
+        return False
+    functions = set(OUTPUT_FUNCTION.findall(code))
+    for word, assignment in OUTPUT_COMMAND_WORD.findall(code):
+        if not assignment and word not in OUTPUTS_SAFE_PROGRAMS and word not in functions:
+            return False
+    return True
+
+def normalize_output(text: str, sandbox: Optional[str] = None) -> List[str]:
+    """Lines of an output with volatile parts replaced, for comparing runs with samples.
+
+    Comment lines (annotations in the samples) are dropped; sandbox paths,
+    dates, times, user and host names and numbers of three or more digits
+    (PIDs, sizes, inodes) become placeholders; runs of blanks collapse.
+    """
+    if sandbox:
+        text = text.replace(sandbox, '<DIR>')
+    user = os.environ.get('USER')
+    lines = []
+    for line in text.splitlines():
+        if line.lstrip().startswith('#'):
+            continue
+        line = re.sub(r"\b\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?\b", '<DATE>', line)
+        line = re.sub(r"\b(?:Mon|Tue|Wed|Thu|Fri|Sat|Sun)\b", '<DAY>', line)
+        line = re.sub(r"\b(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\s+\d{1,2}\b", '<DATE>', line)
+        line = re.sub(r"\b\d{1,2}:\d{2}(?::\d{2})?\b", '<TIME>', line)
+        if user:
+            line = re.sub(rf"\b{re.escape(user)}\b", '<USER>', line)
+        line = re.sub(r"\b\d{3,}\b", '<N>', line)
+        line = re.sub(r"[ \t]+", ' ', line).strip()
+        lines.append(line)
+    while lines and not lines[-1]:
+        lines.pop()
+    return lines
+
+def outputs_fixture_hash() -> str:
+    return hashlib.sha256(json.dumps([OUTPUTS_VERSION, OUTPUTS_FIXTURE], sort_keys=True).encode()).hexdigest()
+
+_output_shell: Optional[BashCoprocess] = None # One per worker process
+
+def _run_outputs_chunk(chunk: List[Tuple[str, str]]) -> List[Tuple[str, list]]:
+    """Run (digest, example) pairs in this worker's sandboxed shell, each on a fresh fixture."""
+    global _output_shell
+    results = []
+    for digest, example in chunk:
+        if _output_shell is None or not _output_shell.alive:
+            _output_shell = BashCoprocess()
+        sandbox = _output_shell.sandbox
+        for path, content in OUTPUTS_FIXTURE.items():
+            target = os.path.join(sandbox, path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'w') as f:
+                f.write(content)
+        result = _output_shell.evaluate(example, OUTPUTS_TIMEOUT)
+        if not _output_shell.alive:
+            _output_shell.close()
+        results.append((digest, [result.output.replace(sandbox, '<DIR>'), result.status]))
+    return results
+
+class OutputChecker:
+    """Runs catalog examples in a fixture sandbox and compares them with the sample outputs.
+
+    Runs are cached by a hash of the example and the fixture, so only new or
+    changed examples are run again.
+    """
+
+    def __init__(self, tutor: BashTutor, cache_path: str = OUTPUTS_CACHE_FILE, workers: Optional[int] = None):
+        self.tutor = tutor
+        self.cache_path = cache_path
+        self.workers = workers
+        self.ran = 0
+        self.skipped = 0
+
+    def check(self) -> List[Tuple[str, str, List[str], List[str], Optional[int]]]:
+        """Return (mode name, question, expected lines, actual lines, status) for every runnable example."""
+        fixture = outputs_fixture_hash()
+        entries = []
+        for mode, questions in self.tutor.questions.items():
+            for question, entry in questions.items():
+                example = entry_fields(entry)['example']
+                # Template examples only make sense once their slots are filled in
+                if isinstance(entry, QuestionTemplate) or not runnable_example(example):
+                    self.skipped += 1
+                    continue
+                digest = hashlib.sha256(f"{fixture}\0{example}".encode('utf-8')).hexdigest()
+                entries.append((mode, question, entry, digest))
+
+        try:
+            with open(self.cache_path, 'r') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+        pending = {digest: (digest, entry_fields(entry)['example'])
+                   for _, _, entry, digest in entries if digest not in cache}
+        if pending:
+            items = list(pending.values())
+            chunks = [items[i:i + VALIDATE_CHUNK_SIZE] for i in range(0, len(items), VALIDATE_CHUNK_SIZE)]
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                for results in pool.map(_run_outputs_chunk, chunks):
+                    cache.update(results)
+        self.ran = len(pending)
+        try:
+            write_json_atomic(self.cache_path, {digest: cache[digest] for _, _, _, digest in entries})
+        except OSError as e:
+            print(f"Error saving output cache: {e}")
+
+        return [(mode.name, question, normalize_output(entry_fields(entry)['output']),
+                 normalize_output(cache[digest][0]), cache[digest][1])
+                for mode, question, entry, digest in entries]
+
+def run_outputs(tutor: BashTutor, show_all: bool = False) -> int:
+    """Entry point of the 'outputs' subcommand. Returns the exit status."""
+    checker = OutputChecker(tutor)
+    results = checker.check()
+    differ = 0
+    for mode_name, question, expected, actual, status in results:
+        if expected == actual and not show_all:
+            continue
+        if expected != actual:
+            differ += 1
+        note = "timed out" if status is None else f"exit status {status}"
+        print(f"{PEACH}{mode_name}: {question}{RESET} ({note})")
+        for line in difflib.unified_diff(expected, actual, 'sample output', 'actual output', lineterm=''):
+            color = SAGE if line.startswith('+') else ROSE if line.startswith('-') else ''
+            print(f"    {color}{line}{RESET if color else ''}")
+        if expected == actual:
+            print(f"    {SAGE}matches{RESET}")
+    color = PEACH if differ else SAGE
+    print(f"{color}{len(results)} runnable examples ({checker.ran} run, {len(results) - checker.ran} cached, "
+          f"{checker.skipped} not runnable): {differ} differ from their sample output{RESET}")
+    return 1 if differ else 0
+
+def run_validate(tutor: BashTutor) -> int:
+    """Entry point of the 'validate' subcommand. Returns the exit status."""
+    validator = CatalogValidator(tutor)
+    issues = validator.validate()
+    for severity, mode_name, question, message in issues:
+        color = ROSE if severity == 'error' else PEACH
+        print(f"{color}[{severity}]{RESET} {mode_name}: {question}\n    {message}")
+    errors = sum(1 for issue in issues if issue[0] == 'error')
+    warnings = len(issues) - errors
+    total = sum(len(questions) for questions in tutor.questions.values())
+    color = ROSE if errors else SAGE
+    print(f"{color}{total} entries ({validator.checked} checked, {total - validator.checked} cached): "
+          f"{errors} errors, {warnings} warnings{RESET}")
+    return 1 if errors else 0
+
+HTML_PAGE_START = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body {{ font-family: sans-serif; max-width: 50em; margin: 2em auto; padding: 0 1em; }}
+pre {{ background: #f4f4f4; padding: 0.5em; overflow-x: auto; }}
+dt {{ font-weight: bold; margin-top: 1.5em; }}
+</style>
+</head>
+<body>
+<h1>{title}</h1>
+"""
+HTML_PAGE_END = "</body>\n</html>\n"
+
+def export_slug(mode: AnyMode) -> str:
+    """File name (without extension) used for a mode's exported entries."""
+    return re.sub(r'[^a-z0-9]+', '-', mode.name.lower()).strip('-') or mode.value
+
+def _anki_field(text: str) -> str:
+    # Anki reads the fields as HTML, so newlines become <br> and tabs would split the field
+    return html.escape(text).replace('\t', '    ').replace('\n', '<br>')
+
+class Exporter:
+    """Writes the catalog as flashcards and handouts, one entry at a time.
+
+    Every output file is regenerated only when the digest of the entries it
+    is built from differs from the one recorded in the export manifest.
+    """
+
+    EXTENSIONS = {'anki': '.tsv', 'jsonl': '.jsonl', 'markdown': '.md', 'html': '.html'}
+
+    def __init__(self, tutor: BashTutor, out_dir: str = EXPORT_DIR, formats=EXPORT_FORMATS):
+        self.tutor = tutor
+        self.out_dir = out_dir
+        self.formats = formats
+        self.manifest_path = os.path.join(out_dir, EXPORT_MANIFEST)
+
+    def _modes(self) -> List[AnyMode]:
+        return [mode for mode in self.tutor.modes.values() if self.tutor.questions.get(mode)]
+
+    def _entries(self, mode: AnyMode):
+        for question, entry in self.tutor.questions[mode].items():
+            if isinstance(entry, QuestionTemplate):
+                question, entry = entry.sample(question)
+            yield question, entry_fields(entry)
+
+    def _digest(self, fmt: str, mode: AnyMode) -> str:
+        digest = hashlib.sha256(json.dumps([EXPORT_FORMAT_VERSION, fmt, mode.value, mode.name]).encode('utf-8'))
+        for question, fields in self._entries(mode):
+            digest.update(json.dumps([question, fields], sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _index_digest(self) -> str:
+        modes = [[export_slug(mode), mode_title(mode), len(self.tutor.questions[mode])]
+                 for mode in self._modes()]
+        return hashlib.sha256(json.dumps([EXPORT_FORMAT_VERSION, modes]).encode('utf-8')).hexdigest()
+
+    def _jobs(self):
+        """Yield (relative path, digest function, writer) for every output file."""
+        for fmt in self.formats:
+            for mode in self._modes():
+                path = os.path.join(fmt, export_slug(mode) + self.EXTENSIONS[fmt])
+                writer = getattr(self, f'_write_{fmt}')
+                yield path, (lambda fmt=fmt, mode=mode: self._digest(fmt, mode)), \
+                    (lambda f, writer=writer, mode=mode: writer(f, mode))
+            if fmt == 'html':
+                yield os.path.join('html', 'index.html'), self._index_digest, self._write_html_index
+
+    def export(self) -> Tuple[int, int, int]:
+        """Bring the export directory up to date. Returns (written, unchanged, removed)."""
+        try:
+            with open(self.manifest_path, 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+        written = unchanged = removed = 0
+        outputs = {}
+        for path, digest_of, writer in self._jobs():
+            digest = digest_of()
+            outputs[path] = digest
+            target = os.path.join(self.out_dir, path)
+            if manifest.get(path) == digest and os.path.exists(target):
+                unchanged += 1
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp_path = target + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+                writer(f)
+            os.replace(tmp_path, target)
+            written += 1
+        for path, digest in manifest.items():
+            if path in outputs:
+                continue
+            if path.split(os.sep, 1)[0] not in self.formats:
+                outputs[path] = digest # A format not exported this time
+                continue
+            # Files of modes that no longer exist (e.g. a deleted pack)
+            try:
+                os.remove(os.path.join(self.out_dir, path))
+                removed += 1
+            except FileNotFoundError:
+                pass
+        os.makedirs(self.out_dir, exist_ok=True)
+        write_json_atomic(self.manifest_path, outputs)
+        return written, unchanged, removed
+
+    def _write_anki(self, f, mode: AnyMode):
+        f.write("#separator:tab\n#html:true\n#tags column:3\n")
+        tag = export_slug(mode)
+        for question, fields in self._entries(mode):
+            back = f"<code>{_anki_field(fields['command'])}</code><br><br>{_anki_field(fields['explanation'])}"
+            if fields['example']:
+                back += f"<br><br><pre>{_anki_field(fields['example'])}</pre>"
+            f.write(f"{_anki_field(question)}\t{back}\tbash-tutor {tag}\n")
+
+    def _write_jsonl(self, f, mode: AnyMode):
+        for question, fields in self._entries(mode):
+            f.write(json.dumps({'mode': mode.value, 'question': question, **fields}) + "\n")
+
+    def _write_markdown(self, f, mode: AnyMode):
+        f.write(f"# {mode_title(mode)}\n")
+        for question, fields in self._entries(mode):
+            f.write(f"\n## {question}\n\n`{fields['command']}`\n\n{fields['explanation']}\n")
+            if fields['example']:
+                f.write(f"\n```bash\n{fields['example']}\n```\n")
+            if fields['output']:
+                f.write(f"\nSample output:\n\n```\n{fields['output']}\n```\n")
+
+    def _write_html(self, f, mode: AnyMode):
+        f.write(HTML_PAGE_START.format(title=html.escape(mode_title(mode))))
+        f.write('<p><a href="index.html">All modes</a></p>\n<dl>\n')
+        for question, fields in self._entries(mode):
+            f.write(f"<dt>{html.escape(question)}</dt>\n"
+                    f"<dd><p><code>{html.escape(fields['command'])}</code></p>\n"
+                    f"<p>{html.escape(fields['explanation'])}</p>\n")
+            if fields['example']:
+                f.write(f"<pre>{html.escape(fields['example'])}</pre>\n")
+            if fields['output']:
+                f.write(f"<pre class=\"output\">{html.escape(fields['output'])}</pre>\n")
+            f.write("</dd>\n")
+        f.write("</dl>\n" + HTML_PAGE_END)
+
+    def _write_html_index(self, f):
+        f.write(HTML_PAGE_START.format(title="Bash Tutor"))
+        f.write("<ul>\n")
+        for mode in self._modes():
+            f.write(f'<li><a href="{export_slug(mode)}.html">{html.escape(mode_title(mode))}</a> '
+                    f"({len(self.tutor.questions[mode])} questions)</li>\n")
+        f.write("</ul>\n" + HTML_PAGE_END)
+
+def run_export(tutor: BashTutor, out_dir: str, formats) -> int:
+    """Entry point of the 'export' subcommand. Returns the exit status."""
+    try:
+        written, unchanged, removed = Exporter(tutor, out_dir, formats).export()
+    except OSError as e:
+        print(f"{ROSE}Error exporting to {out_dir}: {e}{RESET}")
+        return 1
+    print(f"{SAGE}Exported to {out_dir}: {written} files written, {unchanged} unchanged, "
+          f"{removed} removed{RESET}")
+    return 0
+
+def run_mock_api(host: str, port: int) -> int:
+    """Entry point of the 'mock-api' subcommand. Returns the exit status."""
+    try:
+        server = MockAPIServer(host, port)
+    except OSError as e:
+        print(f"{ROSE}Cannot listen on {host}:{port}: {e}{RESET}")
+        return 1
+    print(f"{SAGE}Mock API listening on {server.url}{RESET}")
+    print(f"Learners run: python main.py --mock-api {server.url}")
+    print("Or call it directly, e.g. curl " + server.url + "/data")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+def run_classroom(tutor: BashTutor, host: str, port: int) -> int:
+    """Entry point of the 'classroom' subcommand. Returns the exit status."""
+    if tutor.current_mode is None:
+        tutor.current_mode = next(iter(tutor.modes.values()))
+    try:
+        asyncio.run(ClassroomServer(tutor).serve(host, port))
+    except OSError as e:
+        print(f"{ROSE}Cannot listen on {host}:{port}: {e}{RESET}")
+        return 1
+    except KeyboardInterrupt:
+        pass
+    print()
+    return 0
+
+def run_classroom_learner(address: str, name: str) -> int:
+    """Join the classroom at HOST[:PORT] and answer the questions it sends. Returns the exit status."""
+    host, _, port = address.rpartition(':') if ':' in address else (address, '', '')
+    try:
+        connection = socket.create_connection((host or 'localhost', int(port or CLASSROOM_PORT)))
+    except (OSError, ValueError) as e:
+        print(f"{ROSE}Cannot join the classroom at {address}: {e}{RESET}")
+        return 1
+    stream = connection.makefile('rwb')
+    current = {'round': 0}
+
+    def send(message: dict):
+        stream.write((json.dumps(message) + "\n").encode('utf-8'))
+        stream.flush()
+
+    def listen():
+        for line in stream:
+            message = json.loads(line)
+            kind = message.get('type')
+            if kind == 'welcome':
+                print(f"{SAGE}Joined the classroom ({message['learners']} learners). "
+                      f"Wait for the first question...{RESET}")
+            elif kind == 'question':
+                current['round'] = message['round']
+                print(f"\n{YELLOW}Q{message['round']} ({message['mode']}): {message['question']}{RESET}")
+            elif kind == 'result':
+                if message['outcome'] is None:
+                    print(f"{BLUE}That question is closed or already answered.{RESET}")
+                elif message['outcome'] == 'incorrect':
+                    print(f"{ROSE}Incorrect. The answer is revealed when the instructor moves on.{RESET}")
+                else:
+                    print(THEME.render(message['outcome']))
+            elif kind == 'reveal':
+                print(THEME.render('skip', answer=message['answer']))
+                print(f"{message['explanation']}\n{SKY_BLUE}Example:{RESET} {message['example']}")
+            elif kind == 'bye':
+                break
+        print(f"\n{BLUE}The classroom has closed. Press Enter to leave.{RESET}")
+        current['round'] = None
+
+    send({'type': 'hello', 'name': name})
+    threading.Thread(target=listen, daemon=True).start()
+    try:
+        while current['round'] is not None:
+            answer = input().strip()
+            if current['round'] is None or answer == 'exit':
+                break
+            if answer and current['round']:
+                send({'type': 'answer', 'round': current['round'], 'answer': answer})
+    except (KeyboardInterrupt, EOFError, OSError):
+        pass
+    connection.close()
+    print(f"{BLUE}Thanks for learning! Goodbye!{RESET}")
+    return 0
+
+def parse_blueprint(spec: str, modes: Dict[str, AnyMode]) -> Dict[str, int]:
+    """Parse an exam blueprint such as "b=10,i=10,a=5,g=5" into {mode key: question count}."""
+    counts = {}
+    for part in spec.split(','):
+        key, sep, count = part.strip().partition('=')
+        key = key.strip().lower()
+        if not sep or key not in modes:
+            raise ValueError(f"expected mode=count with a known mode, got {part.strip()!r}")
+        try:
+            value = int(count)
+        except ValueError:
+            raise ValueError(f"invalid question count for mode {key!r}: {count.strip()!r}") from None
+        if value < 0:
+            raise ValueError(f"question count for mode {key!r} must not be negative")
+        counts[key] = counts.get(key, 0) + value
+    if not any(counts.values()):
+        raise ValueError("the blueprint needs at least one question")
+    return counts
+
+def exam_key(storage: Storage) -> bytes:
+    """The examiner's secret for issuing papers: $BASH_TUTOR_EXAM_KEY, else a key file made once in the data directory.
+
+    Candidates never hold it: a sitting signs its result with the paper's
+    sitting key, which is derived from it (see exam_sitting_key).
+    """
+    key = os.environ.get(EXAM_KEY_ENV)
+    if key:
+        return key.encode('utf-8')
+    with storage.lock(EXAM_KEY_FILE):
+        key = storage.read_bytes(EXAM_KEY_FILE)
+        if not key:
+            key = secrets.token_hex(32).encode('ascii')
+            fd = os.open(storage.path(EXAM_KEY_FILE), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(key)
+    return key.strip()
+
+def exam_signature(document: dict, key: bytes) -> str:
+    body = json.dumps(document, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hmac.new(key, body, hashlib.sha256).hexdigest()
+
+def exam_sitting_key(key: bytes, paper: dict) -> bytes:
+    """The key a sitting of ``paper`` signs its result with, derived from the examiner's ``key``.
+
+    It is released per paper, so it cannot sign results for any other paper
+    and the examiner's key never leaves the examiner.
+    """
+    return hmac.new(key, b'sitting:' + str(paper['token']).encode('utf-8'), hashlib.sha256).hexdigest().encode('ascii')
+
+def exam_digest(questions: List[Tuple[str, str, Command]]) -> str:
+    """Hash of a paper's prompts and of what grading their answers depends on."""
+    return hashlib.sha256(json.dumps([[mode_key, prompt, answer.digest] for mode_key, prompt, answer in questions])
+                          .encode('utf-8')).hexdigest()
+
+class ExamGenerator:
+    """Draws exam papers from a blueprint by stratified sampling.
+
+    Each mode in the blueprint is a stratum and a paper takes exactly its
+    count of distinct questions from it. A paper is fully determined by its
+    seed and the catalog, so grading regenerates the answers instead of
+    shipping them in the paper; the paper records a digest of its questions
+    and answers so that grading against a changed catalog is refused.
+    """
+
+    def __init__(self, tutor: 'BashTutor', blueprint: Dict[str, int]):
+        self.tutor = tutor
+        self.blueprint = blueprint
+        self.strata = {}
+        for key, count in blueprint.items():
+            mode = tutor.modes[key]
+            keys = tutor.question_keys(mode)
+            if count > len(keys):
+                raise ValueError(f"the blueprint asks for {count} {mode_title(mode)} questions "
+                                 f"but there are only {len(keys)}")
+            self.strata[key] = (mode, keys)
+
+    def questions(self, seed: int) -> List[Tuple[str, str, Command]]:
+        """(mode key, prompt, answer) for each question of the paper with ``seed``."""
+        rng = random.Random(seed)
+        drawn = []
+        for key, count in self.blueprint.items():
+            mode, keys = self.strata[key]
+            for question in rng.sample(keys, count):
+                entry = self.tutor.questions[mode][question]
+                if isinstance(entry, QuestionTemplate):
+                    prompt, answer = entry.instantiate(question, rng)
+                else:
+                    prompt, answer = question, entry
+                drawn.append((key, prompt, answer))
+        return drawn
+
+    def paper(self, paper_id: str, seed: int, minutes: float, key: bytes) -> dict:
+        """A paper issued under the examiner's ``key``; its token proves it was not edited."""
+        questions = self.questions(seed)
+        paper = {'version': EXAM_VERSION, 'paper': paper_id, 'seed': seed, 'blueprint': self.blueprint,
+                 'minutes': minutes, 'digest': exam_digest(questions),
+                 'questions': [{'mode': mode_key, 'question': prompt} for mode_key, prompt, _ in questions]}
+        paper['token'] = exam_signature(paper, key)
+        return paper
+
+def run_exam_generate(tutor: BashTutor, spec: str, count: int, candidates: Optional[str],
+                      minutes: float, out_dir: str, seed: Optional[int]) -> int:
+    """Entry point of 'exam generate': write one paper per candidate. Returns the exit status."""
+    try:
+        generator = ExamGenerator(tutor, parse_blueprint(spec, tutor.modes))
+    except ValueError as e:
+        print(f"{ROSE}Invalid blueprint: {e}{RESET}")
+        return 1
+    if candidates:
+        with open(candidates) as f:
+            paper_ids = [re.sub(r'[^\w.-]+', '_', line.strip()) for line in f if line.strip()]
+    else:
+        paper_ids = [f"{n:04d}" for n in range(1, count + 1)]
+    key = exam_key(tutor.storage)
+    # Paper seeds come from one generator, so the base seed reproduces the whole batch
+    seeds = random.Random(seed if seed is not None else secrets.randbits(64))
+    os.makedirs(out_dir, exist_ok=True)
+    for paper_id in paper_ids:
+        write_json_atomic(os.path.join(out_dir, f"paper-{paper_id}.json"),
+                          generator.paper(paper_id, seeds.getrandbits(64), minutes, key))
+    total = sum(generator.blueprint.values())
+    print(f"{SAGE}Wrote {len(paper_ids)} papers of {total} questions to {out_dir}/{RESET}")
+    return 0
+
+def run_exam_release(tutor: BashTutor, paper_paths: List[str]) -> int:
+    """Entry point of 'exam release': print the sitting key of each paper. Returns the exit status."""
+    key = exam_key(tutor.storage)
+    status = 0
+    for path in paper_paths:
+        try:
+            with open(path) as f:
+                paper = json.load(f)
+            token = str(paper.pop('token', ''))
+            if not hmac.compare_digest(token, exam_signature(paper, key)):
+                raise ValueError("not issued with this exam key or edited")
+            paper['token'] = token
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            print(f"{ROSE}{path}: {e}{RESET}")
+            status = 1
+            continue
+        print(f"{paper['paper']}\t{exam_sitting_key(key, paper).decode('ascii')}")
+    return status
+
+def run_exam_sit(tutor: BashTutor, paper_path: str, candidate: str, out: Optional[str]) -> int:
+    """Entry point of 'exam sit': a timed sitting that writes a signed result file. Returns the exit status.
+
+    The result is signed with the paper's sitting key from $BASH_TUTOR_SITTING_KEY,
+    or derived from the examiner's key when the sitting runs on the examiner's machine.
+    """
+    try:
+        with open(paper_path) as f:
+            paper = json.load(f)
+        if paper.get('version') != EXAM_VERSION:
+            raise ValueError(f"unsupported paper version {paper.get('version')!r}")
+    except (OSError, ValueError) as e:
+        print(f"{ROSE}Cannot read the paper {paper_path}: {e}{RESET}")
+        return 1
+    if os.environ.get(EXAM_SITTING_KEY_ENV):
+        sitting_key = os.environ[EXAM_SITTING_KEY_ENV].strip().encode('utf-8')
+    elif os.environ.get(EXAM_KEY_ENV) or os.path.exists(tutor.storage.path(EXAM_KEY_FILE)):
+        sitting_key = exam_sitting_key(exam_key(tutor.storage), paper)
+    else:
+        print(f"{ROSE}No sitting key: ask the examiner to run 'exam release' for this paper "
+              f"and set ${EXAM_SITTING_KEY_ENV}.{RESET}")
+        return 1
+    questions = paper['questions']
+    allowed = paper['minutes'] * 60
+    print(f"{BLUE}Exam paper {paper['paper']}: {len(questions)} questions, {paper['minutes']:g} minutes.")
+    print(f"Answers are not marked until the exam is graded; type 'skip' to leave a question blank.{RESET}")
+    started = time.time()
+    started_ns = time.perf_counter_ns()
+    answers = []
+    timed_out = False
+    for number, question in enumerate(questions, 1):
+        left = allowed - (time.perf_counter_ns() - started_ns) / 1e9
+        mode = tutor.modes.get(question['mode'])
+        print(f"\n{YELLOW}[{number}/{len(questions)}] {mode_title(mode) if mode else question['mode']} "
+              f"{BLUE}({left / 60:.0f} min left){RESET}")
+        print(f"{YELLOW}{question['question']}{RESET}")
+        asked_ns = time.perf_counter_ns()
+        try:
+            answer = tutor.prompt.read("> ").strip()
+        except (KeyboardInterrupt, EOFError):
+            print()
+            break
+        answered_ns = time.perf_counter_ns()
+        if (answered_ns - started_ns) / 1e9 > allowed:
+            print(f"{ROSE}Time is up; that answer came too late to count.{RESET}")
+            timed_out = True
+            break
+        answers.append({'answer': '' if answer.lower() == 'skip' else answer,
+                        'seconds': round((answered_ns - asked_ns) / 1e9, 3),
+                        'elapsed': round((answered_ns - started_ns) / 1e9, 3)})
+    # The paper goes back unchanged, token included, so grading can check it was issued as is.
+    # The signature covers it together with the answers and timings, so none can be edited later.
+    result = {'version': EXAM_VERSION, 'paper': paper, 'candidate': candidate,
+              'started': time.strftime('%Y-%m-%dT%H:%M:%S%z', time.localtime(started)),
+              'seconds': round((time.perf_counter_ns() - started_ns) / 1e9, 3), 'timed_out': timed_out,
+              'answers': answers}
+    result['signature'] = exam_signature(result, sitting_key)
+    out = out or f"result-{paper['paper']}-{re.sub(r'[^A-Za-z0-9_.-]+', '_', candidate)}.json"
+    write_json_atomic(out, result)
+    print(f"\n{SAGE}Answered {len(answers)} of {len(questions)} questions. Your result is in {out}.{RESET}")
+    return 0
+
+def grade_exam_result(tutor: BashTutor, result: dict, key: bytes,
+                      generators: Dict[str, ExamGenerator]) -> Tuple[int, Counter, int, bool]:
+    """Mark one result; returns (correct answers, correct per mode key, questions, timed out).
+
+    Raises ValueError when the paper was not issued with ``key``, the result
+    was not signed with the paper's sitting key or the paper was issued from
+    a different catalog. The time limit is enforced from the signed timings:
+    answers given after it are not counted. ``generators`` caches one
+    generator per blueprint across results.
+    """
+    if result.get('version') != EXAM_VERSION:
+        raise ValueError(f"unsupported result version {result.get('version')!r}")
+    paper = dict(result['paper'])
+    token = str(paper.pop('token', ''))
+    if not hmac.compare_digest(token, exam_signature(paper, key)):
+        raise ValueError("the paper was not issued with this exam key or was edited")
+    signed = {name: value for name, value in result.items() if name != 'signature'}
+    if not hmac.compare_digest(str(result.get('signature', '')),
+                               exam_signature(signed, exam_sitting_key(key, result['paper']))):
+        raise ValueError("the result was not signed by a sitting of this paper or was edited")
+    blueprint = json.dumps(paper['blueprint'], sort_keys=True)
+    try:
+        if blueprint not in generators:
+            generators[blueprint] = ExamGenerator(tutor, paper['blueprint'])
+        questions = generators[blueprint].questions(paper['seed'])
+    except (ValueError, KeyError) as e:
+        raise ValueError(f"the paper no longer matches the question catalog ({e})") from None
+    if exam_digest(questions) != paper['digest']:
+        raise ValueError("the question catalog changed since the paper was issued")
+    allowed = paper['minutes'] * 60
+    answers = result['answers']
+    timed_out = float(result['seconds']) > allowed or any(float(r['elapsed']) > allowed for r in answers)
+    by_mode = Counter()
+    correct = 0
+    for (mode_key, prompt, answer), response in zip(questions, answers):
+        if float(response['elapsed']) > allowed:
+            break
+        # Candidates often give the same answers, so the shared cache grades each once
+        is_correct, _ = tutor.grading_cache.grade(
+            question_id(tutor.modes[mode_key], prompt), answer, str(response['answer']))
+        correct += is_correct
+        by_mode[mode_key] += is_correct
+    return correct, by_mode, len(questions), timed_out
+
+def run_exam_grade(tutor: BashTutor, paths: List[str], csv_path: Optional[str]) -> int:
+    """Entry point of 'exam grade': verify and mark result files. Returns the exit status."""
+    key = exam_key(tutor.storage)
+    generators: Dict[str, ExamGenerator] = {}
+    mode_keys = list(tutor.modes)
+    writer = None
+    csv_file = open(csv_path, 'w', newline='') if csv_path else None
+    if csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(['file', 'candidate', 'paper', 'status', 'correct', 'questions', 'percent',
+                         'seconds', 'timed_out', *mode_keys])
+    graded, rejected, scores = 0, 0, []
+    try:
+        for path in paths:
+            try:
+                with open(path) as f:
+                    result = json.load(f)
+                correct, by_mode, total, timed_out = grade_exam_result(tutor, result, key, generators)
+            except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+                print(f"{ROSE}{path}: rejected ({e}){RESET}")
+                rejected += 1
+                if writer:
+                    writer.writerow([path, '', '', f"rejected: {e}"])
+                continue
+            paper = result['paper']
+            percent = correct * 100 / total
+            scores.append(percent)
+            graded += 1
+            breakdown = "  ".join(f"{k} {by_mode[k]}/{n}" for k, n in paper['blueprint'].items())
+            flag = f" {PEACH}(timed out){RESET}" if timed_out else ""
+            print(f"{result['candidate']:<20} paper {paper['paper']:<8} {correct:>3}/{total:<3} "
+                  f"{percent:5.1f}%  {breakdown}{flag}")
+            if writer:
+                writer.writerow([path, result['candidate'], paper['paper'], 'graded', correct, total,
+                                 f"{percent:.1f}", result['seconds'], timed_out,
+                                 *(by_mode[k] if k in paper['blueprint'] else '' for k in mode_keys)])
+    finally:
+        if csv_file:
+            csv_file.close()
+    if scores:
+        print(f"\n{BLUE}Graded {graded} results, mean score {sum(scores) / len(scores):.1f}%{RESET}")
+    if rejected:
+        print(f"{ROSE}{rejected} results could not be graded{RESET}")
+    return 1 if rejected else 0
+
+def load_answer_events(path: str):
+    """Read the answer events of an event log into NumPy arrays.
+
+    Returns (learners, questions, learner index, question index, outcome),
+    where the outcome is 1 for a correct answer, 0.5 for a case mismatch
+    and 0 otherwise, as in the skill ratings.
+    """
+    import numpy as np
+    learners: Dict[bytes, int] = {} # Keyed by the JSON-encoded name, decoded once at the end
+    questions: Dict[bytes, int] = {}
+    learner_index, question_index, outcome = array('i'), array('i'), array('d')
+    with open(path, 'rb') as f:
+        for line in f:
+            match = ANSWER_EVENT.match(line)
+            if match:
+                user, question, correct, case_mismatch = match.groups()
+                correct, case_mismatch = correct == b'true', case_mismatch == b'true'
+            elif b'"answer"' in line: # Written some other way; fall back to parsing it
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if event.get('event') != 'answer' or not event.get('question'):
+                    continue
+                user, question = json.dumps(event.get('user')).encode(), json.dumps(event['question']).encode()
+                correct, case_mismatch = bool(event.get('correct')), bool(event.get('case_mismatch'))
+            else:
+                continue
+            learner_index.append(learners.setdefault(user, len(learners)))
+            question_index.append(questions.setdefault(question, len(questions)))
+            outcome.append(1.0 if correct else 0.5 if case_mismatch else 0.0)
+    return ([json.loads(user) or '' for user in learners], [json.loads(question) for question in questions],
+            np.frombuffer(learner_index, dtype=np.int32), np.frombuffer(question_index, dtype=np.int32),
+            np.frombuffer(outcome, dtype=np.float64))
+
+def fit_2pl(learner_index, question_index, outcome, learners: int, questions: int,
+            iterations: int = IRT_ITERATIONS):
+    """Fit a two-parameter logistic item response model to a set of answers.
+
+    P(correct) = 1 / (1 + exp(-a_q * (theta_l - b_q))) for learner ability
+    theta, question difficulty b and discrimination a. Repeated answers of a
+    learner to a question are first pooled into one binomial cell. Each
+    iteration then takes one diagonal Newton step for the abilities, the
+    difficulties and the discriminations in turn, with normal priors
+    (regularised joint maximum likelihood); the ability prior fixes the
+    scale. The fit is rescaled once at the end to abilities of mean 0 and
+    spread 1, which leaves the likelihood unchanged. Every per-learner or
+    per-question sum is an ``np.bincount`` over the cells, so an iteration
+    costs a few vector passes.
+    Returns (theta, difficulty, discrimination, iterations run).
+    """
+    import numpy as np
+    cells, cell_index = np.unique(learner_index.astype(np.int64) * questions + question_index, return_inverse=True)
+    trials = np.bincount(cell_index).astype(np.float64)
+    successes = np.bincount(cell_index, outcome)
+    learner_index, question_index = cells // questions, cells % questions
+    counts = np.bincount(question_index, trials, questions)
+    rate = (np.bincount(question_index, successes, questions) + 0.5) / (counts + 1)
+    theta = np.zeros(learners)
+    difficulty = np.log((1 - rate) / rate) # Logit of each question's error rate
+    discrimination = np.ones(questions)
+    difficulty_prior = 1 / IRT_DIFFICULTY_SD ** 2
+    discrimination_prior = 1 / IRT_DISCRIMINATION_SD ** 2
+
+    def residuals():
+        distance = theta[learner_index] - difficulty[question_index]
+        a = discrimination[question_index]
+        p = 1 / (1 + np.exp(-np.clip(a * distance, -30, 30)))
+        return distance, a, successes - trials * p, trials * p * (1 - p)
+
+    iteration = 0
+    for iteration in range(1, iterations + 1):
+        previous = (theta.copy(), difficulty.copy(), discrimination.copy())
+        _, a, residual, weight = residuals()
+        step = ((np.bincount(learner_index, a * residual, learners) - theta)
+                / (np.bincount(learner_index, a * a * weight, learners) + 1))
+        theta += np.clip(step, -IRT_MAX_STEP, IRT_MAX_STEP)
+
+        _, a, residual, weight = residuals()
+        step = ((-np.bincount(question_index, a * residual, questions) - difficulty * difficulty_prior)
+                / (np.bincount(question_index, a * a * weight, questions) + difficulty_prior))
+        difficulty += np.clip(step, -IRT_MAX_STEP, IRT_MAX_STEP)
+
+        distance, _, residual, weight = residuals()
+        step = ((np.bincount(question_index, distance * residual, questions)
+                 - (discrimination - 1) * discrimination_prior)
+                / (np.bincount(question_index, distance * distance * weight, questions) + discrimination_prior))
+        discrimination += np.clip(step, -IRT_MAX_STEP, IRT_MAX_STEP)
+        if max(np.abs(new - old).max() for new, old in zip((theta, difficulty, discrimination), previous)) < IRT_TOLERANCE:
+            break
+
+    center, spread = theta.mean(), theta.std() or 1.0
+    return (theta - center) / spread, (difficulty - center) / spread, discrimination * spread, iteration
+
+def run_analytics(tutor: BashTutor, top: int) -> int:
+    """Entry point of the 'analytics' subcommand. Returns the exit status."""
+    try:
+        import numpy as np
+    except ImportError:
+        print(f"{ROSE}The analytics command needs NumPy: pip install numpy{RESET}")
+        return 1
+    path = tutor.storage.path(EVENTS_FILE)
+    if not os.path.exists(path):
+        print(f"{ROSE}No event log at {path}; answer some questions first.{RESET}")
+        return 1
+    started = time.perf_counter()
+    learners, questions, learner_index, question_index, outcome = load_answer_events(path)
+    loaded = time.perf_counter()
+    if not len(outcome):
+        print(f"{ROSE}No answers in {path} yet.{RESET}")
+        return 1
+    theta, difficulty, discrimination, iterations = fit_2pl(learner_index, question_index, outcome,
+                                                            len(learners), len(questions))
+    fitted = time.perf_counter()
+    counts = np.bincount(question_index, minlength=len(questions))
+    rate = np.bincount(question_index, outcome, len(questions)) / np.maximum(counts, 1)
+    print(f"{BLUE}Fitted a 2PL model to {len(outcome):,} answers from {len(learners):,} learners on "
+          f"{len(questions):,} questions ({iterations} iterations, {loaded - started:.2f}s loading, "
+          f"{fitted - loaded:.2f}s fitting){RESET}")
+
+    calibration = {qid: {'difficulty': round(float(difficulty[i]), 3),
+                         'discrimination': round(float(discrimination[i]), 3),
+                         'answers': int(counts[i]), 'correct': round(float(rate[i]), 3)}
+                   for i, qid in enumerate(questions)}
+    tutor.storage.write_json(CALIBRATION_FILE, calibration)
+
+    catalog = {question_id(mode, question) for mode, entries in tutor.questions.items() for question in entries}
+    reported = [i for i, qid in enumerate(questions) if counts[i] >= IRT_MIN_ANSWERS and qid in catalog]
+    if not reported:
+        print(f"No question in the catalog has {IRT_MIN_ANSWERS} answers yet.")
+    else:
+        by_difficulty = sorted(reported, key=lambda i: difficulty[i])
+
+        def show(title: str, indices, color: str):
+            print(f"\n{color}{title}{RESET}")
+            for i in indices:
+                print(f"  {difficulty[i]:+6.2f}  a={discrimination[i]:5.2f}  {rate[i] * 100:3.0f}% of "
+                      f"{counts[i]:<6} {questions[i]}")
+
+        show("Hardest questions (difficulty in logits):", by_difficulty[::-1][:top], ROSE)
+        show("Easiest questions:", by_difficulty[:top], SAGE)
+        broken = [i for i in reported if discrimination[i] < IRT_MIN_DISCRIMINATION]
+        if broken:
+            show("Possibly broken: strong learners do no better than weak ones on these:",
+                 sorted(broken, key=lambda i: discrimination[i]), PEACH)
+    print(f"\n{BLUE}Calibrated difficulties written to {tutor.storage.path(CALIBRATION_FILE)}; "
+          f"adaptive mode uses them for questions without a rating yet.{RESET}")
+    return 0
+
+def run_explain(tutor: BashTutor, command_line: str, rebuild: bool = False) -> int:
+    """Entry point of the 'explain' subcommand. Returns the exit status."""
+    if rebuild:
+        index = ManIndex(tutor.storage.path(MAN_INDEX_FILE), lambda: tutor.questions)
+        print(f"{SAGE}Indexed {index.update(force=True)} changed man pages{RESET}")
+        index.close()
+    if command_line.strip():
+        tutor.print_command_explanation(command_line)
+    return 0
+
 def main():
-    tutor = BashTutor()
-    tutor.run()
+    parser = argparse.ArgumentParser(description="Interactive tutor for learning bash commands.")
+    parser.add_argument('--packs', default=PACK_DIR, metavar='DIR',
+                        help="directory to load question packs from")
+    parser.add_argument('--watch', action='store_true',
+                        help="reload question packs while running when they change")
+    parser.add_argument('--mix', metavar='SPEC',
+                        help="mix modes with weights, e.g. g=50,s=30,a=20")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="pick questions that match your skill rating")
+    parser.add_argument('--review', action='store_true',
+                        help="go over the questions you missed or skipped")
+    parser.add_argument('--user', help="learner name for ratings and the leaderboard (default: $USER)")
+    parser.add_argument('--data', default=DATA_DIR, metavar='DIR',
+                        help="directory for shared data such as ratings and the leaderboard")
+    parser.add_argument('--theme', choices=list(THEMES),
+                        help="colour theme (default: $BASH_TUTOR_THEME or default); "
+                             "colours are off when NO_COLOR is set or output is not a terminal")
+    parser.add_argument('--tui', action='store_true',
+                        help="use the full-screen interface")
+    parser.add_argument('--resume', action='store_true',
+                        help="continue your last session if it was interrupted")
+    parser.add_argument('--seed', type=int, metavar='N',
+                        help="seed the question order, so the same seed asks the same questions")
+    parser.add_argument('--live', action='store_true',
+                        help="run Variables and Scripting examples (and variable answers) in a throwaway "
+                             "bash with time and size limits")
+    parser.add_argument('--mock-api', nargs='?', const='', metavar='URL',
+                        help="run API answers with curl against a mock API: a local one, or the "
+                             "classroom server at URL (see the mock-api subcommand)")
+    parser.add_argument('--join', metavar='HOST[:PORT]',
+                        help="answer the questions of an instructor's classroom (see the classroom subcommand)")
+    parser.add_argument('--grading-cache', action='store_true',
+                        help="keep graded answers in the data directory between sessions")
+    parser.add_argument('--profile', action='store_true',
+                        help="time each phase of the session and print a latency histogram at exit")
+    parser.add_argument('--profile-dump', metavar='FILE',
+                        help="with --profile, also write cProfile stats to FILE")
+    parser.add_argument('--profile-memory', type=int, nargs='?', const=PROFILE_MEMORY_TOP, default=0,
+                        metavar='N', help="with --profile, also list the top N allocation sites")
+    parser.add_argument('--drill', metavar='COUNT|DURATION',
+                        help="start a timed drill of COUNT questions or a DURATION such as 90s")
+    subcommands = parser.add_subparsers(dest='subcommand')
+    subcommands.add_parser('validate', help="lint the question catalog and exit")
+    outputs_parser = subcommands.add_parser('outputs', help="run the examples and compare them with their sample output")
+    outputs_parser.add_argument('--all', action='store_true', dest='show_all',
+                                help="also list the examples whose output matches")
+    mock_parser = subcommands.add_parser('mock-api', help="serve the mock API for a classroom")
+    mock_parser.add_argument('--host', default=MOCK_API_HOST, help=f"address to listen on (default: {MOCK_API_HOST})")
+    mock_parser.add_argument('--port', type=int, default=MOCK_API_PORT,
+                             help=f"port to listen on (default: {MOCK_API_PORT})")
+    classroom_parser = subcommands.add_parser('classroom', help="ask every learner in a classroom the same questions")
+    classroom_parser.add_argument('--host', default=CLASSROOM_HOST,
+                                  help=f"address to listen on (default: {CLASSROOM_HOST})")
+    classroom_parser.add_argument('--port', type=int, default=CLASSROOM_PORT,
+                                  help=f"port to listen on (default: {CLASSROOM_PORT})")
+    explain_parser = subcommands.add_parser('explain', help="explain the programs and flags of a command line")
+    explain_parser.add_argument('--rebuild', action='store_true',
+                                help="rescan every man page instead of only changed directories")
+    explain_parser.add_argument('command_line', nargs=argparse.REMAINDER, metavar='COMMAND',
+                                help="command line to explain, e.g. tar -xzvf archive.tgz")
+    analytics_parser = subcommands.add_parser('analytics',
+                                              help="calibrate question difficulty from the event log (needs NumPy)")
+    analytics_parser.add_argument('--top', type=int, default=ANALYTICS_TOP, metavar='N',
+                                  help=f"hardest and easiest questions to list (default: {ANALYTICS_TOP})")
+    exam_parser = subcommands.add_parser('exam', help="generate, sit and grade exam papers")
+    exam_actions = exam_parser.add_subparsers(dest='exam_action', required=True)
+    generate_parser = exam_actions.add_parser('generate', help="write exam papers from a blueprint")
+    generate_parser.add_argument('--blueprint', required=True, metavar='SPEC',
+                                 help="questions per mode, e.g. b=10,i=10,a=5,g=5")
+    generate_parser.add_argument('--count', type=int, default=1, help="number of papers (default: 1)")
+    generate_parser.add_argument('--candidates', metavar='FILE',
+                                 help="one paper per line of FILE, named after it (overrides --count)")
+    generate_parser.add_argument('--minutes', type=float, default=EXAM_MINUTES,
+                                 help=f"time allowed for a sitting (default: {EXAM_MINUTES})")
+    generate_parser.add_argument('--out', default=EXAM_DIR, metavar='DIR',
+                                 help=f"output directory (default: {EXAM_DIR})")
+    sit_parser = exam_actions.add_parser('sit', help="sit an exam paper and write a result file")
+    sit_parser.add_argument('paper', help="paper file written by 'exam generate'")
+    sit_parser.add_argument('--out', metavar='FILE', help="result file (default: result-PAPER-USER.json)")
+    release_parser = exam_actions.add_parser('release', help="print the sitting key of each paper")
+    release_parser.add_argument('papers', nargs='+', metavar='PAPER', help="paper files written by 'exam generate'")
+    grade_parser = exam_actions.add_parser('grade', help="verify and mark result files")
+    grade_parser.add_argument('results', nargs='+', metavar='RESULT', help="result files written by 'exam sit'")
+    grade_parser.add_argument('--csv', metavar='FILE', help="also write the marks to FILE as CSV")
+    export_parser = subcommands.add_parser('export', help="write the question catalog as flashcards and handouts")
+    export_parser.add_argument('--out', default=EXPORT_DIR, metavar='DIR',
+                               help=f"output directory (default: {EXPORT_DIR})")
+    export_parser.add_argument('--format', dest='formats', action='append', choices=EXPORT_FORMATS,
+                               help="format to write, may be repeated (default: all)")
+    args = parser.parse_args()
+    if args.theme:
+        set_theme(args.theme)
+    if args.subcommand == 'validate':
+        sys.exit(run_validate(BashTutor(args.packs)))
+    if args.subcommand == 'mock-api':
+        sys.exit(run_mock_api(args.host, args.port))
+    if args.subcommand == 'outputs':
+        sys.exit(run_outputs(BashTutor(args.packs), args.show_all))
+    if args.subcommand == 'explain':
+        sys.exit(run_explain(BashTutor(args.packs, storage=Storage(args.data)),
+                             shlex.join(args.command_line) if len(args.command_line) > 1
+                             else ''.join(args.command_line), args.rebuild))
+    if args.subcommand == 'export':
+        sys.exit(run_export(BashTutor(args.packs), args.out, tuple(args.formats or EXPORT_FORMATS)))
+    if args.join:
+        sys.exit(run_classroom_learner(args.join, args.user or os.environ.get('USER') or 'learner'))
+    if args.seed is not None and not 0 <= args.seed < 2 ** 64:
+        parser.error("--seed: must be between 0 and 2**64 - 1")
+    if args.subcommand == 'analytics':
+        sys.exit(run_analytics(BashTutor(args.packs, storage=Storage(args.data)), args.top))
+    if args.subcommand == 'exam':
+        tutor = BashTutor(args.packs, user=args.user, storage=Storage(args.data))
+        if args.exam_action == 'generate':
+            sys.exit(run_exam_generate(tutor, args.blueprint, args.count, args.candidates, args.minutes,
+                                       args.out, args.seed))
+        if args.exam_action == 'sit':
+            sys.exit(run_exam_sit(tutor, args.paper, tutor.user, args.out))
+        if args.exam_action == 'release':
+            sys.exit(run_exam_release(tutor, args.papers))
+        sys.exit(run_exam_grade(tutor, args.results, args.csv))
+    if args.subcommand == 'classroom':
+        tutor = BashTutor(args.packs, storage=Storage(args.data), seed=args.seed)
+        try:
+            tutor.set_mode_mix(args.mix)
+        except ValueError as e:
+            parser.error(f"--mix: {e}")
+        sys.exit(run_classroom(tutor, args.host, args.port))
+    tutor = BashTutor(args.packs, watch=args.watch, user=args.user, storage=Storage(args.data),
+                      seed=args.seed)
+    tutor.adaptive = args.adaptive
+    tutor.reviewing = args.review
+    if args.live:
+        tutor.live = BashPool()
+    if args.mock_api is not None:
+        tutor.mock_api_url = args.mock_api.rstrip('/') or MockAPIServer(port=0).start().url
+        print(f"{SKY_BLUE}API answers run against the mock API at {tutor.mock_api_url}{RESET}")
+    if args.grading_cache:
+        tutor.grading_cache = GradingCache(storage=tutor.storage)
+        atexit.register(tutor.grading_cache.save)
+    if args.resume and not tutor.resume():
+        print(f"{BLUE}No interrupted session to resume for {tutor.user}.{RESET}")
+    if args.drill:
+        try:
+            tutor.drill = Drill.parse(args.drill)
+        except ValueError as e:
+            parser.error(f"--drill: {e}")
+    if args.mix:
+        # Without --mix a resumed session keeps the mix it was checkpointed with
+        try:
+            tutor.set_mode_mix(args.mix)
+        except ValueError as e:
+            parser.error(f"--mix: {e}")
+    frontend = TutorTUI(tutor) if args.tui else tutor
+    if args.profile:
+        profiler = PhaseProfiler(args.profile_dump, args.profile_memory)
+        profiler.instrument(tutor, PROFILE_TUTOR_PHASES)
+        if args.tui:
+            profiler.instrument(frontend, (('paint', 'render'),))
+        else:
+            profiler.instrument(tutor.prompt, (('read', 'input'),))
+        profiler.start()
+    frontend.run()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('NO_COLOR', '1')
+
+import main  # noqa: E402
+
+@pytest.fixture
+def make_tutor(tmp_path, monkeypatch):
+    """Build tutors whose packs, data and caches all live in a temporary directory."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'packs').mkdir(exist_ok=True)
+
+    def make(**kwargs):
+        kwargs.setdefault('pack_dir', str(tmp_path / 'packs'))
+        kwargs.setdefault('storage', main.Storage(str(tmp_path / 'data')))
+        kwargs.setdefault('user', 'tester')
+        kwargs.setdefault('seed', 1)
+        return main.BashTutor(**kwargs)
+    return make
@@ -0,0 +1,49 @@
+import random
+
+import main
+
+def test_expected_success_is_symmetric_around_equal_ratings():
+    assert main.expected_success(1000, 1000) == 0.5
+    assert main.expected_success(1400, 1000) > 0.9
+    assert abs(main.expected_success(1200, 1000) + main.expected_success(1000, 1200) - 1) < 1e-12
+
+def test_difficulty_index_moves_questions_between_buckets():
+    index = main.DifficultyIndex(width=100)
+    for i, rating in enumerate([950, 1010, 1090, 1500]):
+        index.update(f"q{i}", rating)
+    assert len(index) == 4
+    assert index.nearest(1050, rng=random.Random(1)) in {'q1', 'q2'}
+    index.update('q1', 1510)
+    index.update('q2', 1520)
+    assert index.nearest(1050, rng=random.Random(1)) == 'q0'
+    index.remove('q0')
+    assert index.nearest(1050, rng=random.Random(1)) in {'q1', 'q2', 'q3'}
+    assert index.nearest(1500, lambda qid: True) is None
+
+def test_correct_answers_raise_the_learner_and_lower_the_question(tmp_path):
+    skill = main.SkillModel(main.Storage(str(tmp_path)))
+    before = skill.question_rating(main.Mode.GIT, 'Q?')
+    skill.update('ann', main.Mode.GIT, 'Q?', 1.0)
+    assert skill.learner_rating('ann') > main.INITIAL_LEARNER_RATING
+    assert skill.question_rating(main.Mode.GIT, 'Q?') < before
+
+def test_ratings_are_written_in_batches_and_at_exit(make_tutor, tmp_path):
+    tutor = make_tutor()
+    path = tmp_path / 'data' / main.RATINGS_FILE
+    tutor.current_mode = main.Mode.GIT
+    tutor.get_random_question()
+    for _ in range(main.RATINGS_SAVE_EVERY - 1):
+        tutor.record_result(True, False)
+    assert not path.exists()
+    tutor.record_result(True, False)
+    assert path.exists() and tutor.skill.unsaved == 0
+    tutor.record_result(False, False)
+    tutor.save_progress()
+    assert main.SkillModel(tutor.storage).learners == tutor.skill.learners
+
+def test_adaptive_questions_come_from_near_the_target(make_tutor):
+    tutor = make_tutor()
+    tutor.adaptive = True
+    prompt, answer = tutor.get_random_question()
+    assert prompt and answer.command
+    assert tutor.current_question in tutor.questions[tutor.current_mode]
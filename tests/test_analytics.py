@@ -0,0 +1,81 @@
+import json
+import math
+import random
+
+import pytest
+
+import main
+
+np = pytest.importorskip('numpy')
+
+def record_answers(tutor, answers):
+    for user, question, correct, case_mismatch in answers:
+        tutor.events.record('answer', user=user, seed=None, question=question,
+                            correct=correct, case_mismatch=case_mismatch)
+
+def test_logged_answers_take_the_fast_path(make_tutor):
+    tutor = make_tutor()
+    record_answers(tutor, [('ada', 'b:q1', True, False), ('bob "b"', 'b:q1', False, True),
+                           ('ada', 'g:q2', False, False)])
+    tutor.events.record('session', user='ada')
+    with open(tutor.storage.path(main.EVENTS_FILE), 'rb') as f:
+        lines = f.read().splitlines()
+    assert all(main.ANSWER_EVENT.match(line) for line in lines[:3])
+    learners, questions, learner_index, question_index, outcome = \
+        main.load_answer_events(tutor.storage.path(main.EVENTS_FILE))
+    assert learners == ['ada', 'bob "b"']
+    assert questions == ['b:q1', 'g:q2']
+    assert learner_index.tolist() == [0, 1, 0]
+    assert question_index.tolist() == [0, 0, 1]
+    assert outcome.tolist() == [1.0, 0.5, 0.0]
+
+def test_other_answer_lines_fall_back_to_json(tmp_path):
+    path = tmp_path / 'events.jsonl'
+    path.write_text("\n".join([
+        json.dumps({'question': 'b:q1', 'event': 'answer', 'user': None, 'correct': True}),
+        json.dumps({'event': 'answer', 'user': 'ada'}), # No question
+        '{"event": "answer", broken',
+        json.dumps({'event': 'note', 'text': 'answer'}),
+    ]) + "\n")
+    learners, questions, _, _, outcome = main.load_answer_events(str(path))
+    assert (learners, questions, outcome.tolist()) == ([''], ['b:q1'], [1.0])
+
+DIFFICULTIES = (-2.0, -1.0, 0.0, 1.0, 2.0)
+
+def synthetic_answers(learners=300, seed=5):
+    rng = random.Random(seed)
+    for learner in range(learners):
+        theta = rng.gauss(0, 1)
+        for question, difficulty in enumerate(DIFFICULTIES):
+            correct = rng.random() < 1 / (1 + math.exp(-1.5 * (theta - difficulty)))
+            yield f'learner{learner}', f'b:q{question}', correct, False
+
+def test_fit_recovers_the_difficulty_order():
+    answers = list(synthetic_answers())
+    learners = sorted({user for user, _, _, _ in answers})
+    learner_index = np.array([learners.index(user) for user, _, _, _ in answers], dtype=np.int32)
+    question_index = np.array([int(question[3:]) for _, question, _, _ in answers], dtype=np.int32)
+    outcome = np.array([float(correct) for _, _, correct, _ in answers])
+    theta, difficulty, discrimination, iterations = main.fit_2pl(
+        learner_index, question_index, outcome, len(learners), len(DIFFICULTIES))
+    assert iterations < main.IRT_ITERATIONS
+    assert list(np.argsort(difficulty)) == list(range(len(DIFFICULTIES)))
+    assert abs(theta.mean()) < 1e-6 and abs(theta.std() - 1) < 1e-6
+    assert (discrimination > main.IRT_MIN_DISCRIMINATION).all()
+
+def test_analytics_writes_the_calibration(make_tutor, capsys):
+    tutor = make_tutor()
+    record_answers(tutor, synthetic_answers())
+    assert main.run_analytics(tutor, 3) == 0
+    calibration = tutor.storage.read_json(main.CALIBRATION_FILE)
+    assert set(calibration) == {f'b:q{question}' for question in range(len(DIFFICULTIES))}
+    assert all(entry['answers'] == 300 for entry in calibration.values())
+    assert calibration['b:q0']['difficulty'] < calibration['b:q4']['difficulty']
+    assert calibration['b:q0']['correct'] > calibration['b:q4']['correct']
+
+def test_analytics_without_answers(make_tutor, capsys):
+    tutor = make_tutor()
+    assert main.run_analytics(tutor, 3) == 1
+    tutor.events.record('session', user='ada')
+    assert main.run_analytics(tutor, 3) == 1
+    assert 'No answers' in capsys.readouterr().out
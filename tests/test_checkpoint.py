@@ -0,0 +1,59 @@
+import random
+import struct
+
+import pytest
+
+import main
+
+def snapshot(**kwargs):
+    rng = random.Random(7)
+    fields = dict(user='ada', score=12, mode='g', question='How do you undo the last commit?',
+                  history=['q1', 'q2'], adaptive=True, mix={'g': 2.0, 'a': 1.0},
+                  mode_scores={'g': 10, 'a': 2}, saved_at=1700000000.5, seed=7,
+                  rng_state=rng.getstate(), reviewing=True)
+    fields.update(kwargs)
+    return main.SessionSnapshot(**fields)
+
+def test_checkpoint_round_trip():
+    original = snapshot()
+    decoded = main.SessionSnapshot.decode(original.encode())
+    assert decoded == original
+    restored = random.Random()
+    restored.setstate(decoded.rng_state)
+    expected = random.Random(7)
+    assert [restored.random() for _ in range(3)] == [expected.random() for _ in range(3)]
+
+def test_checkpoint_without_seed_round_trips():
+    original = snapshot(seed=None, rng_state=None, reviewing=False, mode=None, question=None)
+    assert main.SessionSnapshot.decode(original.encode()) == original
+
+def test_version_2_checkpoints_still_load():
+    data = bytearray(snapshot().encode()[:-1])
+    struct.pack_into('<H', data, 4, 2)
+    decoded = main.SessionSnapshot.decode(bytes(data))
+    assert decoded.reviewing is False
+    assert decoded.mix == {'g': 2.0, 'a': 1.0}
+
+@pytest.mark.parametrize('mangle', [lambda d: b'XXXX' + d[4:], lambda d: d[:40]])
+def test_bad_checkpoints_are_rejected(mangle):
+    with pytest.raises(ValueError):
+        main.SessionSnapshot.decode(mangle(snapshot().encode()))
+
+def test_newer_checkpoints_are_rejected():
+    data = bytearray(snapshot().encode())
+    struct.pack_into('<H', data, 4, main.CHECKPOINT_VERSION + 1)
+    with pytest.raises(ValueError, match='newer'):
+        main.SessionSnapshot.decode(bytes(data))
+
+def test_resume_restores_mix_and_review_mode(make_tutor):
+    first = make_tutor()
+    first.storage.write_bytes(first.checkpoint_name, snapshot(user='tester', mode='a').encode())
+    tutor = make_tutor()
+    assert tutor.resume()
+    assert tutor.reviewing and tutor.adaptive
+    assert tutor.mode_weights == {'g': 2.0, 'a': 1.0}
+    assert tutor.mode_mix is not None
+    assert tutor.score == 12 and tutor.current_mode == main.Mode.ADVANCED
+
+def test_resume_without_checkpoint(make_tutor):
+    assert not make_tutor().resume()
@@ -0,0 +1,82 @@
+import asyncio
+import json
+
+import main
+
+async def receive(reader, kind):
+    while True:
+        message = json.loads(await asyncio.wait_for(reader.readline(), 5))
+        if message['type'] == kind:
+            return message
+
+async def connect(port, name):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write((json.dumps({'type': 'hello', 'name': name}) + "\n").encode())
+    await receive(reader, 'welcome')
+    return reader, writer
+
+def run_classroom(tutor, scenario):
+    async def main_():
+        classroom = main.ClassroomServer(tutor)
+        server = await asyncio.start_server(classroom.handle_learner, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return await scenario(classroom, port)
+        finally:
+            server.close()
+            await server.wait_closed()
+    return asyncio.run(main_())
+
+def test_answers_are_graded_and_tallied(make_tutor, capsys):
+    tutor = make_tutor()
+    tutor.current_mode = main.Mode.GIT
+
+    async def scenario(classroom, port):
+        learners = [await connect(port, name) for name in ('ada', 'bob', 'cy')]
+        classroom.ask()
+        questions = [await receive(reader, 'question') for reader, _ in learners]
+        assert {q['round'] for q in questions} == {1}
+        answer = tutor.current_answer.command
+        for (reader, writer), text in zip(learners, (answer, answer.upper(), 'ls')):
+            writer.write((json.dumps({'type': 'answer', 'round': 1, 'answer': text}) + "\n").encode())
+        outcomes = [(await receive(reader, 'result'))['outcome'] for reader, _ in learners]
+        reader, writer = learners[0]
+        writer.write((json.dumps({'type': 'answer', 'round': 1, 'answer': answer}) + "\n").encode())
+        again = (await receive(reader, 'result'))['outcome']
+        for _, writer in learners:
+            writer.close()
+        return outcomes, again, dict(classroom.tally)
+
+    outcomes, again, tally = run_classroom(tutor, scenario)
+    assert outcomes == ['correct', 'case_mismatch', 'incorrect']
+    assert again is None # One answer per learner and round
+    assert tally == {'correct': 1, 'case_mismatch': 1, 'incorrect': 1}
+
+def test_late_joiners_get_the_current_question(make_tutor, capsys):
+    tutor = make_tutor()
+    tutor.current_mode = main.Mode.BEGINNER
+
+    async def scenario(classroom, port):
+        classroom.ask()
+        reader, writer = await connect(port, 'late')
+        question = await receive(reader, 'question')
+        writer.close()
+        return question
+
+    assert run_classroom(tutor, scenario)['question'] == tutor.current_prompt
+
+def test_disconnected_learners_are_forgotten(make_tutor, capsys):
+    tutor = make_tutor()
+
+    async def scenario(classroom, port):
+        reader, writer = await connect(port, 'gone')
+        assert len(classroom.learners) == 1
+        writer.close()
+        await writer.wait_closed()
+        for _ in range(50):
+            if not classroom.learners:
+                break
+            await asyncio.sleep(0.02)
+        return len(classroom.learners)
+
+    assert run_classroom(tutor, scenario) == 0
@@ -0,0 +1,59 @@
+import json
+import random
+
+import pytest
+
+import main
+
+@pytest.mark.parametrize('p', [0.5, 0.9])
+def test_p2_quantile_tracks_the_true_quantile(p):
+    rng = random.Random(7)
+    values = [rng.expovariate(1 / 5) for _ in range(20000)]
+    sketch = main.P2Quantile(p)
+    for value in values:
+        sketch.add(value)
+    exact = sorted(values)[int(p * len(values))]
+    assert abs(sketch.value() - exact) / exact < 0.05
+
+def test_p2_quantile_state_round_trips_through_json():
+    sketch = main.P2Quantile(0.5)
+    for value in range(1, 50):
+        sketch.add(value)
+    restored = main.P2Quantile(0.5, json.loads(json.dumps(sketch.state())))
+    restored.add(50)
+    sketch.add(50)
+    assert restored.value() == sketch.value()
+
+def test_small_samples_use_the_observations():
+    sketch = main.P2Quantile(0.5)
+    for value in (3, 1, 2):
+        sketch.add(value)
+    assert sketch.value() == 2
+
+@pytest.mark.parametrize('spec, questions, seconds', [('20', 20, None), ('90s', None, 90), ('2m', None, 120)])
+def test_drill_parse(spec, questions, seconds):
+    drill = main.Drill.parse(spec)
+    assert (drill.questions, drill.seconds) == (questions, seconds)
+
+@pytest.mark.parametrize('spec', ['0', '-3s', 'soon'])
+def test_drill_parse_rejects_bad_specs(spec):
+    with pytest.raises(ValueError):
+        main.Drill.parse(spec)
+
+def test_drill_bonus_and_end():
+    drill = main.Drill(questions=2)
+    assert drill.record(1.0, True) == main.DRILL_FAST_BONUS
+    assert drill.record(1.0, False) == 0
+    assert drill.finished() and drill.correct == 1
+
+def test_answer_times_are_saved_at_exit(make_tutor, tmp_path):
+    tutor = make_tutor()
+    tutor.current_mode = main.Mode.GIT
+    tutor.get_random_question()
+    tutor.drill = main.Drill(questions=5)
+    tutor.record_drill_answer(True)
+    assert not (tmp_path / 'data' / main.LATENCY_FILE).exists()
+    tutor.save_progress()
+    saved = main.LatencyTracker(tutor.storage)
+    qid = main.question_id(tutor.current_mode, tutor.current_question)
+    assert saved.percentiles('tester', qid)[0] is not None
@@ -0,0 +1,155 @@
+import csv
+import json
+import types
+
+import pytest
+
+import main
+
+@pytest.fixture(autouse=True)
+def exam_key(monkeypatch):
+    monkeypatch.setenv(main.EXAM_KEY_ENV, 'examiner-secret')
+
+@pytest.mark.parametrize('spec', ['b', 'x=1', 'b=one', 'b=-1', 'b=0'])
+def test_bad_blueprints(spec):
+    with pytest.raises(ValueError):
+        main.parse_blueprint(spec, {'b': main.Mode.BEGINNER})
+
+def test_blueprint_counts_merge():
+    assert main.parse_blueprint('b=2, B=1,g=0', {'b': main.Mode.BEGINNER, 'g': main.Mode.GIT}) == {'b': 3, 'g': 0}
+
+def test_papers_are_stratified_and_reproducible(make_tutor):
+    generator = main.ExamGenerator(make_tutor(), {'b': 3, 'g': 2})
+    questions = generator.questions(11)
+    assert [key for key, _, _ in questions] == ['b', 'b', 'b', 'g', 'g']
+    assert len({prompt for _, prompt, _ in questions}) == 5
+    assert generator.questions(11) == questions
+    paper = generator.paper('0001', 11, 30, b'key')
+    assert all(set(question) == {'mode', 'question'} for question in paper['questions'])
+    assert paper['token'] == main.exam_signature({k: v for k, v in paper.items() if k != 'token'}, b'key')
+
+def test_oversized_blueprints_are_refused(make_tutor):
+    with pytest.raises(ValueError):
+        main.ExamGenerator(make_tutor(), {'b': 10000})
+
+def sit(tutor, tmp_path, paper_path, answers, monkeypatch):
+    paper = json.loads(paper_path.read_text())
+    monkeypatch.setenv(main.EXAM_SITTING_KEY_ENV, main.exam_sitting_key(b'examiner-secret', paper).decode())
+    replies = iter(answers)
+    monkeypatch.setattr(main.BashTutor, 'prompt', types.SimpleNamespace(read=lambda prompt: next(replies)))
+    out = tmp_path / f'result-{len(list(tmp_path.iterdir()))}.json'
+    assert main.run_exam_sit(tutor, str(paper_path), 'ada', str(out)) == 0
+    return out
+
+def issue(tutor, tmp_path, blueprint='b=2,g=2'):
+    out = tmp_path / 'papers'
+    assert main.run_exam_generate(tutor, blueprint, 1, None, 30, str(out), 5) == 0
+    return out / 'paper-0001.json'
+
+def answers_for(tutor, paper_path):
+    paper = json.loads(paper_path.read_text())
+    return [answer.command for _, _, answer in
+            main.ExamGenerator(tutor, paper['blueprint']).questions(paper['seed'])]
+
+def test_sit_and_grade(make_tutor, tmp_path, monkeypatch, capsys):
+    tutor = make_tutor()
+    paper_path = issue(tutor, tmp_path)
+    answers = answers_for(tutor, paper_path)
+    result_path = sit(tutor, tmp_path, paper_path, answers[:3] + ['skip'], monkeypatch)
+    result = json.loads(result_path.read_text())
+    assert result['paper'] == json.loads(paper_path.read_text())
+    assert result['answers'][3]['answer'] == ''
+    correct, by_mode, total, timed_out = main.grade_exam_result(tutor, result, b'examiner-secret', {})
+    assert (correct, total, timed_out) == (3, 4, False)
+    assert by_mode == {'b': 2, 'g': 1}
+    marks = tmp_path / 'marks.csv'
+    assert main.run_exam_grade(tutor, [str(result_path)], str(marks)) == 0
+    rows = list(csv.reader(marks.open()))
+    assert rows[1][3:6] == ['graded', '3', '4']
+
+def test_edited_papers_are_rejected(make_tutor, tmp_path, monkeypatch, capsys):
+    tutor = make_tutor()
+    paper_path = issue(tutor, tmp_path)
+    result_path = sit(tutor, tmp_path, paper_path, ['x'] * 4, monkeypatch)
+    result = json.loads(result_path.read_text())
+    result['paper']['seed'] += 1
+    with pytest.raises(ValueError, match='not issued'):
+        main.grade_exam_result(tutor, result, b'examiner-secret', {})
+    result_path.write_text(json.dumps(result))
+    assert main.run_exam_grade(tutor, [str(result_path)], None) == 1
+
+def test_papers_from_another_key_are_rejected(make_tutor, tmp_path, monkeypatch, capsys):
+    tutor = make_tutor()
+    result = json.loads(sit(tutor, tmp_path, issue(tutor, tmp_path), ['x'] * 4, monkeypatch).read_text())
+    with pytest.raises(ValueError, match='not issued'):
+        main.grade_exam_result(tutor, result, b'candidate-guess', {})
+
+def test_grading_against_a_changed_catalog_is_refused(make_tutor, tmp_path, monkeypatch, capsys):
+    tutor = make_tutor()
+    paper_path = issue(tutor, tmp_path)
+    result = json.loads(sit(tutor, tmp_path, paper_path, ['x'] * 4, monkeypatch).read_text())
+    mode, prompt = main.Mode.GIT, result['paper']['questions'][2]['question']
+    old = tutor.questions[mode][prompt]
+    tutor.questions[mode][prompt] = main.Command(old.command, old.explanation, old.example,
+                                                 alternatives=('git something-else',))
+    with pytest.raises(ValueError, match='catalog changed'):
+        main.grade_exam_result(tutor, result, b'examiner-secret', {})
+
+def test_sitting_needs_only_the_sitting_key(make_tutor, tmp_path, monkeypatch, capsys):
+    tutor = make_tutor()
+    paper_path = issue(tutor, tmp_path)
+    monkeypatch.delenv(main.EXAM_KEY_ENV)
+    monkeypatch.setattr(main, 'exam_key', lambda storage: pytest.fail("the key was read"))
+    sit(tutor, tmp_path, paper_path, ['x'] * 4, monkeypatch)
+
+def test_sitting_without_a_key_is_refused(make_tutor, tmp_path, monkeypatch, capsys):
+    tutor = make_tutor()
+    paper_path = issue(tutor, tmp_path)
+    monkeypatch.delenv(main.EXAM_KEY_ENV)
+    monkeypatch.delenv(main.EXAM_SITTING_KEY_ENV, raising=False)
+    assert main.run_exam_sit(tutor, str(paper_path), 'ada', str(tmp_path / 'out.json')) == 1
+    assert not (tmp_path / 'out.json').exists()
+
+def test_release_prints_the_sitting_keys(make_tutor, tmp_path, capsys):
+    tutor = make_tutor()
+    paper_path = issue(tutor, tmp_path)
+    capsys.readouterr()
+    assert main.run_exam_release(tutor, [str(paper_path)]) == 0
+    paper = json.loads(paper_path.read_text())
+    assert capsys.readouterr().out.split() == ['0001', main.exam_sitting_key(b'examiner-secret', paper).decode()]
+
+@pytest.mark.parametrize('edit', [
+    lambda result: result['answers'][0].update(answer='git status'),
+    lambda result: result.update(timed_out=False, seconds=1.0),
+    lambda result: result['answers'].append({'answer': 'ls', 'seconds': 1.0, 'elapsed': 2.0}),
+])
+def test_edited_results_are_rejected(make_tutor, tmp_path, monkeypatch, capsys, edit):
+    tutor = make_tutor()
+    result = json.loads(sit(tutor, tmp_path, issue(tutor, tmp_path), ['x'] * 4, monkeypatch).read_text())
+    edit(result)
+    with pytest.raises(ValueError, match='not signed'):
+        main.grade_exam_result(tutor, result, b'examiner-secret', {})
+
+def test_results_signed_for_another_paper_are_rejected(make_tutor, tmp_path, monkeypatch, capsys):
+    tutor = make_tutor()
+    paper_path = issue(tutor, tmp_path)
+    other = dict(json.loads(paper_path.read_text()), token='0' * 64)
+    monkeypatch.setenv(main.EXAM_SITTING_KEY_ENV, main.exam_sitting_key(b'examiner-secret', other).decode())
+    monkeypatch.setattr(main.BashTutor, 'prompt', types.SimpleNamespace(read=lambda prompt: 'x'))
+    out = tmp_path / 'result.json'
+    assert main.run_exam_sit(tutor, str(paper_path), 'ada', str(out)) == 0
+    with pytest.raises(ValueError, match='not signed'):
+        main.grade_exam_result(tutor, json.loads(out.read_text()), b'examiner-secret', {})
+
+def test_the_time_limit_is_applied_from_signed_timings(make_tutor, tmp_path, monkeypatch, capsys):
+    tutor = make_tutor()
+    paper_path = issue(tutor, tmp_path)
+    paper = json.loads(paper_path.read_text())
+    answers = answers_for(tutor, paper_path)
+    result = {'version': main.EXAM_VERSION, 'paper': paper, 'candidate': 'ada', 'started': '',
+              'seconds': 30 * 60 + 5, 'timed_out': False,
+              'answers': [{'answer': answer, 'seconds': 1.0, 'elapsed': elapsed}
+                          for answer, elapsed in zip(answers, (10.0, 20.0, 30 * 60 + 1, 30 * 60 + 2))]}
+    result['signature'] = main.exam_signature(result, main.exam_sitting_key(b'examiner-secret', paper))
+    correct, _, total, timed_out = main.grade_exam_result(tutor, result, b'examiner-secret', {})
+    assert (correct, total, timed_out) == (2, 4, True)
@@ -0,0 +1,47 @@
+import json
+import os
+
+import main
+
+def test_export_writes_every_format(make_tutor, tmp_path):
+    tutor = make_tutor()
+    out = tmp_path / 'export'
+    written, unchanged, removed = main.Exporter(tutor, str(out)).export()
+    modes = [mode for mode in tutor.modes.values() if tutor.questions.get(mode)]
+    assert written == len(modes) * len(main.EXPORT_FORMATS) + 1 # plus the HTML index
+    assert (unchanged, removed) == (0, 0)
+    slug = main.export_slug(main.Mode.GIT)
+    rows = [json.loads(line) for line in (out / 'jsonl' / f'{slug}.jsonl').read_text().splitlines()]
+    assert len(rows) == len(tutor.questions[main.Mode.GIT])
+    assert {row['mode'] for row in rows} == {'g'}
+    anki = (out / 'anki' / f'{slug}.tsv').read_text().splitlines()
+    assert anki[0] == '#separator:tab'
+    assert all(line.count('\t') == 2 for line in anki[3:])
+    assert 'Git' in (out / 'html' / 'index.html').read_text()
+
+def test_unchanged_files_are_not_rewritten(make_tutor, tmp_path):
+    tutor = make_tutor()
+    out = str(tmp_path / 'export')
+    written, _, _ = main.Exporter(tutor, out, ('jsonl',)).export()
+    assert main.Exporter(tutor, out, ('jsonl',)).export() == (0, written, 0)
+
+def test_files_of_removed_modes_are_deleted(make_tutor, tmp_path):
+    tutor = make_tutor()
+    out = str(tmp_path / 'export')
+    main.Exporter(tutor, out, ('markdown',)).export()
+    del tutor.questions[main.Mode.GIT]
+    written, _, removed = main.Exporter(tutor, out, ('markdown',)).export()
+    assert (written, removed) == (0, 1)
+    assert not os.path.exists(os.path.join(out, 'markdown', main.export_slug(main.Mode.GIT) + '.md'))
+
+def test_other_formats_survive_a_partial_export(make_tutor, tmp_path):
+    tutor = make_tutor()
+    out = str(tmp_path / 'export')
+    main.Exporter(tutor, out, ('anki', 'jsonl')).export()
+    main.Exporter(tutor, out, ('jsonl',)).export()
+    assert os.path.exists(os.path.join(out, 'anki', main.export_slug(main.Mode.GIT) + '.tsv'))
+    with open(os.path.join(out, main.EXPORT_MANIFEST)) as f:
+        assert any(path.startswith('anki') for path in json.load(f))
+
+def test_anki_fields_escape_html_and_tabs():
+    assert main._anki_field("a<b>\tc\nd") == "a&lt;b&gt;    c<br>d"
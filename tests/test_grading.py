@@ -0,0 +1,47 @@
+import pytest
+
+import main
+
+def test_quoting_that_changes_expansion_is_kept_apart():
+    answers = {main.canonical_answer(text) for text in ('echo $HOME', 'echo "$HOME"', "echo '$HOME'")}
+    assert len(answers) == 3
+    assert main.canonical_answer('echo \\$HOME') == main.canonical_answer("echo '$HOME'")
+    assert main.canonical_answer('find . -name *.txt') != main.canonical_answer("find . -name '*.txt'")
+
+@pytest.mark.parametrize('a, b', [
+    ('grep "foo" file', "grep 'foo' file"),
+    ('grep foo file', 'grep  foo   file'),
+    ('ls -la|grep x', 'ls -la | grep x'),
+    ('cmd 2>&1', 'cmd 2>& 1'),
+    ('git commit -m "first commit"', "git commit -m 'first commit'"),
+    ("echo 'a'\"b\"c", 'echo abc'),
+    ('ls --all', 'ls -a'),
+])
+def test_equivalent_spellings_match(a, b):
+    assert main.canonical_answer(a) == main.canonical_answer(b)
+
+def test_expansions_inside_double_quotes_are_kept():
+    assert main.canonical_answer('echo "$(date)"') == 'echo "$(date)"'
+    assert main.canonical_answer('echo "${HOME}/bin"') != main.canonical_answer("echo '${HOME}/bin'")
+
+def test_unterminated_quotes_fall_back_to_words():
+    assert main.canonical_answer('echo "oops') == 'echo "oops'
+
+def test_question_equivalences_apply_to_literal_words():
+    command = main.Command('tar -czf out.tgz dir', '', '', equivalences=(('-zcf', '-czf'),))
+    assert main.grade_answer(command, 'tar -zcf out.tgz dir') == (True, False)
+    assert main.grade_answer(command, 'TAR -czf out.tgz dir') == (False, True)
+    assert main.grade_answer(command, 'tar -xzf out.tgz dir') == (False, False)
+
+def test_catalog_answers_grade_themselves(make_tutor):
+    tutor = make_tutor()
+    for entries in tutor.questions.values():
+        for entry in entries.values():
+            if isinstance(entry, main.Command):
+                for answer in (entry.command,) + tuple(entry.alternatives):
+                    assert main.grade_answer(entry, answer) == (True, False), answer
+
+def test_undo_commit_alternative_is_a_reset(make_tutor):
+    entry = make_tutor().questions[main.Mode.GIT]["How do you undo the last commit?"]
+    assert main.grade_answer(entry, 'git reset --mixed HEAD~1') == (True, False)
+    assert main.grade_answer(entry, 'git restore --staged filename') == (False, False)
@@ -0,0 +1,48 @@
+import json
+
+import main
+
+COMMAND = main.Command('echo "a  b"', 'Print two spaces', '')
+
+def test_spacing_inside_quotes_is_not_collapsed():
+    cache = main.GradingCache()
+    assert cache.grade('b:q', COMMAND, 'echo "a  b"') == (True, False)
+    assert cache.grade('b:q', COMMAND, 'echo "a b"') == (False, False)
+    assert cache.grade('b:q', COMMAND, '  echo "a  b"  ') == (True, False)
+
+def test_verdicts_are_reused_until_the_question_changes(monkeypatch):
+    cache = main.GradingCache()
+    calls = []
+    original = main.grade_answer
+    monkeypatch.setattr(main, 'grade_answer', lambda command, answer: calls.append(answer) or original(command, answer))
+    cache.grade('b:q', COMMAND, 'echo hi')
+    cache.grade('b:q', COMMAND, 'echo hi')
+    assert len(calls) == 1
+    changed = main.Command('echo "a  b"', 'Print two spaces', '', alternatives=('echo hi',))
+    assert cache.grade('b:q', changed, 'echo hi') == (True, False)
+    assert len(calls) == 2
+
+def test_least_recently_used_verdicts_are_dropped():
+    cache = main.GradingCache(size=2)
+    for answer in ('one', 'two', 'one', 'three'):
+        cache.grade('b:q', COMMAND, answer)
+    assert list(cache.entries) == [('b:q', 'one'), ('b:q', 'three')]
+
+def test_saved_cache_round_trips(tmp_path):
+    storage = main.Storage(str(tmp_path))
+    cache = main.GradingCache(storage=storage)
+    cache.grade('b:q', COMMAND, 'echo "a  b"')
+    cache.save()
+    assert main.GradingCache(storage=storage).entries == cache.entries
+
+def test_malformed_or_old_caches_are_ignored(tmp_path):
+    storage = main.Storage(str(tmp_path))
+    storage.write_json(main.GRADING_CACHE_FILE, [['b:q', 'echo hi', 'digest', True, False]])
+    assert not main.GradingCache(storage=storage).entries
+    storage.write_json(main.GRADING_CACHE_FILE, {'version': main.GRADING_CACHE_VERSION, 'entries': [
+        ['b:q', 'ok', 'digest', True, False], ['b:q', 'short'], 'junk', ['b:q', 1, 'digest', True, False],
+        ['b:q', 'x', 'digest', 'yes', False]]})
+    assert list(main.GradingCache(storage=storage).entries) == [('b:q', 'ok')]
+    (tmp_path / main.GRADING_CACHE_FILE).write_text(json.dumps({'version': main.GRADING_CACHE_VERSION,
+                                                                 'entries': 5}))
+    assert not main.GradingCache(storage=storage).entries
@@ -0,0 +1,42 @@
+import random
+
+import main
+
+def test_skip_list_keeps_keys_sorted_and_ranks_them():
+    skip = main.RankedSkipList()
+    keys = list(range(500))
+    random.Random(2).shuffle(keys)
+    for key in keys:
+        skip.insert(key)
+    for key in range(0, 500, 3):
+        skip.remove(key)
+    remaining = [key for key in range(500) if key % 3]
+    assert list(skip) == remaining
+    assert len(skip) == len(remaining)
+    assert all(skip.rank(key) == position for position, key in enumerate(remaining))
+
+def test_leaderboard_keeps_best_scores_and_ranks(tmp_path):
+    board = main.Leaderboard(main.Storage(str(tmp_path)))
+    assert board.submit('all', 'ann', 5)
+    assert board.submit('all', 'bob', 9)
+    assert not board.submit('all', 'ann', 3)
+    assert board.submit('all', 'ann', 12)
+    assert board.top('all') == [('ann', 12), ('bob', 9)]
+    assert board.rank('all', 'bob') == 2
+    assert board.rank('all', 'cy') is None
+
+def test_leaderboards_in_two_processes_share_the_journal(tmp_path):
+    first = main.Leaderboard(main.Storage(str(tmp_path)))
+    second = main.Leaderboard(main.Storage(str(tmp_path)))
+    first.submit('g', 'ann', 4)
+    second.submit('g', 'bob', 6)
+    first.refresh()
+    assert first.top('g') == [('bob', 6), ('ann', 4)]
+
+def test_bad_journal_lines_are_skipped(tmp_path):
+    (tmp_path / main.LEADERBOARD_FILE).write_text(
+        '["all", "ann", 5]\n{"board": "all"}\n["all", "bob"]\n["all", "cy", "many"]\n[["all"], "dee", 1]\n'
+        '["all", "eve", 7]\n')
+    board = main.Leaderboard(main.Storage(str(tmp_path)))
+    board.refresh()
+    assert board.top('all') == [('eve', 7), ('ann', 5)]
@@ -0,0 +1,41 @@
+import shutil
+
+import pytest
+
+import main
+
+pytestmark = pytest.mark.skipif(shutil.which('bash') is None, reason="needs bash")
+
+@pytest.fixture
+def live_tutor(make_tutor):
+    tutor = make_tutor()
+    tutor.live = main.BashPool(size=1)
+    tutor.current_mode = main.Mode.VARIABLES
+    yield tutor
+    tutor.live.close()
+
+@pytest.mark.parametrize('answer', ['$HOME', '${HOME}', '$?', '$$', '$1'])
+def test_variable_references_are_expanded(live_tutor, answer):
+    assert live_tutor.answer_expansion(answer) is not None
+
+def test_home_is_the_private_directory(live_tutor):
+    assert 'bash-tutor-live-' in live_tutor.answer_expansion('$HOME')
+
+@pytest.mark.parametrize('answer', ['$(touch pwned)', '$HOME; touch pwned', '`id`', 'HOME', '$HOME $PATH',
+                                    '${HOME:-x}', '"$HOME"'])
+def test_other_answers_never_reach_the_shell(live_tutor, answer, monkeypatch):
+    monkeypatch.setattr(live_tutor.live, 'evaluate', lambda code: pytest.fail(code))
+    assert live_tutor.answer_expansion(answer) is None
+
+def test_nothing_runs_without_live(make_tutor):
+    tutor = make_tutor()
+    tutor.current_mode = main.Mode.VARIABLES
+    assert tutor.answer_expansion('$HOME') is None
+
+def test_evaluations_do_not_share_state():
+    shell = main.BashCoprocess()
+    try:
+        assert shell.evaluate('x=5; cd /; echo $x').output == '5\n'
+        assert shell.evaluate('echo "[$x]"; pwd').output == f'[]\n{shell.sandbox}\n'
+    finally:
+        shell.close()
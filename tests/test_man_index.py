@@ -0,0 +1,48 @@
+import main
+
+PAGE = r""".TH FROB 1
+.SH NAME
+frob \- frobnicate files
+.SH OPTIONS
+.TP
+.B \-v
+Print each file as it is frobnicated.
+.TP
+\fB\-\-force\fR
+Never prompt.
+"""
+
+CATALOG = {main.Mode.BEGINNER: {'List all': main.Command('ls -la', 'List all files', '')}}
+
+def man_tree(tmp_path):
+    (tmp_path / 'man' / 'man1').mkdir(parents=True)
+    (tmp_path / 'man' / 'man1' / 'frob.1').write_text(PAGE)
+    return str(tmp_path / 'man')
+
+def test_pages_are_parsed_once(tmp_path):
+    index = main.ManIndex(str(tmp_path / 'index.sqlite3'), lambda: CATALOG, man_tree(tmp_path))
+    assert index.update() == 1
+    assert index.update() == 0
+    assert index.explain('frob -v --force') == [('frob', 'frobnicate files'),
+                                                ('-v', 'Print each file as it is frobnicated.'),
+                                                ('--force', 'Never prompt.')]
+
+def test_catalog_explains_programs_without_man_pages(tmp_path):
+    index = main.ManIndex(str(tmp_path / 'index.sqlite3'), lambda: CATALOG, man_tree(tmp_path))
+    index.update()
+    assert index.explain('ls -la')[0] == ('ls -la', 'List all files')
+    assert index.explain('frob | ls')[1] == ('|', main.OPERATOR_EXPLANATIONS['|'])
+
+def test_tutor_updates_the_index_once_per_catalog(make_tutor, tmp_path, monkeypatch):
+    monkeypatch.setattr(main.ManIndex.__init__, '__defaults__', (man_tree(tmp_path),))
+    tutor = make_tutor()
+    tutor.notify = lambda *args: None
+    updates = []
+    original = main.ManIndex.update
+    monkeypatch.setattr(main.ManIndex, 'update', lambda self, force=False: updates.append(1) or original(self, force))
+    tutor.explain_command('ls -la')
+    tutor.explain_command('git status')
+    assert len(updates) == 1
+    tutor.questions = dict(tutor.questions) # What a pack reload publishes
+    tutor.explain_command('ls')
+    assert len(updates) == 2
@@ -0,0 +1,41 @@
+import random
+from collections import Counter
+
+import pytest
+
+import main
+
+def test_alias_sampler_matches_weights():
+    sampler = main.AliasSampler(['a', 'b', 'c', 'd'], [50, 30, 20, 0])
+    rng = random.Random(3)
+    counts = Counter(sampler.draw(rng) for _ in range(100000))
+    assert counts['d'] == 0
+    for item, share in (('a', 0.5), ('b', 0.3), ('c', 0.2)):
+        assert abs(counts[item] / 100000 - share) < 0.01
+
+@pytest.mark.parametrize('weights', [[], [0, 0], [1, -1]])
+def test_alias_sampler_rejects_bad_weights(weights):
+    with pytest.raises(ValueError):
+        main.AliasSampler(list(range(len(weights))), weights)
+
+def test_parse_mode_mix_accepts_percentages_and_merges_repeats():
+    modes = {'g': main.Mode.GIT, 's': main.Mode.SCRIPTING}
+    assert main.parse_mode_mix("g=50%, s=30,G=20", modes) == {'g': 70.0, 's': 30.0}
+
+@pytest.mark.parametrize('spec', ['g', 'x=1', 'g=abc', 'g=-1', 'g=0', 'g=nan', 'g=inf', 'g=-inf', 'g=1e308,g=1e308'])
+def test_parse_mode_mix_rejects_bad_specs(spec):
+    with pytest.raises(ValueError):
+        main.parse_mode_mix(spec, {'g': main.Mode.GIT})
+
+def test_mixed_session_draws_only_from_the_mix(make_tutor):
+    tutor = make_tutor()
+    tutor.current_mode = main.Mode.BEGINNER
+    tutor.set_mode_mix('g=1,a=3')
+    modes = Counter()
+    for _ in range(400):
+        tutor.get_random_question()
+        modes[tutor.current_mode] += 1
+    assert set(modes) == {main.Mode.GIT, main.Mode.ADVANCED}
+    assert modes[main.Mode.ADVANCED] > modes[main.Mode.GIT]
+    tutor.set_mode_mix(None)
+    assert tutor.mode_mix is None
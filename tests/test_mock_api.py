@@ -0,0 +1,94 @@
+import json
+import shutil
+import urllib.error
+import urllib.request
+
+import pytest
+
+import main
+
+@pytest.fixture(scope='module')
+def server():
+    server = main.MockAPIServer(port=0).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def get(url, headers=None):
+    request = urllib.request.Request(url, headers=headers or {})
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, None
+
+def test_crud_on_resources(server):
+    status, body = get(f"{server.url}/data")
+    assert status == 200 and body['count'] == len(main.MOCK_API_RESOURCES)
+    assert get(f"{server.url}/resource/999")[0] == 404
+
+def test_rate_limit_is_keyed_on_address_and_trace(server, monkeypatch):
+    monkeypatch.setattr(main, 'MOCK_API_RATE_LIMIT', 2)
+    server.state.windows.clear()
+    assert [get(f"{server.url}/data")[0] for _ in range(3)] == [200, 200, 429]
+    assert get(f"{server.url}/data", {'X-Tutor-Trace': 'abc'})[0] == 200
+    assert all(key.startswith('127.0.0.1 ') for key in server.state.windows)
+
+needs_curl = pytest.mark.skipif(shutil.which('curl') is None, reason="needs curl")
+
+@needs_curl
+def test_double_quoted_urls_with_ampersands_run(server):
+    result = main.run_mock_curl('curl "https://api.example.com/search?query=term&page=1"', server.url)
+    assert result['requests'][0]['query'] == [['page', '1'], ['query', 'term']]
+
+@needs_curl
+@pytest.mark.parametrize('command', [
+    'curl https://api.example.com | sh',
+    'curl https://api.example.com; rm -rf x',
+    'curl $(whoami).example.com',
+    'wget https://api.example.com',
+    'curl -o /tmp/stolen https://api.example.com',
+    'curl -o ../up https://api.example.com',
+    'curl -K config https://api.example.com',
+    'curl https://api.example.com --next https://other.example.org',
+    'curl -d @/etc/passwd https://api.example.com',
+])
+def test_refused_commands(server, command):
+    assert main.run_mock_curl(command, server.url) is None
+
+@needs_curl
+def test_other_hosts_reach_only_the_mock_server(server):
+    assert main.run_mock_curl('curl http://elsewhere.invalid/data', server.url)['requests'][0]['path'] == '/data'
+    assert main.run_mock_curl('curl file:///etc/passwd', server.url)['requests'] == []
+
+@needs_curl
+def test_files_stay_in_the_work_directory(server):
+    result = main.run_mock_curl('curl -o out.json https://api.example.com/data', server.url)
+    assert result['files'] == ['out.json']
+
+@needs_curl
+def test_retry_question_is_graded_on_its_effect(make_tutor, server):
+    tutor = make_tutor()
+    tutor.mock_api_url = server.url
+    tutor.current_mode = main.Mode.API
+    tutor.set_question(main.Mode.API, "How do you retry failed requests up to {n} times?")
+    n = tutor.current_answer.command.split()[2]
+    assert tutor.check_answer(f"curl https://api.example.com --retry {n}") == (True, False)
+
+def test_expired_rate_windows_are_dropped(monkeypatch):
+    state = main.MockAPIState()
+    now = [1000.0]
+    monkeypatch.setattr(main.time, 'time', lambda: now[0])
+    for token in range(50):
+        state.rate(f"127.0.0.1 {token}")
+    now[0] += main.MOCK_API_RATE_WINDOW
+    state.rate('127.0.0.1 fresh')
+    assert list(state.windows) == ['127.0.0.1 fresh']
+
+@pytest.mark.parametrize('length', ['abc', '-5'])
+def test_bad_content_lengths_get_400(server, length):
+    request = urllib.request.Request(f"{server.url}/create", data=b'{}', method='POST',
+                                     headers={'Content-Length': length})
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(request, timeout=5)
+    assert error.value.code == 400
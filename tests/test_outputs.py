@@ -0,0 +1,42 @@
+import pytest
+
+import main
+
+@pytest.mark.parametrize('example', [
+    'echo hello',
+    'ls -la | grep txt',
+    'mkdir -p a/b && cd a/b && pwd',
+    'for i in $(seq 1 3); do echo $i; done',
+    'echo range 1..5',
+    'cat file.txt > /dev/null',
+    'greet() { echo hi; }\ngreet',
+    'find . -name "*.txt"',
+])
+def test_safe_examples_run(example):
+    assert main.runnable_example(example)
+
+@pytest.mark.parametrize('example', [
+    'eval "echo hi"',
+    'source script.sh',
+    'ls | xargs cat',
+    'env FOO=1 printenv FOO',
+    'command ls',
+    'builtin echo hi',
+    'rm -rf build',
+    'cd ..',
+    'cd ../other',
+    'ls a/..',
+    'cat "../secret"',
+    'cat /etc/passwd',
+    'ls ~',
+    'echo $HOME',
+    'find . -name "*.tmp" -delete',
+    r'find . -exec cat {} \;',
+    'curl https://example.com',
+    '',
+])
+def test_unsafe_examples_are_skipped(example):
+    assert not main.runnable_example(example)
+
+def test_comments_are_ignored():
+    assert main.runnable_example('# rm -rf /\necho hi  # not curl')
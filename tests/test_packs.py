@@ -0,0 +1,90 @@
+import json
+import marshal
+import os
+
+import pytest
+
+import main
+
+PACK = {
+    'mode': {'key': 'k', 'name': 'Kubernetes', 'description': 'Cluster basics'},
+    'questions': {
+        'How do you list pods?': {'command': 'kubectl get pods', 'explanation': 'Lists pods',
+                                  'example': 'kubectl get pods -A'},
+    },
+}
+
+def write_pack(directory, name='k.json', data=PACK):
+    path = directory / name
+    path.write_text(json.dumps(data))
+    return str(path)
+
+@pytest.fixture
+def loader_factory(tmp_path):
+    packs = tmp_path / 'packs'
+    packs.mkdir()
+    cache = str(tmp_path / 'cache.bin')
+    return packs, lambda: main.PackLoader(str(packs), cache)
+
+def test_loads_pack_questions(loader_factory):
+    packs, make_loader = loader_factory
+    write_pack(packs)
+    loaded = make_loader().load()
+    assert len(loaded) == 1
+    assert loaded[0].mode.value == 'k'
+    assert loaded[0].questions['How do you list pods?'].command == 'kubectl get pods'
+
+def test_unchanged_pack_is_not_parsed_again(loader_factory, monkeypatch):
+    packs, make_loader = loader_factory
+    write_pack(packs)
+    make_loader().load()
+
+    def fail(data):
+        raise AssertionError("pack was validated again")
+    monkeypatch.setattr(main, 'validate_pack', fail)
+    loader = make_loader()
+    assert loader.load()[0].questions
+    assert loader.modified == set()
+
+def test_touched_pack_keeps_cached_data(loader_factory, monkeypatch):
+    packs, make_loader = loader_factory
+    path = write_pack(packs)
+    make_loader().load()
+    os.utime(path, ns=(1, 1))
+    monkeypatch.setattr(main, 'validate_pack', lambda data: pytest.fail("re-validated"))
+    assert make_loader().load()[0].questions
+
+def test_malformed_cache_entry_is_reparsed(loader_factory, tmp_path):
+    packs, make_loader = loader_factory
+    path = write_pack(packs)
+    with open(tmp_path / 'cache.bin', 'wb') as f:
+        marshal.dump({'version': main.PACK_CACHE_VERSION, 'packs': {path: {'data': {}}}}, f)
+    loader = make_loader()
+    assert loader.cache == {}
+    assert loader.load()[0].questions
+    assert loader.modified == {path}
+
+def test_corrupt_cache_file_is_ignored(loader_factory, tmp_path):
+    packs, make_loader = loader_factory
+    write_pack(packs)
+    (tmp_path / 'cache.bin').write_bytes(b'not marshal data')
+    assert make_loader().load()[0].questions
+
+def test_removed_pack_is_reported(loader_factory):
+    packs, make_loader = loader_factory
+    path = write_pack(packs)
+    loader = make_loader()
+    loader.load()
+    os.remove(path)
+    assert loader.load() == []
+    assert loader.removed == {path}
+
+@pytest.mark.parametrize('data', [
+    [],
+    {'mode': {'key': 'exit'}, 'questions': PACK['questions']},
+    {'mode': PACK['mode'], 'questions': {}},
+    {'mode': PACK['mode'], 'questions': {'Q?': {'command': 'ls', 'explanation': 'x'}}},
+])
+def test_validate_pack_rejects_malformed_packs(data):
+    with pytest.raises(main.PackError):
+        main.validate_pack(data)
@@ -0,0 +1,46 @@
+import types
+
+import main
+
+def test_instrumented_methods_are_timed_per_phase():
+    profiler = main.PhaseProfiler()
+    target = types.SimpleNamespace(work=lambda x: x * 2)
+    profiler.instrument(target, (('work', 'compute'),))
+    assert [target.work(i) for i in range(5)] == [0, 2, 4, 6, 8]
+    stats = profiler.phases['compute']
+    assert stats['count'] == 5
+    assert sum(stats['buckets'].values()) == 5
+    assert stats['max'] <= stats['total']
+
+def test_failing_calls_are_still_timed():
+    profiler = main.PhaseProfiler()
+    def fail():
+        raise RuntimeError
+    wrapped = profiler.timed('fail', fail)
+    try:
+        wrapped()
+    except RuntimeError:
+        pass
+    assert profiler.phases['fail']['count'] == 1
+
+def test_histogram_buckets_are_powers_of_two_microseconds():
+    profiler = main.PhaseProfiler()
+    for ns in (500, 1_500, 3_000, 3_500, 1_000_000):
+        profiler.record('p', ns)
+    assert profiler.phases['p']['buckets'] == {0: 1, 1: 1, 2: 2, 10: 1}
+
+def test_report_lists_every_phase(capsys, tmp_path, monkeypatch):
+    monkeypatch.setattr(main.atexit, 'register', lambda func: None)
+    profiler = main.PhaseProfiler(str(tmp_path / 'profile.pstats'))
+    profiler.start()
+    profiler.record('select', 2_000)
+    profiler.record('render', 40_000_000)
+    profiler.report()
+    out = capsys.readouterr().out
+    assert 'select: 1 calls' in out and 'render: 1 calls' in out
+    assert (tmp_path / 'profile.pstats').exists()
+
+def test_format_ns_units():
+    assert main._format_ns(12_000) == '12µs'
+    assert main._format_ns(2_500_000) == '2.5ms'
+    assert main._format_ns(3_000_000_000) == '3.00s'
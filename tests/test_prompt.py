@@ -0,0 +1,48 @@
+import main
+
+CATALOG = {
+    main.Mode.BEGINNER: {
+        'List everything': main.Command('ls -la | grep --ignore-case foo', '', ''),
+        'Show a file': main.Command('cat -n {file}', '', ''),
+    },
+    main.Mode.GIT: {
+        'Commit': main.Command('git commit -m "message"', '', ''),
+    },
+    main.Mode.UNDERSTANDING: {
+        'What does ls do?': main.Command('list', '', ''),
+    },
+}
+
+def test_trie_completes_sorted_prefix_matches():
+    trie = main.CompletionTrie(['grep', 'git', 'gzip', 'ls', 'git'])
+    assert trie.complete('g') == ['git', 'grep', 'gzip']
+    assert trie.complete('gi') == ['git']
+    assert trie.complete('x') == []
+    assert trie.complete('') == ['git', 'grep', 'gzip', 'ls']
+
+def test_trie_caps_completions_per_node():
+    trie = main.CompletionTrie(f"w{i:03}" for i in range(main.MAX_COMPLETIONS + 20))
+    assert len(trie.complete('w')) == main.MAX_COMPLETIONS
+
+def prompt():
+    return main.AnswerPrompt(lambda: CATALOG)
+
+def test_programs_complete_at_the_start_of_a_line():
+    completions = prompt().candidates('', 'g')
+    assert 'git' in completions and 'grep' in completions
+    assert 'list' not in prompt().candidates('', 'l')
+
+def test_flags_complete_from_the_current_pipeline_segment():
+    answers = prompt()
+    assert answers.candidates('ls -la | grep ', '--') == ['--ignore-case']
+    assert answers.candidates('ls ', '-') == ['-la']
+    assert answers.candidates('cat -n foo; git ', 'c') == ['commit']
+    assert answers.candidates('ls | ', 'gr') == ['grep']
+
+def test_template_slots_are_not_completed():
+    assert prompt().candidates('cat ', '') == ['-n']
+
+def test_prompt_is_created_on_first_use(make_tutor):
+    tutor = make_tutor()
+    assert tutor._prompt is None
+    assert tutor.prompt is tutor.prompt
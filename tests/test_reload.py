@@ -0,0 +1,55 @@
+import json
+import threading
+
+import main
+
+def write_pack(tmp_path, name, key, questions):
+    (tmp_path / 'packs' / name).write_text(json.dumps({'mode': {'key': key, 'name': key.upper()},
+                                                       'questions': questions}))
+
+def question(command):
+    return {'command': command, 'explanation': 'Explains it', 'example': command}
+
+def test_reload_adds_changes_and_removes_pack_modes(make_tutor, tmp_path):
+    tutor = make_tutor()
+    assert 'k' not in tutor.modes
+    write_pack(tmp_path, 'k.json', 'k', {'List pods?': question('kubectl get pods')})
+    assert tutor.reload_packs() == 1
+    mode = tutor.modes['k']
+    assert tutor.questions[mode]['List pods?'].command == 'kubectl get pods'
+
+    write_pack(tmp_path, 'k.json', 'k', {'List pods?': question('kubectl get pods'),
+                                         'List nodes?': question('kubectl get nodes')})
+    assert tutor.reload_packs() == 1
+    assert set(tutor.questions[tutor.modes['k']]) == {'List pods?', 'List nodes?'}
+
+    (tmp_path / 'packs' / 'k.json').unlink()
+    assert tutor.reload_packs() == 1
+    assert 'k' not in tutor.modes
+
+def test_reload_without_changes_keeps_the_catalog(make_tutor, tmp_path):
+    write_pack(tmp_path, 'k.json', 'k', {'List pods?': question('kubectl get pods')})
+    tutor = make_tutor()
+    catalog = tutor.questions
+    assert tutor.reload_packs() == 0
+    assert tutor.questions is catalog
+
+def test_pack_for_builtin_mode_extends_it_and_keeps_unchanged_entries(make_tutor, tmp_path):
+    tutor = make_tutor()
+    builtin = dict(tutor.questions[main.Mode.GIT])
+    write_pack(tmp_path, 'g.json', 'g', {'Show the reflog?': question('git reflog')})
+    tutor.reload_packs()
+    git = tutor.questions[main.Mode.GIT]
+    assert git['Show the reflog?'].command == 'git reflog'
+    assert all(git[q] is command for q, command in builtin.items())
+
+def test_watcher_calls_back_when_a_pack_is_written(tmp_path):
+    (tmp_path / 'packs').mkdir()
+    changed = threading.Event()
+    watcher = main.PackWatcher(str(tmp_path / 'packs'), changed.set, interval=0.05, debounce=0.01)
+    watcher.start()
+    try:
+        write_pack(tmp_path, 'k.json', 'k', {'List pods?': question('kubectl get pods')})
+        assert changed.wait(5)
+    finally:
+        watcher.stop()
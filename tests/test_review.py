@@ -0,0 +1,72 @@
+import main
+
+def queue(tmp_path, user='ada', size=main.REVIEW_QUEUE_SIZE):
+    return main.ReviewQueue(main.Storage(str(tmp_path)), user, size=size)
+
+def test_most_missed_questions_come_first(tmp_path):
+    review = queue(tmp_path)
+    for qid in ('b:one', 'b:two', 'b:two', 'g:three'):
+        review.miss(qid)
+    assert review.ordered() == ['b:two', 'g:three', 'b:one']
+    assert review.next() == 'b:two'
+    assert review.next(recent=['two']) == 'g:three'
+    assert review.next(recent=['one', 'two', 'three']) == 'b:one'
+
+def test_correct_answers_drain_the_queue(tmp_path):
+    review = queue(tmp_path)
+    review.miss('b:one')
+    review.miss('b:one')
+    review.hit('b:one')
+    assert 'b:one' in review
+    review.hit('b:one')
+    assert len(review) == 0
+    review.hit('b:unknown')
+
+def test_full_queue_drops_the_least_missed_oldest_entry(tmp_path):
+    review = queue(tmp_path, size=2)
+    review.miss('b:old')
+    review.miss('b:newer')
+    review.miss('b:newer')
+    review.miss('b:newest')
+    assert set(review.entries) == {'b:newer', 'b:newest'}
+
+def test_a_first_miss_in_a_full_queue_is_kept(tmp_path):
+    review = queue(tmp_path, size=2)
+    for qid in ('b:one', 'b:one', 'b:two', 'b:two', 'b:three'):
+        review.miss(qid)
+    assert set(review.entries) == {'b:two', 'b:three'}
+
+def save(review, qid):
+    review.miss(qid)
+    review.save()
+
+def test_queues_persist_per_learner(tmp_path):
+    save(queue(tmp_path, 'ada'), 'b:one')
+    save(queue(tmp_path, 'bob'), 'g:two')
+    assert queue(tmp_path, 'ada').ordered() == ['b:one']
+    assert queue(tmp_path, 'bob').ordered() == ['g:two']
+    assert len(queue(tmp_path, 'eve')) == 0
+
+def test_review_session_asks_missed_questions(make_tutor):
+    tutor = make_tutor()
+    question = "How do you undo the last commit?"
+    tutor.review.miss(main.question_id(main.Mode.GIT, question))
+    tutor.reviewing = True
+    tutor.get_random_question()
+    assert tutor.current_mode is main.Mode.GIT and tutor.current_question == question
+
+def test_misses_are_written_in_batches_and_at_exit(make_tutor, monkeypatch):
+    tutor = make_tutor()
+    tutor.current_mode = main.Mode.BEGINNER
+    tutor.get_random_question()
+    writes = []
+    monkeypatch.setattr(tutor.review, 'save', lambda: writes.append(len(tutor.review)) or
+                        setattr(tutor.review, 'unsaved', 0))
+    for _ in range(main.REVIEW_SAVE_EVERY - 1):
+        tutor.record_result(False, False)
+    assert not writes
+    tutor.record_result(False, False)
+    assert writes == [1]
+    tutor.record_result(True, False)
+    tutor.save_progress()
+    assert writes == [1, 1]
@@ -0,0 +1,36 @@
+import main
+
+def session(tutor, count=30):
+    asked = []
+    for _ in range(count):
+        tutor.get_random_question()
+        asked.append((tutor.current_mode.value, tutor.current_prompt))
+    return asked
+
+def test_same_seed_asks_the_same_questions(make_tutor):
+    runs = []
+    for _ in range(2):
+        tutor = make_tutor(seed=42)
+        tutor.set_mode_mix('b=1,g=1,a=1')
+        runs.append(session(tutor))
+    assert runs[0] == runs[1]
+    other = make_tutor(seed=43)
+    other.set_mode_mix('b=1,g=1,a=1')
+    assert session(other) != runs[0]
+
+def test_unseeded_sessions_pick_a_seed(make_tutor):
+    tutor = make_tutor(seed=None)
+    assert isinstance(tutor.seed, int) and 0 <= tutor.seed < 2 ** 63
+
+def test_resumed_session_continues_the_same_sequence(make_tutor):
+    tutor = make_tutor(seed=7)
+    tutor.current_mode = main.Mode.GIT
+    session(tutor, 5)
+    snapshot = main.SessionSnapshot(tutor.user, tutor.score, 'g', None, list(tutor.question_history),
+                                    seed=tutor.seed, rng_state=tutor.rng.getstate())
+    expected = session(tutor, 10)
+    tutor.storage.write_bytes(tutor.checkpoint_name, snapshot.encode())
+    resumed = make_tutor(seed=99)
+    assert resumed.resume()
+    assert resumed.seed == 7
+    assert session(resumed, 10) == expected
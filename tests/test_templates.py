@@ -0,0 +1,47 @@
+import json
+import random
+import sqlite3
+
+import main
+
+TEMPLATE = main.QuestionTemplate('tail -n {n} {file}', 'Shows the last {n} lines of {file}', 'tail -n {n} {file}',
+                                 alternatives=('tail -{n} {file}',),
+                                 slots={'n': '5..50', 'file': ('app.log', 'notes.txt')})
+QUESTION = "How do you show the last {n} lines of {file}?"
+
+def test_instances_fill_every_field_from_the_same_values():
+    question, command = TEMPLATE.instantiate(QUESTION, random.Random(3))
+    n = question.split()[6]
+    assert 5 <= int(n) <= 50
+    assert command.command.startswith(f'tail -n {n} ')
+    assert command.alternatives[0].startswith(f'tail -{n} ')
+    assert main.grade_answer(command, command.alternatives[0]) == (True, False)
+    assert TEMPLATE.variants == 46 * 2
+
+def test_samples_are_stable():
+    assert TEMPLATE.sample(QUESTION) == TEMPLATE.sample(QUESTION)
+    assert '{' not in TEMPLATE.sample(QUESTION)[0]
+
+def test_fill_slots_leaves_other_braces():
+    assert main.fill_slots("awk '{print $1}' ${f} {x}", {'x': 'y'}) == "awk '{print $1}' ${f} y"
+
+def template_entries(tutor):
+    return [(mode, question) for mode, entries in tutor.questions.items()
+            for question, entry in entries.items() if isinstance(entry, main.QuestionTemplate)]
+
+def test_export_instantiates_templates(make_tutor, tmp_path):
+    tutor = make_tutor()
+    mode, question = template_entries(tutor)[0]
+    out = tmp_path / 'export'
+    main.Exporter(tutor, str(out), ('jsonl',)).export()
+    rows = [json.loads(line) for line in (out / 'jsonl' / f'{main.export_slug(mode)}.jsonl').read_text().splitlines()]
+    sample, _ = tutor.questions[mode][question].sample(question)
+    assert sample in {row['question'] for row in rows}
+    assert not any(main.SLOT_PATTERN.search(row['question'] + row['command']) for row in rows)
+
+def test_man_index_catalog_has_no_slots(make_tutor, tmp_path):
+    tutor = make_tutor()
+    index = main.ManIndex(str(tmp_path / 'index.sqlite3'), lambda: tutor.questions, str(tmp_path / 'no-man'))
+    index.update()
+    rows = sqlite3.connect(str(tmp_path / 'index.sqlite3')).execute("SELECT command, explanation FROM catalog")
+    assert not any(main.SLOT_PATTERN.search(command + explanation) for command, explanation in rows)
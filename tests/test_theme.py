@@ -0,0 +1,33 @@
+import pytest
+
+import main
+
+def test_unknown_theme_falls_back_to_the_default(capsys):
+    theme = main.load_theme('neon')
+    assert theme.name == main.DEFAULT_THEME
+    assert "unknown theme 'neon'" in capsys.readouterr().err
+
+def test_theme_rejects_unknown_names():
+    with pytest.raises(ValueError):
+        main.Theme('neon')
+
+@pytest.mark.parametrize('depth, escape', [('truecolor', '\033[38;2;255;0;0m'), ('256', '\033[38;5;196m'),
+                                           ('16', '\033[91m'), ('none', '')])
+def test_color_escape_per_depth(depth, escape):
+    assert main.color_escape('#ff0000', depth) == escape
+
+def test_templates_are_precompiled_with_colours():
+    theme = main.Theme(main.DEFAULT_THEME, depth='16')
+    rendered = theme.render('incorrect', answer='ls {-la}')
+    assert rendered.startswith(theme.codes['ROSE'])
+    assert 'ls {-la}' in rendered and rendered.endswith('\033[0m')
+    card = theme.render('card_correct', points=5, command='ls', explanation='list', example='ls')
+    assert '[+5 points]' in card
+
+def test_plain_theme_has_no_escapes():
+    theme = main.Theme('plain', depth='truecolor')
+    assert theme.render('correct') == "Correct! Well done!"
+
+def test_no_color_disables_colour(monkeypatch):
+    monkeypatch.setenv('NO_COLOR', '1')
+    assert main.detect_color_depth() == 'none'
@@ -0,0 +1,65 @@
+import types
+
+import pytest
+
+import main
+
+@pytest.fixture
+def tui(make_tutor):
+    tutor = make_tutor()
+    tutor.current_mode = main.Mode.BEGINNER
+    tutor.get_random_question()
+    screen = main.TutorTUI(tutor)
+    screen.curses = types.SimpleNamespace(A_BOLD=1 << 16)
+    screen.colors = {name: pair << 8 for pair, name in
+                     enumerate(('correct', 'mismatch', 'incorrect', 'question', 'good', 'info'), 1)}
+    return screen
+
+def test_mix_is_a_session_command_not_an_answer(tui):
+    tui.submit('mix g=1,a=1')
+    assert tui.tutor.mode_weights == {'g': 1.0, 'a': 1.0}
+    assert tui.tutor.score == 0
+    assert tui.tutor.current_mode in (main.Mode.GIT, main.Mode.ADVANCED)
+
+def test_invalid_mix_reports_without_grading(tui):
+    question = tui.tutor.current_question
+    tui.submit('mix x=1')
+    assert tui.status[0].startswith('Invalid mix')
+    assert tui.tutor.current_question == question
+
+def test_drill_and_adaptive_commands(tui):
+    tui.submit('drill 5')
+    assert tui.tutor.drill is not None
+    tui.submit('adaptive')
+    assert tui.tutor.adaptive
+
+def test_top_shows_the_leaderboard(tui):
+    tui.submit('top')
+    assert tui.explanation.lines[0][0] == 'All-time Leaderboard'
+    tui.submit('top zz')
+    assert 'Unknown mode' in tui.status[0]
+
+def test_clear_commands_reset_scores(tui):
+    tui.tutor.score = 30
+    tui.submit('clears')
+    assert tui.tutor.score == 0
+
+def test_answers_that_look_like_commands_are_graded(tui):
+    tutor = tui.tutor
+    tutor.current_answer = main.Command('top -o cpu', '', '')
+    assert not tui.session_command('top -o cpu')
+
+def test_notify_uses_the_tone_under_any_theme(tui, monkeypatch):
+    tui.update_footer = lambda: None
+    monkeypatch.setattr(main, 'SAGE', '\x1b[0m')
+    tui._notify("slow", 'warn')
+    assert tui.status[1] == tui.colors['mismatch']
+    tui._notify("best", 'good')
+    assert tui.status[1] == tui.colors['good']
+    tui._notify("plain")
+    assert tui.status[1] == tui.colors['info']
+
+def test_console_notify_follows_the_current_theme(make_tutor, monkeypatch, capsys):
+    monkeypatch.setattr(main, 'SAGE', '<sage>')
+    make_tutor().notify("best", 'good')
+    assert capsys.readouterr().out.startswith('<sage>best')
@@ -0,0 +1,38 @@
+import main
+
+def fields(command='ls -l', explanation='Lists files', example='ls -l', **extra):
+    return dict(command=command, explanation=explanation, example=example, **extra)
+
+def test_bash_syntax_errors_pinpoints_bad_examples():
+    errors = main._bash_syntax_errors(['ls', 'if true; then', 'echo ok', 'for x in; do'])
+    assert errors[0] is None and errors[2] is None
+    assert errors[1] and errors[3]
+
+def test_validate_chunk_reports_missing_fields_and_unparsable_answers():
+    results = dict(main._validate_chunk([
+        ('good', True, fields()),
+        ('missing', True, fields(explanation=' ')),
+        ('quote', True, fields(command="echo 'unterminated")),
+        ('word', True, fields(command='^D')),
+        ('syntax', True, fields(example='if true; then')),
+    ]))
+    assert results['good'] == []
+    assert results['missing'] == [['error', "missing 'explanation'"]]
+    assert results['quote'][0][0] == 'error'
+    assert results['word'] == [['warning', "command does not start with a program: '^D'"]]
+    assert results['syntax'][0][1].startswith('example rejected by bash -n')
+
+def test_builtin_catalog_has_no_errors_and_results_are_cached(make_tutor, tmp_path):
+    tutor = make_tutor()
+    validator = main.CatalogValidator(tutor, str(tmp_path / 'validate.json'), workers=2)
+    assert [issue for issue in validator.validate() if issue[0] == 'error'] == []
+    assert validator.checked > 0
+    again = main.CatalogValidator(tutor, str(tmp_path / 'validate.json'), workers=2)
+    again.validate()
+    assert again.checked == 0
+
+def test_duplicates_across_modes_are_reported():
+    command = main.Command('ls', 'Lists', 'ls')
+    entries = [(main.Mode.BEGINNER, 'Q?', command, 'a'), (main.Mode.ADVANCED, 'Q?', command, 'b')]
+    severities = sorted(issue[0] for issue in main.CatalogValidator._duplicates(entries))
+    assert severities == ['error', 'warning']